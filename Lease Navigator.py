@@ -1,30 +1,41 @@
-import sendgrid
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-import sqlite3
-import smtplib
-import xlsxwriter
-import re
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QGridLayout, QComboBox, QGroupBox, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit,
-    QLabel, QTreeWidget, QTreeWidgetItem, QDateEdit, QMessageBox, QSplitter, QTextEdit, QFileDialog,
-    QListWidget, QListWidgetItem, QAbstractItemView, QDialog, QDialogButtonBox
+    QLabel, QTreeView, QDateEdit, QMessageBox, QSplitter, QTextEdit, QFileDialog,
+    QListWidget, QListWidgetItem, QAbstractItemView, QDialog, QDialogButtonBox, QSpinBox, QProgressDialog,
+    QCheckBox, QTableWidget, QTableWidgetItem, QTabWidget
+)
+from PyQt5.QtCore import (
+    Qt, QDate, QSettings, QStandardPaths, QAbstractItemModel, QModelIndex, QThread, QTimer, pyqtSignal
 )
-from PyQt5.QtCore import Qt, QDate, QSettings, QStandardPaths
 from PyQt5.QtGui import QFont, QIcon
 
+from lease_navigator.attachments import AttachmentStore
+from lease_navigator.backup import FULL, BackupManager
+from lease_navigator.campaign import NO_EMAIL, SENT, Campaign, Recipient, select_recipients, summarize
+from lease_navigator.charts import ChartCache, render_portfolio_chart
+from lease_navigator.database import FIRST_KEY, Database, is_busy
+from lease_navigator.dates import iso_date
+from lease_navigator.export import export_lease_roll
+from lease_navigator.importer import import_lease_roll
+from lease_navigator.letters import DEFAULT_LETTER_TEMPLATE, LETTER_FORMATS, LetterWriter
+from lease_navigator.mail import TRANSPORTS, Message, make_transport
+from lease_navigator.scheduler import ExpiryScheduler, days_label
+from lease_navigator.sorting import natural_key
+from lease_navigator.telemetry import span, telemetry, timed
+from lease_navigator.templates import DEFAULT_SUBJECT, DEFAULT_TEMPLATE, TemplateError, compile_template
+
 import sys
 import os
+import sqlite3
+import time
+from bisect import bisect
 
 class LoginDialog(QDialog):
     def __init__(self):
         super().__init__()
         self.email = None
         self.api_key = None
+        self.transport = None
 
         self.setWindowTitle("Login")
         layout = QVBoxLayout()
@@ -39,6 +50,13 @@ class LoginDialog(QDialog):
         layout.addWidget(api_key_label)
         layout.addWidget(self.api_key_input)
 
+        transport_label = QLabel("Send Mail Via:")
+        self.transport_input = QComboBox()
+        for kind, label in TRANSPORTS.items():
+            self.transport_input.addItem(label, kind)
+        layout.addWidget(transport_label)
+        layout.addWidget(self.transport_input)
+
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         buttons.accepted.connect(self.accept)
         buttons.rejected.connect(self.reject)
@@ -49,33 +67,896 @@ class LoginDialog(QDialog):
     def accept(self):
         self.email = self.email_input.text().strip()
         self.api_key = self.api_key_input.text().strip()
+        self.transport = self.transport_input.currentData()
         super().accept()
 
+HEADERS = ["Building Name", "Apartment", "Name", "Email", "Lease Start", "Lease End"]
+CAMPAIGN_RATE = 20  # reminder emails per second
+BUILDING_PAGE_SIZE = 200
+APARTMENT_PAGE_SIZE = 500
+EXPIRY_CHECK_INTERVAL_MS = 60 * 1000
+SEARCH_DEBOUNCE_MS = 150
+# Edits made within this long of each other are written together
+EDIT_FLUSH_DELAY_MS = 500
+SEARCH_LIMIT = 1000
+# Reminders added to the queue list per pass of the event loop
+REMINDER_BATCH_SIZE = 500
+# How often to look for changes saved by other copies of the app
+CHANGE_POLL_INTERVAL_MS = 1000
+# More changed rows than this at once and the view is reloaded instead
+CHANGE_DELTA_LIMIT = 2000
+# Event loop heartbeat while timings are recorded; a late beat is a stall
+HEARTBEAT_INTERVAL_MS = 50
+# Set to 1 to record timings from startup
+TELEMETRY_ENV = "LEASE_NAVIGATOR_TELEMETRY"
+# Portfolio figures are recomputed once writes pause for this long
+DASHBOARD_REFRESH_DELAY_MS = 1000
+# Buildings listed on the dashboard, lowest occupancy first
+DASHBOARD_BUILDING_ROWS = 200
+# How often a snapshot of the database is taken in the background
+BACKUP_INTERVAL_MS = 15 * 60 * 1000
+# Port for the read-only JSON API; overrides the "api_port" setting, and
+# with neither set the API is off
+API_PORT_ENV = "LEASE_NAVIGATOR_API_PORT"
+
+
+def runs(rows):
+    # (first, last) of each run of consecutive numbers in sorted `rows`
+    spans = []
+    for row in rows:
+        if spans and spans[-1][1] == row - 1:
+            spans[-1][1] = row
+        else:
+            spans.append([row, row])
+    return spans
+
+
+class BuildingRow:
+    __slots__ = ("id", "name", "sort_key", "apartment_count", "apartments", "last_apartment_key", "exhausted",
+                 "row")
+
+    def __init__(self, building_id, name, sort_key, apartment_count, row):
+        self.id = building_id
+        self.name = name
+        self.sort_key = sort_key
+        self.apartment_count = apartment_count
+        self.apartments = []
+        # (sort_key, id) of the last apartment fetched
+        self.last_apartment_key = FIRST_KEY
+        self.exhausted = apartment_count == 0
+        self.row = row
+
+
+class ApartmentRow:
+    __slots__ = ("id", "building", "values", "version")
+
+    def __init__(self, apartment_id, building, values, version):
+        self.id = apartment_id
+        self.building = building
+        # (apartment, name, email, lease start, lease end), shown in columns 1-5
+        self.values = values
+        # Row version read from the database; a save only lands on this one
+        self.version = version
+
+
+class LeaseModel(QAbstractItemModel):
+    # Buildings are fetched a page at a time as the view scrolls, and a
+    # building's apartments only once it is expanded, both in natural name
+    # order straight from the database. Building indexes carry no internal
+    # pointer; apartment indexes point at their BuildingRow.
+
+    # Carries the text of a lease date edit that isn't a date
+    invalid_date = pyqtSignal(str)
+
+    def __init__(self, db, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.buildings = []
+        # (sort_key, id) of the last building fetched
+        self.last_building_key = FIRST_KEY
+        self.buildings_exhausted = False
+
+        # Search results: building id -> matching apartment rows, or None to show everything
+        self.matches = None
+
+        # Apartment id -> ApartmentRow for every apartment fetched so far
+        self.loaded = {}
+
+        # Unsaved changes: edited rows and deleted ids -> version, by apartment id
+        self.edits = {}
+        self.deleted = {}
+
+    def reload(self):
+        self.beginResetModel()
+        self.buildings = []
+        self.loaded = {}
+        self.last_building_key = FIRST_KEY
+        self.buildings_exhausted = False
+        self.endResetModel()
+
+    @timed("tree.set_matches")
+    def set_matches(self, apartment_ids, reload=False):
+        # Shows only these apartments and their buildings; None shows everything.
+        # The matching rows are read in one query up front. A new set of
+        # matches only removes and inserts the rows that differ from what is
+        # shown, so the view keeps its place; clearing the search, or
+        # `reload`, resets the model. True when it was reset and needs its
+        # first page fetched.
+        if apartment_ids is None:
+            if self.matches is None and not reload:
+                return False
+            self.matches = None
+            self.reload()
+            return True
+
+        matches = {}
+        for row in self.db.apartments_by_ids(apartment_ids):
+            matches.setdefault(row[1], []).append((row[0], *row[2:]))
+        self.matches = matches
+        if reload:
+            self.reload()
+            return True
+        self.filter_rows(matches)
+        return False
+
+    def filter_rows(self, matches):
+        # Turns the buildings and apartments shown into exactly `matches`,
+        # building id -> apartments_page rows
+        self.buildings_exhausted = True
+        buildings = {row[0]: row for row in self.db.buildings_by_ids(matches)}
+        # A building renamed into another place in the order is put back
+        # where it now belongs
+        self.take_buildings([building for building in self.buildings
+                             if building.id not in buildings or buildings[building.id][2] != building.sort_key])
+
+        by_id = {building.id: building for building in self.buildings}
+        for building_id, name, sort_key, _ in buildings.values():
+            building = by_id.get(building_id)
+            if building is None:
+                building = self.insert_building(building_id, name, sort_key, len(matches[building_id]))
+            elif building.name != name:
+                building.name = name
+                index = self.createIndex(building.row, 0)
+                self.dataChanged.emit(index, index, [Qt.DisplayRole])
+            self.filter_apartments(building, matches[building_id])
+
+    def filter_apartments(self, building, rows):
+        wanted = {row[0]: row for row in rows}
+        parent = self.createIndex(building.row, 0)
+        gone = []
+        for row, apartment in enumerate(building.apartments):
+            stored = wanted.get(apartment.id)
+            if stored is None:
+                gone.append(row)
+            elif apartment.id not in self.edits:
+                # Kept rows take what is stored now; one whose number sorts
+                # elsewhere is taken out and inserted again
+                if natural_key(apartment.values[0]) != stored[-1]:
+                    gone.append(row)
+                    continue
+                values = tuple("" if value is None else value for value in stored[1:6])
+                apartment.version = stored[6]
+                if values != apartment.values:
+                    apartment.values = values
+                    index = self.createIndex(row, 1, building)
+                    self.dataChanged.emit(index, index.sibling(row, len(HEADERS) - 1), [Qt.DisplayRole, Qt.EditRole])
+        for first, last in reversed(runs(gone)):
+            self.beginRemoveRows(parent, first, last)
+            for apartment in building.apartments[first:last + 1]:
+                # Unless it already moved into a building handled before
+                if self.loaded.get(apartment.id) is apartment:
+                    del self.loaded[apartment.id]
+            del building.apartments[first:last + 1]
+            self.endRemoveRows()
+
+        shown = {apartment.id for apartment in building.apartments}
+        building.exhausted = True
+        for apartment in self.apartment_rows(building, [row for row in rows if row[0] not in shown]):
+            self.insert_apartment(building, apartment)
+        building.apartment_count = len(building.apartments)
+
+    def building_at(self, index):
+        # The building of a building index, or the parent building of an apartment index
+        if not index.isValid():
+            return None
+        building = index.internalPointer()
+        return building if building is not None else self.buildings[index.row()]
+
+    def apartment_at(self, index):
+        if not index.isValid() or index.internalPointer() is None:
+            return None
+        return index.internalPointer().apartments[index.row()]
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column)
+        return self.createIndex(row, column, self.buildings[parent.row()])
+
+    def parent(self, index):
+        if not index.isValid() or index.internalPointer() is None:
+            return QModelIndex()
+        return self.createIndex(index.internalPointer().row, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self.buildings)
+        if parent.internalPointer() is None and parent.column() == 0:
+            return len(self.buildings[parent.row()].apartments)
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(HEADERS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return True
+        if parent.internalPointer() is None and parent.column() == 0:
+            return self.buildings[parent.row()].apartment_count > 0
+        return False
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        apartment = self.apartment_at(index)
+        if apartment is None:
+            building = self.buildings[index.row()]
+            if role == Qt.DisplayRole and index.column() == 0:
+                return building.name
+            if role == Qt.UserRole:
+                return building.id
+            return None
+
+        if role in (Qt.DisplayRole, Qt.EditRole) and index.column() > 0:
+            return apartment.values[index.column() - 1]
+        if role == Qt.UserRole:
+            return apartment.id
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.internalPointer() is not None and index.column() > 0:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        apartment = self.apartment_at(index)
+        if apartment is None or role != Qt.EditRole or index.column() == 0:
+            return False
+
+        # Dates are kept in ISO form even when typed as MM/dd/yyyy; anything
+        # else is refused rather than stored
+        if index.column() >= 4:
+            date = iso_date(value)
+            if date is None:
+                self.invalid_date.emit(value)
+                return False
+            value = date
+
+        values = list(apartment.values)
+        values[index.column() - 1] = value
+        if tuple(values) == apartment.values:
+            return False
+
+        apartment.values = tuple(values)
+        self.edits[apartment.id] = apartment
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+    def canFetchMore(self, parent):
+        if not parent.isValid():
+            return not self.buildings_exhausted
+        if parent.internalPointer() is None:
+            return not self.buildings[parent.row()].exhausted
+        return False
+
+    def fetchMore(self, parent):
+        # Views may call this with nothing left to fetch
+        if not self.canFetchMore(parent):
+            return
+        if not parent.isValid():
+            self.fetch_buildings()
+        elif parent.internalPointer() is None:
+            self.fetch_apartments(parent, self.buildings[parent.row()])
+
+    @timed("tree.fetch_buildings")
+    def fetch_buildings(self):
+        if self.matches is not None:
+            # Search results are capped, so they arrive in one go
+            rows = [(building_id, name, len(self.matches[building_id]), sort_key)
+                    for building_id, name, sort_key, _ in self.db.buildings_by_ids(self.matches)]
+            self.buildings_exhausted = True
+        else:
+            rows = self.db.buildings_page(self.last_building_key, BUILDING_PAGE_SIZE)
+            self.buildings_exhausted = len(rows) < BUILDING_PAGE_SIZE
+        if not rows:
+            return
+
+        first = len(self.buildings)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        for row, (building_id, name, apartment_count, sort_key) in enumerate(rows, first):
+            building = BuildingRow(building_id, name, sort_key, apartment_count, row)
+            if self.matches is not None:
+                # Matching apartments come with their building, so expanding
+                # search results needs no further fetches
+                building.apartments = self.apartment_rows(building, self.matches[building_id])
+                building.apartment_count = len(building.apartments)
+                building.exhausted = True
+            self.buildings.append(building)
+        self.last_building_key = (rows[-1][3], rows[-1][0])
+        self.endInsertRows()
+
+    @timed("tree.fetch_apartments")
+    def fetch_apartments(self, parent, building):
+        rows = self.db.apartments_page(building.id, building.last_apartment_key, APARTMENT_PAGE_SIZE)
+        building.exhausted = len(rows) < APARTMENT_PAGE_SIZE
+        if not rows:
+            return
+        building.last_apartment_key = (rows[-1][-1], rows[-1][0])
+
+        apartments = self.apartment_rows(building, rows)
+        if not apartments:
+            return
+
+        first = len(building.apartments)
+        self.beginInsertRows(parent, first, first + len(apartments) - 1)
+        building.apartments.extend(apartments)
+        self.endInsertRows()
+
+    def apartment_rows(self, building, rows):
+        # rows are apartments_page rows, ending in the version and sort key
+        apartments = []
+        for apartment_id, *values, version, _ in rows:
+            if apartment_id in self.deleted:
+                continue
+            # Unsaved edits win over what is stored in the database
+            apartment = self.edits.get(apartment_id)
+            if apartment is None:
+                apartment = ApartmentRow(apartment_id, building,
+                                         tuple("" if value is None else value for value in values), version)
+            apartment.building = building
+            apartments.append(apartment)
+            self.loaded[apartment_id] = apartment
+        return apartments
+
+    def append_building(self, building_id, name):
+        self.insert_building(building_id, name, natural_key(name), 0)
+
+    def insert_building(self, building_id, name, sort_key, apartment_count):
+        # A row sorting after the last one fetched arrives with a later page;
+        # otherwise it goes in at its place in natural order. Returns the new
+        # BuildingRow, or None.
+        if not self.buildings_exhausted and (sort_key, building_id) > self.last_building_key:
+            return None
+        row = bisect([(building.sort_key, building.id) for building in self.buildings], (sort_key, building_id))
+        building = BuildingRow(building_id, name, sort_key, apartment_count, row)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.buildings.insert(row, building)
+        for later in self.buildings[row + 1:]:
+            later.row += 1
+        self.endInsertRows()
+        return building
+
+    def take_building(self, building):
+        self.take_buildings([building])
+
+    def take_buildings(self, buildings):
+        # Removes each run of adjacent rows in one go, the last run first
+        for first, last in reversed(runs(sorted(building.row for building in buildings))):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for building in self.buildings[first:last + 1]:
+                for apartment in building.apartments:
+                    self.loaded.pop(apartment.id, None)
+            del self.buildings[first:last + 1]
+            for row, later in enumerate(self.buildings[first:], first):
+                later.row = row
+            self.endRemoveRows()
+
+    def append_apartment(self, building, apartment_id, values):
+        building.apartment_count += 1
+        self.insert_apartment(building, ApartmentRow(apartment_id, building, values, 1))
+
+    def insert_apartment(self, building, apartment):
+        key = (natural_key(apartment.values[0]), apartment.id)
+        if not building.exhausted and key > building.last_apartment_key:
+            return
+        parent = self.createIndex(building.row, 0)
+        row = bisect([(natural_key(other.values[0]), other.id) for other in building.apartments], key)
+        self.beginInsertRows(parent, row, row)
+        building.apartments.insert(row, apartment)
+        self.loaded[apartment.id] = apartment
+        self.endInsertRows()
+
+    def take_apartment(self, apartment):
+        building = apartment.building
+        row = building.apartments.index(apartment)
+        self.beginRemoveRows(self.createIndex(building.row, 0), row, row)
+        del building.apartments[row]
+        self.loaded.pop(apartment.id, None)
+        self.endRemoveRows()
+
+    def remove_apartment(self, index):
+        apartment = self.apartment_at(index)
+        self.take_apartment(apartment)
+        apartment.building.apartment_count -= 1
+        self.edits.pop(apartment.id, None)
+        self.deleted[apartment.id] = apartment.version
+
+    @timed("tree.apply_changes")
+    def apply_changes(self, building_ids, apartments):
+        # Brings rows that another user changed up to date without a reset.
+        # `apartments` maps each changed apartment id to its apartments_by_ids
+        # row, or None once deleted. Rows that stay in place are updated,
+        # renamed or moved ones change places, deleted ones go, and new ones
+        # appear if their part of the list has been fetched. Rows with
+        # unsaved edits are left alone; saving them reports the conflict.
+        by_id = {building.id: building for building in self.buildings}
+        counted = set(building_ids) | {row[1] for row in apartments.values() if row is not None}
+        counted |= {self.loaded[apartment_id].building.id for apartment_id in apartments
+                    if apartment_id in self.loaded}
+        buildings = {row[0]: row for row in self.db.buildings_by_ids(counted)}
+
+        for building_id in building_ids:
+            row = buildings.get(building_id)
+            building = by_id.get(building_id)
+            if building is not None and (row is None or row[2] != building.sort_key):
+                self.take_building(building)
+                building = None
+            if building is not None:
+                building.name = row[1]
+                index = self.createIndex(building.row, 0)
+                self.dataChanged.emit(index, index, [Qt.DisplayRole])
+            elif row is not None:
+                self.insert_building(building_id, row[1], row[2], row[3])
+        by_id = {building.id: building for building in self.buildings}
+
+        for apartment_id, row in apartments.items():
+            if apartment_id in self.edits or apartment_id in self.deleted:
+                continue
+            apartment = self.loaded.get(apartment_id)
+            if row is not None:
+                values = tuple("" if value is None else value for value in row[2:7])
+                if (apartment is not None and apartment.building.id == row[1]
+                        and natural_key(apartment.values[0]) == row[-1]):
+                    apartment.values = values
+                    apartment.version = row[7]
+                    index = self.createIndex(apartment.building.apartments.index(apartment), 1, apartment.building)
+                    self.dataChanged.emit(index, index.sibling(index.row(), len(HEADERS) - 1),
+                                          [Qt.DisplayRole, Qt.EditRole])
+                    continue
+            if apartment is not None:
+                self.take_apartment(apartment)
+            building = by_id.get(row[1]) if row is not None else None
+            if building is not None:
+                self.insert_apartment(building, ApartmentRow(apartment_id, building, values, row[7]))
+
+        for building_id, row in buildings.items():
+            building = by_id.get(building_id)
+            if building is not None:
+                building.apartment_count = row[3]
+
+    def mark_saved(self, conflicts):
+        # Saved rows are now one version further on; conflicting ones stay
+        # unsaved until the user decides
+        for apartment in self.edits.values():
+            if apartment.id not in conflicts:
+                apartment.version += 1
+        self.edits = {apartment_id: apartment for apartment_id, apartment in self.edits.items()
+                      if apartment_id in conflicts}
+        self.deleted = {apartment_id: version for apartment_id, version in self.deleted.items()
+                        if apartment_id in conflicts}
+
+    def rebase(self, versions):
+        # The next save overwrites these stored versions
+        for apartment_id, version in versions.items():
+            if apartment_id in self.deleted:
+                self.deleted[apartment_id] = version
+            else:
+                self.edits[apartment_id].version = version
+
+    def discard(self, apartment_ids):
+        for apartment_id in apartment_ids:
+            self.edits.pop(apartment_id, None)
+            self.deleted.pop(apartment_id, None)
+
+
+class TaskWorker(QThread):
+    # Runs task(progress) off the GUI thread; progress(done, total) and the
+    # outcome are delivered back to the GUI thread through signals
+    progress = pyqtSignal(int, int)
+    completed = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, task, parent=None, name="task"):
+        super().__init__(parent)
+        self.task = task
+        self.name = name
+
+    def run(self):
+        try:
+            with span(self.name):
+                result = self.task(self.progress.emit)
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.completed.emit(result)
+
+
+class DiagnosticsDialog(QDialog):
+    # Per-operation timings and recent event loop stalls from the telemetry
+    # ring buffer, with an export of everything recorded as JSON
+    COLUMNS = ["Operation", "Calls", "p50 ms", "p95 ms", "Max ms", "Queries/call"]
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.setWindowTitle("Diagnostics")
+        self.resize(900, 600)
+        layout = QVBoxLayout()
+
+        self.enabled_input = QCheckBox("Record timings")
+        self.enabled_input.setChecked(telemetry.enabled)
+        self.enabled_input.toggled.connect(self.toggle)
+        layout.addWidget(self.enabled_input)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setColumnWidth(0, 300)
+        layout.addWidget(self.table)
+
+        layout.addWidget(QLabel(f"Stalls over {telemetry.stall_threshold_ms} ms:"))
+        self.stalls_list = QListWidget()
+        layout.addWidget(self.stalls_list)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Close)
+        buttons.addButton("Refresh", QDialogButtonBox.ActionRole).clicked.connect(self.refresh)
+        buttons.addButton("Reset", QDialogButtonBox.ResetRole).clicked.connect(self.reset)
+        buttons.addButton("Export...", QDialogButtonBox.ActionRole).clicked.connect(self.export)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+        self.setLayout(layout)
+        self.refresh()
+
+    def refresh(self):
+        rows = telemetry.summary()
+        self.table.setRowCount(len(rows))
+        for row, summary in enumerate(rows):
+            cells = [summary["operation"], str(summary["count"]), f"{summary['p50_ms']:.1f}",
+                     f"{summary['p95_ms']:.1f}", f"{summary['max_ms']:.1f}", f"{summary['queries_per_call']:.1f}"]
+            for column, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+
+        self.stalls_list.clear()
+        for stall in reversed(telemetry.stalls):
+            during = ", ".join(stall.during) or "no recorded operation"
+            self.stalls_list.addItem(f"{stall.duration_ms:.0f} ms during {during}")
+
+    def toggle(self, enabled):
+        self.app.set_telemetry(enabled)
+        self.app.settings.setValue("telemetry", enabled)
+        self.refresh()
+
+    def reset(self):
+        telemetry.reset()
+        self.refresh()
+
+    def export(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Diagnostics", "diagnostics.json", "JSON (*.json)")
+        if file_path:
+            telemetry.export(file_path)
+
+
+class BackupsDialog(QDialog):
+    # Snapshots in the backups folder, newest first. Restoring one replaces
+    # the data for every open copy of the app.
+    COLUMNS = ["Taken", "Type", "Size"]
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.setWindowTitle("Backups")
+        self.resize(600, 450)
+        layout = QVBoxLayout()
+
+        layout.addWidget(QLabel(f"Saved in {app.backups.directory}"))
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setColumnWidth(0, 200)
+        self.table.itemSelectionChanged.connect(self.selection_changed)
+        layout.addWidget(self.table)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Close)
+        buttons.addButton("Back Up Now", QDialogButtonBox.ActionRole).clicked.connect(self.back_up)
+        self.restore_button = buttons.addButton("Restore...", QDialogButtonBox.ActionRole)
+        self.restore_button.clicked.connect(self.restore)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+        self.setLayout(layout)
+        self.refresh()
+
+    def refresh(self):
+        self.snapshots = list(reversed(self.app.backups.snapshots()))
+        self.table.setRowCount(len(self.snapshots))
+        for row, snapshot in enumerate(self.snapshots):
+            cells = [snapshot.taken.strftime("%Y-%m-%d %H:%M:%S"),
+                     "Full" if snapshot.kind == FULL else "Changes only", f"{snapshot.size / 1024 / 1024:.1f} MB"]
+            for column, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                if column == 2:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+        self.selection_changed()
+
+    def selection_changed(self):
+        self.restore_button.setEnabled(bool(self.table.selectionModel().selectedRows()))
+
+    def back_up(self):
+        self.app.run_task("Backing up...", lambda progress: self.app.backups.back_up(progress, full=True),
+                          lambda snapshot: self.refresh(), cancel=self.app.backups.cancel)
+
+    def restore(self):
+        rows = self.table.selectionModel().selectedRows()
+        if rows:
+            snapshot = self.snapshots[rows[0].row()]
+            self.accept()
+            self.app.restore_backup(snapshot)
+
+
+class LetterTemplateDialog(QDialog):
+    # Edits the renewal letter template, which uses the same placeholders
+    # as the reminder email
+    def __init__(self, template, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Renewal Letter")
+        self.resize(700, 500)
+        layout = QVBoxLayout()
+
+        self.template_input = QTextEdit()
+        self.template_input.setPlainText(template)
+        self.template_input.setToolTip("Placeholders: {Name}, {Email}, {Building}, {Apartment}, {Lease Start}, "
+                                       "{Lease End}, {Days Remaining}")
+        layout.addWidget(self.template_input)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.addButton("Default", QDialogButtonBox.ResetRole).clicked.connect(
+            lambda: self.template_input.setPlainText(DEFAULT_LETTER_TEMPLATE))
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.setLayout(layout)
+
+    def template(self):
+        return self.template_input.toPlainText()
+
+
+class DashboardPanel(QWidget):
+    # Portfolio figures next to the tree: occupancy by building, occupancy
+    # and expected vacancies by month, and the lease expiry waterfall. The
+    # figures are computed by the app on a worker thread and handed to display().
+    BUILDING_COLUMNS = ["Building", "Units", "Year ago", "Now", "In a year", "Avg term (mo)"]
+    MONTH_COLUMNS = ["Month", "Occupied", "Occupancy", "Ending", "Expected vacant"]
+    EXPIRY_COLUMNS = ["Period", "Leases ending"]
+
+    def __init__(self, app):
+        super().__init__()
+        self.app = app
+        self.dashboard = None
+        layout = QVBoxLayout()
+
+        self.summary_label = QLabel("Loading portfolio figures...")
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        tabs = QTabWidget()
+        self.buildings_table = self.table(self.BUILDING_COLUMNS)
+        tabs.addTab(self.buildings_table, "Occupancy")
+
+        self.renewal_input = QSpinBox()
+        self.renewal_input.setRange(0, 100)
+        self.renewal_input.setSuffix("%")
+        self.renewal_input.setValue(app.settings.value("renewal_rate", 0, int))
+        self.renewal_input.valueChanged.connect(self.renewal_rate_changed)
+        self.months_table = self.table(self.MONTH_COLUMNS)
+        forecast_layout = QVBoxLayout()
+        renewal_layout = QHBoxLayout()
+        renewal_layout.addWidget(QLabel("Ending leases renewed:"))
+        renewal_layout.addWidget(self.renewal_input)
+        forecast_layout.addLayout(renewal_layout)
+        forecast_layout.addWidget(self.months_table)
+        forecast_widget = QWidget()
+        forecast_widget.setLayout(forecast_layout)
+        tabs.addTab(forecast_widget, "Forecast")
+
+        self.period_input = QComboBox()
+        self.period_input.addItems(["By month", "By quarter"])
+        self.period_input.currentIndexChanged.connect(self.show_expiries)
+        self.expiries_table = self.table(self.EXPIRY_COLUMNS)
+        expiries_layout = QVBoxLayout()
+        expiries_layout.addWidget(self.period_input)
+        expiries_layout.addWidget(self.expiries_table)
+        expiries_widget = QWidget()
+        expiries_widget.setLayout(expiries_layout)
+        tabs.addTab(expiries_widget, "Expiries")
+
+        layout.addWidget(tabs)
+        self.setLayout(layout)
+
+    def table(self, columns):
+        table = QTableWidget(0, len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        return table
+
+    def renewal_rate(self):
+        return self.renewal_input.value() / 100
+
+    def renewal_rate_changed(self, value):
+        self.app.settings.setValue("renewal_rate", value)
+        self.app.refresh_dashboard()
+
+    def fill(self, table, rows):
+        table.setRowCount(len(rows))
+        for row, cells in enumerate(rows):
+            for column, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                if column:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                table.setItem(row, column, item)
+
+    def display(self, dashboard):
+        self.dashboard = dashboard
+        occupancy = dashboard.occupied / dashboard.units if dashboard.units else 0
+        self.summary_label.setText(
+            f"{dashboard.units:,} units, {dashboard.occupied:,} leased ({occupancy:.1%}). "
+            f"Average lease term {dashboard.average_term_months:.1f} months. "
+            f"{dashboard.ending_soon:,} leases end in the next {dashboard.ending_soon_days} days.")
+
+        def rate(value):
+            return "-" if value != value else f"{value:.0%}"
+
+        self.fill(self.buildings_table, [
+            (name, f"{units:,}", rate(year_ago), rate(now), rate(in_a_year), "-" if term != term else f"{term:.1f}")
+            for name, units, year_ago, now, in_a_year, term in dashboard.buildings[:DASHBOARD_BUILDING_ROWS]])
+        self.fill(self.months_table, [
+            (month, f"{occupied:,}", rate(occupancy), "" if ending is None else f"{ending:,}",
+             "" if vacant is None else f"{vacant:,.0f}")
+            for month, occupied, occupancy, ending, vacant in dashboard.months])
+        self.show_expiries()
+
+    def show_expiries(self):
+        if self.dashboard is not None:
+            periods = (self.dashboard.expiries_by_quarter if self.period_input.currentIndex()
+                       else self.dashboard.expiries_by_month)
+            self.fill(self.expiries_table, [(period, f"{count:,}") for period, count in periods])
+
+    def show_error(self, error):
+        self.summary_label.setText(f"Portfolio figures unavailable: {error}")
+
 
 class PropertyManagerApp(QWidget):
-    def __init__(self, email=None, api_key=None):
+    def __init__(self, email=None, api_key=None, db_name='property_manager.db', transport='sendgrid'):
         super().__init__()
 
-        self.db_name = 'property_manager.db'
+        self.db_name = db_name
         self.settings = QSettings("YourOrganization", "YourApplication")
         self.email = email
         self.api_key = api_key
+        self.transport_kind = transport
+        self.transport = None
+        self.attachment_store = AttachmentStore()
+        self.chart_cache = ChartCache()
+        # Loaded on first use, on the dashboard's worker thread, so NumPy
+        # stays out of startup
+        self.analytics = None
+        self.dashboard_worker = None
+        self.dashboard_stale = False
+        self.backup_worker = None
+        self.api_server = None
         self.init_db()
         self.resize(1440, 800)
 
-        self.init_ui()
-        self.load_data()
+        # Timings are recorded from here on when switched on
+        self.heartbeat_timer = QTimer(self)
+        self.heartbeat_timer.setInterval(HEARTBEAT_INTERVAL_MS)
+        self.heartbeat_timer.timeout.connect(telemetry.heartbeat)
+        self.set_telemetry(os.environ.get(TELEMETRY_ENV) == "1" or self.settings.value("telemetry", False, bool))
 
+        self.init_ui()
         self.apply_styles()
         self.attached_files = []
 
+        # Expiring leases are queued for reminders as they cross a threshold.
+        # The index is built on a worker thread; writes made before it is
+        # ready are replayed onto it.
+        self.scheduler = None
+        self.scheduler_loader = None
+        self.pending_schedule = {}
+        self.pending_schedule_reload = False
+        self.queued_reminders = {}
+        self.expiry_backlog = []
+        self.expiry_timer = QTimer(self)
+        self.expiry_timer.timeout.connect(self.check_expiries)
+
+        # Other copies of the app may be writing to the same database
+        self.change_timer = QTimer(self)
+        self.change_timer.timeout.connect(self.check_peer_changes)
+
+        # Snapshots are taken on a worker thread, a few pages at a time
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.back_up)
+
         try:
             self.restoreGeometry(self.settings.value("geometry"))
         except TypeError:
             pass
 
-        self.apply_styles()
-        self.attached_files = []
+        # Nothing is read until the window has had a chance to paint
+        QTimer.singleShot(0, self.load_session)
+
+    def load_session(self):
+        # Changes logged before this point are already in what is loaded
+        self.change_seq = self.db.last_change()
+        self.commit_version = self.db.commit_version()
+        self.load_data()
+        self.change_timer.start(CHANGE_POLL_INTERVAL_MS)
+        self.backup_timer.start(BACKUP_INTERVAL_MS)
+        port = int(os.environ.get(API_PORT_ENV) or self.settings.value("api_port", 0, int))
+        if port:
+            self.start_api(port)
+        # Left until the tree and the reminder queue have filled in
+        self.dashboard_timer.start()
+
+        self.scheduler_loader = TaskWorker(lambda progress: ExpiryScheduler(self.db), self, "task.load_expiries")
+        self.scheduler_loader.completed.connect(self.scheduler_loaded)
+        self.scheduler_loader.failed.connect(
+            lambda error: QMessageBox.warning(self, "Error", f"Could not load lease expiries: {error}"))
+        self.scheduler_loader.start()
+
+    def scheduler_loaded(self, scheduler):
+        if self.pending_schedule_reload:
+            scheduler.reload()
+        for apartment_id, lease_end in self.pending_schedule.items():
+            if lease_end is None:
+                scheduler.remove(apartment_id)
+            else:
+                scheduler.update(apartment_id, lease_end)
+        self.scheduler = scheduler
+        self.pending_schedule = {}
+        self.expiry_timer.start(EXPIRY_CHECK_INTERVAL_MS)
+        self.check_expiries()
+
+    def schedule(self, apartment_id, lease_end):
+        # Keeps the expiry index in step with a write; lease_end is None
+        # once the apartment is deleted
+        if self.scheduler is None:
+            self.pending_schedule[apartment_id] = lease_end
+        elif lease_end is None:
+            self.scheduler.remove(apartment_id)
+        else:
+            self.scheduler.update(apartment_id, lease_end)
+
+    def reload_schedule(self):
+        if self.scheduler is None:
+            self.pending_schedule_reload = True
+        else:
+            self.scheduler.reload()
 
     def apply_styles(self):
         self.setStyleSheet("""
@@ -84,18 +965,18 @@ class PropertyManagerApp(QWidget):
                 font-size: 18px;
                 color: #333;
             }
-            QTreeWidget {
+            QTreeView {
                 background-color: #fff;
                 border: none;
             }
-            QTreeWidget::item {
+            QTreeView::item {
                 padding: 10px;
             }
-            QTreeWidget::item:selected {
+            QTreeView::item:selected {
                 background-color: #e6f3ff;
                 color: #333;
             }
-            QTreeWidget::item:hover {
+            QTreeView::item:hover {
                 background-color: #f5f5f5;
             }
             QHeaderView::section {
@@ -171,26 +1052,13 @@ class PropertyManagerApp(QWidget):
         """)
 
     def init_db(self):
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-
-        # Create table if not exists
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS buildings
-            (id INTEGER PRIMARY KEY, name TEXT)
-        ''')
-
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS apartments
-            (id INTEGER PRIMARY KEY, building_id INTEGER, name TEXT, email TEXT, lease_start TEXT, lease_end TEXT)
-        ''')
-
-        conn.commit()
-        conn.close()
-
-    def save_changes(self):
-        self.save_data()
-        QMessageBox.information(self, "Saved", "Changes have been saved.")
+        # One long-lived connection serves every UI action
+        self.db = Database(self.db_name)
+        telemetry.attach(self.db)
+        self.db.migrate()
+        self.db.prune_change_log()
+        self.backups = BackupManager(
+            self.db, os.path.join(QStandardPaths.writableLocation(QStandardPaths.AppDataLocation), "backups"))
 
     def init_ui(self):
         self.layout = QVBoxLayout()
@@ -205,20 +1073,28 @@ class PropertyManagerApp(QWidget):
         chart_widget = QWidget()
         chart_widget.setObjectName("chartWidget")
 
-        # Tree widget
-        self.tree = QTreeWidget()
-        self.tree.setColumnCount(6)
+        # Tree view over the lazily fetched lease model
+        self.model = LeaseModel(self.db, self)
+        # Cell edits and deletes are saved once editing pauses, in one
+        # transaction, one statement per touched row
+        self.edit_timer = QTimer(self)
+        self.edit_timer.setSingleShot(True)
+        self.edit_timer.setInterval(EDIT_FLUSH_DELAY_MS)
+        self.edit_timer.timeout.connect(self.save_data)
+        self.model.dataChanged.connect(self.edit_timer.start)
+        self.model.invalid_date.connect(lambda text: QMessageBox.warning(
+            self, "Error", f"\"{text}\" is not a date. Enter it as yyyy-MM-dd or MM/dd/yyyy."))
+        self.tree = QTreeView()
+        self.tree.setModel(self.model)
+        self.tree.setUniformRowHeights(True)
         header = self.tree.header()
         header.setFont(QFont("Segoe UI", 12, QFont.Bold))
         header.setStyleSheet(
             "QHeaderView::section { background-color: #f5f5f5; color: #333; padding: 8px; border: none; }")
-        self.tree.setHeaderLabels(
-            ["Building Name", "Apartment", "Name", "Email", "Lease Start", "Lease End"])
-        self.tree.itemClicked.connect(self.handle_item_clicked)
-        self.tree.itemChanged.connect(self.handle_item_changed)
+        self.tree.clicked.connect(self.handle_item_clicked)
 
         self.tree.setStyleSheet("""
-            QTreeWidget::item {
+            QTreeView::item {
                 padding: 10px;
                 border-right: 1px solid #ccc;  /* Add vertical grid line */
             }
@@ -232,24 +1108,51 @@ class PropertyManagerApp(QWidget):
         self.tree.setColumnWidth(4, 140)  # Lease Start
         self.tree.setColumnWidth(5, 200)  # Lease End
 
-        self.tree.setSortingEnabled(False)
-        self.tree.sortByColumn(1, Qt.AscendingOrder)
-        items = self.tree.findItems("", Qt.MatchContains, 1)
-        sorted_items = sorted(items,
-                              key=lambda item: [int(num) if num.isdigit() else num for num in re.split(r'(\d+)',
-                                                                                                      item.text(1))])
-        sorted_items.sort(key=lambda item: int(item.text(1).split('-')[0]) if item.text(1).split('-')[
-                                                                                  0].isdigit() else float('inf'))
-        for index, item in enumerate(sorted_items):
-            self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(item))
-            self.tree.insertTopLevelItem(index, item)
-        self.tree.setSortingEnabled(True)
-
         self.download_button = QPushButton("Download Chart")
         self.download_button.clicked.connect(self.download_chart)
-        chart_layout.addWidget(self.download_button)
-
-        chart_layout.addWidget(self.tree)
+        self.export_button = QPushButton("Export Lease Roll")
+        self.export_button.clicked.connect(self.export_lease_roll)
+        self.import_button = QPushButton("Import Lease Roll")
+        self.import_button.clicked.connect(self.import_lease_roll)
+        self.diagnostics_button = QPushButton("Diagnostics")
+        self.diagnostics_button.clicked.connect(self.show_diagnostics)
+        self.backups_button = QPushButton("Backups")
+        self.backups_button.clicked.connect(self.show_backups)
+        chart_buttons_layout = QHBoxLayout()
+        chart_buttons_layout.addWidget(self.download_button)
+        chart_buttons_layout.addWidget(self.import_button)
+        chart_buttons_layout.addWidget(self.export_button)
+        chart_buttons_layout.addWidget(self.backups_button)
+        chart_buttons_layout.addWidget(self.diagnostics_button)
+        chart_layout.addLayout(chart_buttons_layout)
+
+        # Search runs once typing pauses, against the full-text index
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search buildings, units, tenants and emails")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_status = QLabel()
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.apply_search)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        search_layout = QHBoxLayout()
+        search_layout.addWidget(self.search_input)
+        search_layout.addWidget(self.search_status)
+        chart_layout.addLayout(search_layout)
+
+        # Portfolio dashboard beside the tree, refreshed after writes
+        self.dashboard = DashboardPanel(self)
+        self.dashboard_timer = QTimer(self)
+        self.dashboard_timer.setSingleShot(True)
+        self.dashboard_timer.setInterval(DASHBOARD_REFRESH_DELAY_MS)
+        self.dashboard_timer.timeout.connect(self.refresh_dashboard)
+        tree_splitter = QSplitter(Qt.Horizontal)
+        tree_splitter.addWidget(self.tree)
+        tree_splitter.addWidget(self.dashboard)
+        tree_splitter.setStretchFactor(0, 3)
+        tree_splitter.setStretchFactor(1, 2)
+        chart_layout.addWidget(tree_splitter)
 
         # Add the chart widget to the layout
         chart_widget.setLayout(chart_layout)
@@ -267,7 +1170,9 @@ class PropertyManagerApp(QWidget):
         # Building input
         self.building_name_input = QLineEdit()
         self.add_building_button = QPushButton("Add Building")
-        self.add_building_button.clicked.connect(self.add_building)
+        # Through a lambda, so clicked's checked argument never reaches a
+        # @timed method, whose wrapper would pass it on
+        self.add_building_button.clicked.connect(lambda: self.add_building())
         building_layout = QVBoxLayout()
         building_layout.addWidget(QLabel("Building Name:"))
         building_layout.addWidget(self.building_name_input)
@@ -284,7 +1189,10 @@ class PropertyManagerApp(QWidget):
         self.lease_end_input = QDateEdit(QDate.currentDate())
         self.lease_end_input.setDisplayFormat("MM/dd/yyyy")
         self.add_apartment_button = QPushButton("Add Apartment")
-        self.add_apartment_button.clicked.connect(self.add_apartment)
+        self.add_apartment_button.clicked.connect(lambda: self.add_apartment())
+        self.delete_apartment_button = QPushButton("Delete Apartment")
+        self.delete_apartment_button.setObjectName("deleteButton")
+        self.delete_apartment_button.clicked.connect(lambda: self.delete_apartment())
 
         apartment_layout = QGridLayout()
         apartment_layout.addWidget(QLabel("Apartment Number:"), 0, 0)
@@ -298,6 +1206,7 @@ class PropertyManagerApp(QWidget):
         apartment_layout.addWidget(QLabel("Lease End:"), 2, 2)
         apartment_layout.addWidget(self.lease_end_input, 2, 3)
         apartment_layout.addWidget(self.add_apartment_button, 3, 0, 1, 4)
+        apartment_layout.addWidget(self.delete_apartment_button, 4, 0, 1, 4)
 
         apartment_group = QGroupBox("Add New Apartment")
         apartment_group.setLayout(apartment_layout)
@@ -305,18 +1214,57 @@ class PropertyManagerApp(QWidget):
 
         # Email input
         self.email_text_edit = QTextEdit()
-        default_message = "Dear {Name},\n\nYour lease is set to expire on {Lease End}. Please contact us if you wish to renew your lease.\n\nSincerely,\nProperty Management"
-        self.email_text_edit.setPlainText(default_message)
+        self.email_text_edit.setPlainText(DEFAULT_TEMPLATE)
+        self.email_text_edit.setToolTip("Placeholders: {Name}, {Email}, {Building}, {Apartment}, {Lease Start}, "
+                                        "{Lease End}, {Days Remaining}. Dates take a format, e.g. "
+                                        "{Lease End:%B %d, %Y}")
         self.send_reminder_button = QPushButton("Send Reminder")
-        self.send_reminder_button.clicked.connect(self.send_reminder)
+        self.send_reminder_button.clicked.connect(lambda: self.send_reminder())
+
+        # A personalized renewal letter attached to each reminder
+        self.attach_letters_input = QCheckBox("Attach renewal letter as")
+        self.letter_format_input = QComboBox()
+        for letter_format, label in LETTER_FORMATS.items():
+            self.letter_format_input.addItem(label, letter_format)
+        self.edit_letter_button = QPushButton("Edit Letter...")
+        self.edit_letter_button.clicked.connect(self.edit_letter_template)
+        letter_layout = QHBoxLayout()
+        letter_layout.addWidget(self.attach_letters_input)
+        letter_layout.addWidget(self.letter_format_input)
+        letter_layout.addWidget(self.edit_letter_button)
+
+        # Bulk reminders for every lease ending within the chosen window
+        self.campaign_days_input = QSpinBox()
+        self.campaign_days_input.setRange(1, 3650)
+        self.campaign_days_input.setValue(60)
+        self.campaign_days_input.setSuffix(" days")
+        self.send_campaign_button = QPushButton("Remind All Expiring")
+        self.send_campaign_button.setObjectName("sendReminderButton")
+        self.send_campaign_button.clicked.connect(self.send_campaign)
+        campaign_layout = QHBoxLayout()
+        campaign_layout.addWidget(QLabel("Leases ending within:"))
+        campaign_layout.addWidget(self.campaign_days_input)
+        campaign_layout.addWidget(self.send_campaign_button)
 
         email_layout = QVBoxLayout()
         email_layout.addWidget(QLabel("Email Template:"))
         email_layout.addWidget(self.email_text_edit)
+        email_layout.addLayout(letter_layout)
         email_layout.addWidget(self.send_reminder_button)
+        email_layout.addLayout(campaign_layout)
         email_group = QGroupBox("Send Lease Reminder")
         email_group.setLayout(email_layout)
 
+        # Reminders queued by the expiry scheduler
+        self.queued_reminders_list = QListWidget()
+        self.send_queued_button = QPushButton("Send Queued Reminders")
+        self.send_queued_button.clicked.connect(self.send_queued_reminders)
+        queued_layout = QVBoxLayout()
+        queued_layout.addWidget(self.queued_reminders_list)
+        queued_layout.addWidget(self.send_queued_button)
+        queued_group = QGroupBox("Expiring Leases")
+        queued_group.setLayout(queued_layout)
+
         # Attached files
         self.attached_files_list = QListWidget()
         self.attach_files_button = QPushButton("Attach Files")
@@ -331,16 +1279,17 @@ class PropertyManagerApp(QWidget):
         attached_files_group = QGroupBox("Attachments")
         attached_files_group.setLayout(attached_files_layout)
 
-        # Save changes button
-        self.save_changes_button = QPushButton("Save Changes")
-        self.save_changes_button.clicked.connect(self.save_changes)
+        # Edits save themselves after a short pause; this saves them at once
+        self.save_now_button = QPushButton("Save Now")
+        self.save_now_button.clicked.connect(self.save_now)
 
         # Add the input widgets to the layout
         input_layout.addWidget(building_group)
         input_layout.addWidget(apartment_group)
         input_layout.addWidget(email_group)
+        input_layout.addWidget(queued_group)
         input_layout.addWidget(attached_files_group)
-        input_layout.addWidget(self.save_changes_button)
+        input_layout.addWidget(self.save_now_button)
 
         # Add the input widget to the splitter
         splitter.addWidget(input_widget)
@@ -351,157 +1300,302 @@ class PropertyManagerApp(QWidget):
         self.layout.addWidget(splitter)
         self.setLayout(self.layout)
 
+    @timed("ui.load_data")
     def load_data(self):
-        self.tree.clear()
-
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-
-        # Fetch buildings
-        c.execute("SELECT * FROM buildings")
-        buildings = c.fetchall()
-
-        for building in buildings:
-            building_item = QTreeWidgetItem(self.tree, [building[1]])
-
-            # Fetch apartments for the building
-            c.execute("SELECT * FROM apartments WHERE building_id=?", (building[0],))
-            apartments = c.fetchall()
+        # Only the first page of buildings is read; the rest streams in on
+        # demand. A search in progress is run again against the new data.
+        self.apply_search(reload=True)
+
+    @timed("ui.search")
+    def apply_search(self, reload=False):
+        apartment_ids = self.db.search(self.search_input.text(), SEARCH_LIMIT)
+        if apartment_ids is None:
+            # Too short to look up (or empty): show everything
+            self.search_status.setText("Type 3+ characters" if self.search_input.text().strip() else "")
+            if self.model.set_matches(None, reload):
+                self.model.fetchMore(QModelIndex())
+            return
 
-            for apartment in apartments:
-                apartment_item = QTreeWidgetItem(building_item, [
-                    apartment[2],  # Apartment Number
-                    apartment[3],  # Name
-                    apartment[4],  # Email
-                    apartment[5],  # Lease Start
-                    apartment[6]   # Lease End
-                ])
-                apartment_item.setFlags(apartment_item.flags() | Qt.ItemIsEditable)
+        if self.model.set_matches(apartment_ids, reload):
+            self.model.fetchMore(QModelIndex())
+        self.tree.expandAll()
 
-        conn.close()
+        if len(apartment_ids) == SEARCH_LIMIT:
+            self.search_status.setText(f"First {SEARCH_LIMIT} matches")
+        else:
+            self.search_status.setText(f"{len(apartment_ids)} match" + ("" if len(apartment_ids) == 1 else "es"))
 
+    @timed("ui.add_building")
     def add_building(self):
         building_name = self.building_name_input.text().strip()
 
         if building_name:
-            conn = sqlite3.connect(self.db_name)
-            c = conn.cursor()
-
-            # Insert the new building into the database
-            c.execute("INSERT INTO buildings (name) VALUES (?)", (building_name,))
-            conn.commit()
-
-            conn.close()
+            building_id = self.db.add_building(building_name)
+            self.model.append_building(building_id, building_name)
+            self.dashboard_timer.start()
 
             self.building_name_input.clear()
-            self.load_data()
         else:
             QMessageBox.warning(self, "Error", "Building name cannot be empty.")
 
+    @timed("ui.add_apartment")
     def add_apartment(self):
-        building_item = self.tree.currentItem()
+        # Adding while an apartment is selected goes to its building
+        building = self.model.building_at(self.tree.currentIndex())
 
-        if building_item:
-            building_name = building_item.text(0)
+        if building is not None:
             apartment_name = self.apartment_name_input.text().strip()
             name = self.name_input.text().strip()
             tenant_email = self.tenant_email_input.text().strip()
-            lease_start = self.lease_start_input.date().toString("MM/dd/yyyy")
-            lease_end = self.lease_end_input.date().toString("MM/dd/yyyy")
+            lease_start = self.lease_start_input.date().toString(Qt.ISODate)
+            lease_end = self.lease_end_input.date().toString(Qt.ISODate)
 
             if apartment_name and name and tenant_email:
-                conn = sqlite3.connect(self.db_name)
-                c = conn.cursor()
-
-                # Fetch the building id from the database
-                c.execute("SELECT id FROM buildings WHERE name=?", (building_name,))
-                building_id = c.fetchone()[0]
-
-                # Insert the new apartment into the database
-                c.execute("INSERT INTO apartments (building_id, name, email, lease_start, lease_end) VALUES (?, ?, ?, ?, ?)",
-                          (building_id, apartment_name, name, tenant_email, lease_start, lease_end))
-                conn.commit()
-
-                conn.close()
+                values = (apartment_name, name, tenant_email, lease_start, lease_end)
+                try:
+                    apartment_id = self.db.add_apartment(building.id, *values)
+                except sqlite3.IntegrityError:
+                    QMessageBox.warning(self, "Error", f"{building.name} already has an apartment {apartment_name}.")
+                    return
+                self.model.append_apartment(building, apartment_id, values)
+                self.schedule(apartment_id, lease_end)
+                self.check_expiries()
+                self.dashboard_timer.start()
 
                 self.apartment_name_input.clear()
                 self.name_input.clear()
                 self.tenant_email_input.clear()
-                self.load_data()
             else:
                 QMessageBox.warning(self, "Error", "Apartment number, name, and tenant email cannot be empty.")
         else:
             QMessageBox.warning(self, "Error", "Please select a building.")
 
-    def handle_item_clicked(self, item, column):
-        if item.parent() is not None:
-            apartment_name = item.text(0)
-            name = item.text(1)
-            tenant_email = item.text(2)
-            lease_start = item.text(3)
-            lease_end = item.text(4)
+    def handle_item_clicked(self, index):
+        apartment = self.model.apartment_at(index)
+
+        if apartment is not None:
+            apartment_name, name, tenant_email, lease_start, lease_end = apartment.values
 
             self.apartment_name_input.setText(apartment_name)
             self.name_input.setText(name)
             self.tenant_email_input.setText(tenant_email)
-            self.lease_start_input.setDate(QDate.fromString(lease_start, "MM/dd/yyyy"))
-            self.lease_end_input.setDate(QDate.fromString(lease_end, "MM/dd/yyyy"))
-
-    def handle_item_changed(self, item, column):
-        if item.parent() is not None:
-            building_name = item.parent().text(0)
-            apartment_name = item.text(0)
-            name = item.text(1)
-            tenant_email = item.text(2)
-            lease_start = item.text(3)
-            lease_end = item.text(4)
-
-            conn = sqlite3.connect(self.db_name)
-            c = conn.cursor()
+            self.lease_start_input.setDate(QDate.fromString(lease_start, Qt.ISODate))
+            self.lease_end_input.setDate(QDate.fromString(lease_end, Qt.ISODate))
 
-            # Fetch the building id from the database
-            c.execute("SELECT id FROM buildings WHERE name=?", (building_name,))
-            building_id = c.fetchone()[0]
+    @timed("ui.delete_apartment")
+    def delete_apartment(self):
+        index = self.tree.currentIndex()
 
-            # Update the apartment in the database
-            c.execute("UPDATE apartments SET building_id=?, name=?, email=?, lease_start=?, lease_end=? WHERE name=?",
-                      (building_id, apartment_name, name, tenant_email, lease_start, lease_end, apartment_name))
-            conn.commit()
-
-            conn.close()
+        if self.model.apartment_at(index) is None:
+            QMessageBox.warning(self, "Error", "Please select an apartment.")
+            return
 
-            self.load_data()
+        # The row is removed from the database with the next batch of edits
+        self.model.remove_apartment(index)
+        self.edit_timer.start()
 
+    @timed("ui.send_reminder")
     def send_reminder(self):
-        item = self.tree.currentItem()
+        apartment = self.model.apartment_at(self.tree.currentIndex())
 
-        if item is None:
+        if apartment is None:
             QMessageBox.warning(self, "Error", "Please select an apartment.")
             return
 
-        apartment_name = item.text(0)
-        name = item.text(1)
-        tenant_email = item.text(2)
-        lease_start = item.text(3)
-        lease_end = item.text(4)
-
-        message = self.email_text_edit.toPlainText()
-        message = message.replace("{Name}", name)
-        message = message.replace("{Lease Start}", lease_start)
-        message = message.replace("{Lease End}", lease_end)
-
-        attachments = []
-        for index in range(self.attached_files_list.count()):
-            file_path = self.attached_files_list.item(index).data(Qt.UserRole)
-            attachments.append(file_path)
+        recipient = Recipient(apartment.id, apartment.building.name, *apartment.values)
+        template = compile_template(self.email_text_edit.toPlainText())
+        attachments = self.attached_file_paths()
 
         # Send the email
         try:
-            send_email(tenant_email, "Lease Expiration Reminder", message, attachments)
+            template.check()
+            missing = template.missing(recipient)
+            if missing:
+                raise TemplateError("This tenant has no " + ", ".join(missing))
+            writer = self.letter_writer()
+            if writer is not None:
+                # One letter is rendered in this process; no pool is started
+                attachments += list(writer.run([recipient]).values())
+            message = template.render(recipient)
+            with span("mail.send"):
+                self.mail_transport().send(Message(recipient.email, DEFAULT_SUBJECT, message, attachments))
             QMessageBox.information(self, "Email Sent", "The reminder email has been sent successfully.")
         except Exception as e:
             QMessageBox.warning(self, "Error", f"An error occurred while sending the email: {str(e)}")
 
+    def mail_transport(self):
+        # Created on first use and kept, so pooled SMTP connections are reused
+        if self.transport is None:
+            if self.transport_kind != "file" and not self.api_key:
+                raise ValueError("Log in with a SendGrid API key to send email.")
+            outbox = os.path.join(QStandardPaths.writableLocation(QStandardPaths.AppDataLocation), "outbox")
+            self.transport = make_transport(self.transport_kind, self.email, self.api_key, outbox,
+                                            self.attachment_store)
+        return self.transport
+
+    def send_campaign(self):
+        # Unknown placeholders are reported before anything is sent
+        try:
+            transport = self.mail_transport()
+            campaign = Campaign(transport, DEFAULT_SUBJECT, self.email_text_edit.toPlainText(),
+                                self.attached_file_paths(), rate=CAMPAIGN_RATE)
+            writer = self.letter_writer()
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+
+        def campaign_completed(recipients):
+            counts = summarize(recipients)
+            QMessageBox.information(self, "Reminders Sent",
+                                    f"Sent: {counts['sent']}\nFailed: {counts['failed']}\n"
+                                    f"Skipped (missing details): {counts['skipped']}\n"
+                                    f"Skipped (no email): {counts[NO_EMAIL]}\n"
+                                    f"Cancelled: {counts['cancelled']}")
+
+        within_days = self.campaign_days_input.value()
+        self.run_campaign("Sending lease reminders...", campaign, writer,
+                          lambda: select_recipients(self.db, within_days), campaign_completed)
+
+    def run_campaign(self, label, campaign, writer, load_recipients, on_completed):
+        # With a letter writer, each emailable recipient's letter is written first,
+        # across its worker processes, and then attached to their message
+        def send(progress):
+            recipients = load_recipients()
+            letters = writer.run([r for r in recipients if r.email], progress) if writer is not None else None
+            return campaign.run(recipients, progress, letters)
+
+        def cancel():
+            campaign.cancel()
+            if writer is not None:
+                writer.cancel()
+
+        self.run_task(label, send, on_completed, cancel=cancel)
+
+    def letter_writer(self):
+        # None unless renewal letters are to be attached. Each send writes
+        # its letters to a folder of its own, kept as a record of what went out.
+        if not self.attach_letters_input.isChecked():
+            return None
+        directory = os.path.join(QStandardPaths.writableLocation(QStandardPaths.AppDataLocation), "letters",
+                                 time.strftime("%Y%m%d-%H%M%S"))
+        return LetterWriter(self.letter_template(), directory, self.letter_format_input.currentData())
+
+    def letter_template(self):
+        return self.settings.value("letter_template", DEFAULT_LETTER_TEMPLATE)
+
+    def edit_letter_template(self):
+        dialog = LetterTemplateDialog(self.letter_template(), self)
+        if dialog.exec_():
+            self.settings.setValue("letter_template", dialog.template())
+
+    @timed("ui.check_expiries")
+    def check_expiries(self):
+        if self.scheduler is None:
+            return
+        # Events are turned into list entries a batch at a time, so a long
+        # queue fills in without holding up the event loop
+        idle = not self.expiry_backlog
+        self.expiry_backlog.extend(self.scheduler.poll())
+        if idle and self.expiry_backlog:
+            self.queue_expiries()
+
+    @timed("ui.queue_expiries")
+    def queue_expiries(self):
+        events = self.expiry_backlog[:REMINDER_BATCH_SIZE]
+        del self.expiry_backlog[:REMINDER_BATCH_SIZE]
+        if not events:
+            return
+        if self.expiry_backlog:
+            QTimer.singleShot(0, self.queue_expiries)
+
+        details = {row[0]: row for row in self.db.recipients(event.apartment_id for event in events)}
+        today = QDate.currentDate().toPyDate()
+        for event in events:
+            row = details.get(event.apartment_id)
+            if row is None:
+                continue
+            _, building, apartment, tenant, _, _, _ = row
+            # A lease crossing another threshold updates its existing entry
+            item = self.queued_reminders.get(event.apartment_id)
+            if item is None:
+                item = self.queued_reminders[event.apartment_id] = QListWidgetItem()
+                self.queued_reminders_list.addItem(item)
+            item.setText(f"{building} {apartment} - {tenant}: lease ends {event.lease_end:%m/%d/%Y} "
+                         f"({days_label((event.lease_end - today).days)})")
+
+    def dequeue_reminder(self, apartment_id):
+        item = self.queued_reminders.pop(apartment_id, None)
+        if item is not None:
+            self.queued_reminders_list.takeItem(self.queued_reminders_list.row(item))
+
+    def send_queued_reminders(self):
+        if not self.queued_reminders:
+            QMessageBox.information(self, "Expiring Leases", "No reminders are queued.")
+            return
+
+        try:
+            transport = self.mail_transport()
+            campaign = Campaign(transport, DEFAULT_SUBJECT, self.email_text_edit.toPlainText(),
+                                self.attached_file_paths(), rate=CAMPAIGN_RATE)
+            writer = self.letter_writer()
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+
+        apartment_ids = list(self.queued_reminders)
+
+        def load_recipients():
+            with self.db.reader() as conn:
+                rows = self.db.recipients(apartment_ids, conn)
+            return [Recipient(*row) for row in rows]
+
+        def sent(recipients):
+            # Only what went out leaves the queue; failures can be retried
+            for recipient in recipients:
+                if recipient.status == SENT:
+                    self.dequeue_reminder(recipient.apartment_id)
+            counts = summarize(recipients)
+            QMessageBox.information(self, "Reminders Sent",
+                                    f"Sent: {counts['sent']}\nFailed: {counts['failed']}\n"
+                                    f"Skipped (missing details): {counts['skipped']}\n"
+                                    f"Skipped (no email): {counts[NO_EMAIL]}\n"
+                                    f"Cancelled: {counts['cancelled']}")
+
+        self.run_campaign("Sending queued reminders...", campaign, writer, load_recipients, sent)
+
+    def run_task(self, label, task, on_completed, cancel=None):
+        # The work happens on a TaskWorker thread; the dialog only shows progress
+        progress_dialog = QProgressDialog(label, "Cancel" if cancel else None, 0, 0, self)
+        progress_dialog.setWindowModality(Qt.WindowModal)
+        if cancel is not None:
+            progress_dialog.canceled.connect(cancel)
+
+        def update_progress(done, total):
+            progress_dialog.setMaximum(total)
+            progress_dialog.setValue(done)
+
+        def task_completed(result):
+            progress_dialog.close()
+            on_completed(result)
+
+        def task_failed(error):
+            progress_dialog.close()
+            QMessageBox.warning(self, "Error", f"An error occurred: {error}")
+
+        # Timed as e.g. "task.exporting_lease_roll"
+        worker = TaskWorker(task, self, "task." + label.rstrip(".").lower().replace(" ", "_"))
+        worker.progress.connect(update_progress)
+        worker.completed.connect(task_completed)
+        worker.failed.connect(task_failed)
+        worker.finished.connect(worker.deleteLater)
+        worker.start()
+        progress_dialog.show()
+        return worker
+
+    def attached_file_paths(self):
+        return [self.attached_files_list.item(index).data(Qt.UserRole)
+                for index in range(self.attached_files_list.count())]
+
     def attach_files(self):
         file_dialog = QFileDialog()
         file_dialog.setFileMode(QFileDialog.ExistingFiles)
@@ -523,50 +1617,165 @@ class PropertyManagerApp(QWidget):
             for item in selected_items:
                 self.attached_files_list.takeItem(self.attached_files_list.row(item))
 
-    def save_changes(self):
-        reply = QMessageBox.question(self, "Save Changes", "Are you sure you want to save the changes?",
-                                     QMessageBox.Yes | QMessageBox.No)
+    def save_now(self):
+        # Edits are saved on their own once typing pauses; this doesn't wait
+        self.save_data()
+
+    @timed("ui.save")
+    def save_data(self):
+        self.edit_timer.stop()
+        if not self.model.edits and not self.model.deleted:
+            return
+
+        # Collect only the rows touched since the last save
+        rows = [(apartment.id, apartment.version, apartment.building.id, *apartment.values)
+                for apartment in self.model.edits.values()]
+
+        rejected = {}
+        try:
+            conflicts = self.db.save_apartments(rows, self.model.deleted, rejected)
+        except sqlite3.Error as e:
+            if is_busy(e):
+                # Another writer, such as a peer's import, has the database
+                # for now; the edits stay pending and are tried again later
+                self.edit_timer.start()
+                return
+            # Kept, these edits would fail every later flush and the close
+            # too, so they are dropped and the stored rows shown again
+            failed = list(self.model.edits) + list(self.model.deleted)
+            self.model.discard(failed)
+            QMessageBox.warning(self, "Error", f"Your changes could not be saved and were undone: {e}")
+            try:
+                self.refresh_apartments(failed)
+            except sqlite3.Error:
+                pass
+            return
+        for apartment_id, *_, lease_end in rows:
+            if apartment_id not in conflicts and apartment_id not in rejected:
+                self.schedule(apartment_id, lease_end)
+        for apartment_id in self.model.deleted:
+            if apartment_id not in conflicts:
+                self.schedule(apartment_id, None)
+                self.dequeue_reminder(apartment_id)
+        names = [f"{self.model.edits[apartment_id].building.name} {self.model.edits[apartment_id].values[0]}"
+                 for apartment_id in rejected]
+        self.model.mark_saved({**conflicts, **rejected})
+        if rejected:
+            # Put back what is stored, so the view never shows a change
+            # that didn't save
+            self.model.discard(rejected)
+            self.refresh_apartments(rejected)
+            QMessageBox.warning(self, "Error", "Apartment numbers must be unique within a building. "
+                                               "These changes were undone:\n\n" + "\n".join(names))
+        self.check_expiries()
+        self.dashboard_timer.start()
+        if conflicts:
+            self.resolve_conflicts(conflicts)
+
+    def resolve_conflicts(self, conflicts):
+        # Someone else saved these apartments after this window read them.
+        # The user either overwrites their changes or takes them.
+        changed = {apartment_id: version for apartment_id, version in conflicts.items() if version is not None}
+        gone = [apartment_id for apartment_id, version in conflicts.items() if version is None]
+
+        message = []
+        if changed:
+            message.append(f"{len(changed)} apartment(s) you changed were also changed by another user.")
+        if gone:
+            message.append(f"{len(gone)} apartment(s) you changed were deleted by another user; "
+                           f"your changes to them are discarded.")
+        if changed:
+            reply = QMessageBox.question(self, "Conflicting Changes",
+                                         "\n\n".join(message + ["Keep your version? No shows theirs instead."]),
+                                         QMessageBox.Yes | QMessageBox.No)
+        else:
+            QMessageBox.warning(self, "Conflicting Changes", message[0])
+            reply = QMessageBox.No
 
         if reply == QMessageBox.Yes:
+            self.model.discard(gone)
+            self.model.rebase(changed)
+            self.refresh_apartments(gone)
             self.save_data()
-            QMessageBox.information(self, "Changes Saved", "The changes have been saved successfully.")
+        else:
+            self.model.discard(conflicts)
+            self.refresh_apartments(conflicts)
+
+    def refresh_apartments(self, apartment_ids, building_ids=()):
+        # Re-reads these rows into the view and the expiry index
+        rows = {row[0]: row for row in self.db.apartments_by_ids(apartment_ids)}
+        apartments = {apartment_id: rows.get(apartment_id) for apartment_id in apartment_ids}
+        if self.model.matches is not None:
+            # Search results are few; running the search again is simplest
+            self.apply_search()
+        else:
+            self.model.apply_changes(building_ids, apartments)
+        for apartment_id, row in apartments.items():
+            if row is None:
+                self.schedule(apartment_id, None)
+                self.dequeue_reminder(apartment_id)
+            else:
+                self.schedule(apartment_id, row[6])
+        self.check_expiries()
+        self.dashboard_timer.start()
+
+    @timed("ui.check_peer_changes")
+    def check_peer_changes(self):
+        # PRAGMA data_version only moves when another connection commits, so
+        # an idle poll reads nothing; after that only change_log entries
+        # newer than the last ones applied are read
+        version = self.db.commit_version()
+        if version == self.commit_version:
+            return
+        self.commit_version = version
 
-    def save_data(self):
-        conn = sqlite3.connect(self.db_name)
-        c = conn.cursor()
-
-        # Clear the existing data in the database
-        c.execute("DELETE FROM buildings")
-        c.execute("DELETE FROM apartments")
-        conn.commit()
-
-        # Save the current data in the database
-        for i in range(self.tree.topLevelItemCount()):
-            building_item = self.tree.topLevelItem(i)
-            building_name = building_item.text(0)
-
-            # Insert the building into the database
-            c.execute("INSERT INTO buildings (name) VALUES (?)", (building_name,))
-            conn.commit()
-
-            for j in range(building_item.childCount()):
-                apartment_item = building_item.child(j)
-                apartment_name = apartment_item.text(0)
-                name = apartment_item.text(1)
-                tenant_email = apartment_item.text(2)
-                lease_start = apartment_item.text(3)
-                lease_end = apartment_item.text(4)
-
-                # Fetch the building id from the database
-                c.execute("SELECT id FROM buildings WHERE name=?", (building_name,))
-                building_id = c.fetchone()[0]
-
-                # Insert the apartment into the database
-                c.execute("INSERT INTO apartments (building_id, name, email, lease_start, lease_end) VALUES (?, ?, ?, ?, ?)",
-                          (building_id, apartment_name, name, tenant_email, lease_start, lease_end))
-                conn.commit()
-
-        conn.close()
+        changes = self.db.changes_since(self.change_seq, CHANGE_DELTA_LIMIT + 1)
+        if changes is None or len(changes) > CHANGE_DELTA_LIMIT:
+            self.change_seq = self.db.last_change()
+            self.load_data()
+            self.reload_schedule()
+            self.check_expiries()
+            self.dashboard_timer.start()
+            return
+        if not changes:
+            return
+        self.change_seq = changes[-1][0]
+
+        building_ids = {row_id for _, kind, row_id in changes if kind == "building"}
+        apartment_ids = {row_id for _, kind, row_id in changes if kind == "apartment"}
+        self.refresh_apartments(apartment_ids, building_ids)
+
+    def export_lease_roll(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Lease Roll", "lease_roll.xlsx",
+                                                   "Excel Workbook (*.xlsx);;CSV (*.csv)")
+        if not file_path:
+            return
+
+        # Rows stream from SQLite straight into the file on a worker thread
+        self.run_task("Exporting lease roll...", lambda progress: export_lease_roll(self.db, file_path, progress),
+                      lambda count: QMessageBox.information(self, "Export Complete",
+                                                            f"Exported {count} apartments to {file_path}."))
+
+    def import_lease_roll(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Import Lease Roll", "",
+                                                   "Lease Roll (*.xlsx *.csv);;Excel Workbook (*.xlsx);;CSV (*.csv)")
+        if not file_path:
+            return
+
+        def imported(result):
+            # The view and the expiry index are rebuilt once, after the whole file is in
+            self.change_seq = self.db.last_change()
+            self.load_data()
+            self.reload_schedule()
+            self.check_expiries()
+            self.dashboard_timer.start()
+            message = f"Imported {result.imported} apartments ({result.buildings} new buildings)."
+            if result.rejected:
+                message += f"\n\n{result.rejected} rows were rejected; see {result.rejects_path}."
+            QMessageBox.information(self, "Import Complete", message)
+
+        self.run_task("Importing lease roll...",
+                      lambda progress: import_lease_roll(self.db, file_path, progress=progress), imported)
 
     def download_chart(self):
         file_dialog = QFileDialog()
@@ -577,52 +1786,177 @@ class PropertyManagerApp(QWidget):
         if file_dialog.exec_():
             file_path = file_dialog.selectedFiles()[0]
 
+            def save(png):
+                with open(file_path, "wb") as f:
+                    f.write(png)
+
             # Generate the chart and save it to the selected file path
-            self.generate_chart().save(file_path, "PNG")
+            self.generate_chart(save)
+
+    def generate_chart(self, on_ready):
+        # Unchanged data reuses the last rendering; otherwise the chart is
+        # drawn from SQL aggregates on a worker thread. Expiries are counted
+        # by month from the current one, so a new month redraws it too.
+        today = QDate.currentDate().toPyDate()
+        version = (self.db.data_version(), today.replace(day=1))
+        png = self.chart_cache.get(version)
+        if png is not None:
+            on_ready(png)
+            return
 
-    def generate_chart(self):
-        building_names = []
-        apartment_counts = []
+        def rendered(png):
+            self.chart_cache.put(version, png)
+            on_ready(png)
 
-        for i in range(self.tree.topLevelItemCount()):
-            building_item = self.tree.topLevelItem(i)
-            building_names.append(building_item.text(0))
-            apartment_counts.append(building_item.childCount())
+        self.run_task("Rendering chart...", lambda progress: render_portfolio_chart(self.db, today), rendered)
 
-        # Create a bar chart
-        plt.figure(figsize=(12, 6))
-        plt.bar(building_names, apartment_counts)
-        plt.xlabel("Building")
-        plt.ylabel("Number of Apartments")
-        plt.title("Apartment Distribution by Building")
-        plt.xticks(rotation=45)
+    def refresh_dashboard(self):
+        # One computation at a time; a request while one runs is served by
+        # another pass once it finishes. Unchanged data is answered from the
+        # analytics cache, and changed data costs a delta read.
+        if self.dashboard_worker is not None:
+            self.dashboard_stale = True
+            return
+        self.dashboard_stale = False
+        renewal_rate = self.dashboard.renewal_rate()
+
+        def compute(progress):
+            if self.analytics is None:
+                from lease_navigator.analytics import Analytics
+                self.analytics = Analytics()
+            return self.analytics.dashboard(self.db, renewal_rate=renewal_rate)
+
+        self.dashboard_worker = TaskWorker(compute, self, "task.dashboard")
+        self.dashboard_worker.completed.connect(self.dashboard.display)
+        self.dashboard_worker.failed.connect(self.dashboard.show_error)
+        self.dashboard_worker.finished.connect(self.dashboard_finished)
+        self.dashboard_worker.start()
+
+    def dashboard_finished(self):
+        self.dashboard_worker.deleteLater()
+        self.dashboard_worker = None
+        if self.dashboard_stale:
+            self.refresh_dashboard()
+
+    def set_telemetry(self, enabled):
+        telemetry.enable(enabled)
+        if enabled:
+            self.heartbeat_timer.start()
+        else:
+            self.heartbeat_timer.stop()
 
-        # Convert the chart to a QPixmap for displaying in the GUI
-        canvas = plt.gcf().canvas
-        canvas.draw()
-        data = canvas.buffer_rgba()
-        qimage = QImage(data, canvas.get_width_height()[0], canvas.get_width_height()[1], QImage.Format_RGBA8888)
-        pixmap = QPixmap.fromImage(qimage)
+    def show_diagnostics(self):
+        DiagnosticsDialog(self).exec_()
 
-        plt.close()
+    def start_api(self, port):
+        # Served from a thread of its own, so API clients never wait on the
+        # GUI and the GUI never waits on them
+        from lease_navigator.api import ApiServer
 
-        return pixmap
+        server = ApiServer(self.db, port=port)
+        try:
+            server.start_in_thread()
+        except OSError as e:
+            QMessageBox.warning(self, "Error", f"Could not start the API on port {port}: {e}")
+            return
+        self.api_server = server
 
-    def closeEvent(self, event):
-        reply = QMessageBox.question(self, "Save Changes", "Do you want to save the changes before exiting?",
-                                     QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel)
+    def show_backups(self):
+        BackupsDialog(self).exec_()
 
-        if reply == QMessageBox.Yes:
-            self.save_data()
-            event.accept()
-        elif reply == QMessageBox.No:
-            event.accept()
-        else:
-            event.ignore()
+    def back_up(self):
+        # A full snapshot or just the changes since the last one, whichever
+        # is due; skipped while the previous one is still being written
+        if self.backup_worker is not None:
+            return
+        self.backup_worker = TaskWorker(lambda progress: self.backups.back_up(progress), self, "task.backup")
+        self.backup_worker.failed.connect(
+            lambda error: QMessageBox.warning(self, "Error", f"Could not back up the database: {error}"))
+        self.backup_worker.finished.connect(self.backup_finished)
+        self.backup_worker.start()
+
+    def backup_finished(self):
+        self.backup_worker.deleteLater()
+        self.backup_worker = None
+
+    def restore_backup(self, snapshot):
+        reply = QMessageBox.question(
+            self, "Restore Backup",
+            f"Replace all buildings and apartments with the backup taken {snapshot.taken:%Y-%m-%d %H:%M:%S}?\n\n"
+            "A backup of the current data is taken first.", QMessageBox.Yes | QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
+
+        # Pending edits go into the safety backup, and nothing reads or
+        # writes the database while the restore holds its write lock
+        self.save_data()
+        for timer in (self.change_timer, self.expiry_timer, self.backup_timer, self.dashboard_timer):
+            timer.stop()
+
+        def restore(progress):
+            self.backups.back_up(full=True)
+            self.backups.restore(snapshot, progress)
+
+        def restored():
+            # Whether or not it got that far, the view is read again
+            self.change_seq = self.db.last_change()
+            self.commit_version = self.db.commit_version()
+            self.load_data()
+            self.reload_schedule()
+            self.check_expiries()
+            self.dashboard_timer.start()
+            self.change_timer.start(CHANGE_POLL_INTERVAL_MS)
+            self.backup_timer.start(BACKUP_INTERVAL_MS)
+            if self.scheduler is not None:
+                self.expiry_timer.start(EXPIRY_CHECK_INTERVAL_MS)
+
+        worker = self.run_task("Restoring backup...", restore, lambda result: QMessageBox.information(
+            self, "Restore Complete", f"Restored the backup taken {snapshot.taken:%Y-%m-%d %H:%M:%S}."))
+        worker.finished.connect(restored)
+
+    def shutdown(self):
+        # Edits still waiting for the debounce timer are written now
+        self.save_data()
+        self.heartbeat_timer.stop()
+        telemetry.detach(self.db)
+        if self.scheduler_loader is not None:
+            # Its result would arrive after the database is closed
+            self.scheduler_loader.completed.disconnect()
+            self.scheduler_loader.wait()
+        self.dashboard_timer.stop()
+        if self.dashboard_worker is not None:
+            self.dashboard_worker.completed.disconnect()
+            self.dashboard_worker.finished.disconnect()
+            self.dashboard_worker.wait()
+        self.backup_timer.stop()
+        if self.backup_worker is not None:
+            # An unfinished snapshot is discarded; the next run starts afresh
+            self.backups.cancel()
+            self.backup_worker.failed.disconnect()
+            self.backup_worker.finished.disconnect()
+            self.backup_worker.wait()
+        if self.api_server is not None:
+            self.api_server.stop()
+        self.expiry_timer.stop()
+        self.change_timer.stop()
+        self.search_timer.stop()
+        self.expiry_backlog = []
+        if self.transport is not None:
+            self.transport.close()
+        self.db.close()
+
+    def closeEvent(self, event):
+        self.shutdown()
+        event.accept()
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = ApartmentManagerWindow()
+
+    login = LoginDialog()
+    if login.exec_() != QDialog.Accepted:
+        sys.exit(0)
+
+    window = PropertyManagerApp(login.email, login.api_key, transport=login.transport)
     window.show()
     sys.exit(app.exec_())
@@ -0,0 +1,46 @@
+# Bulk reminder throughput against the in-memory mail sink.
+#
+#   python benchmarks/bench_campaign.py [recipients]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lease_navigator.campaign import Campaign, Recipient, summarize
+from lease_navigator.mail import MemorySink
+
+TEMPLATE = ("Dear {Name},\n\nYour lease is set to expire on {Lease End}. "
+            "Please contact us if you wish to renew your lease.\n\nSincerely,\nProperty Management")
+
+
+def make_recipients(count):
+    return [Recipient(i, "Building", f"{i}-A", f"Tenant {i}", f"tenant{i}@example.com", "2024-01-01", "2025-06-30")
+            for i in range(count)]
+
+
+def run(label, count, sink, **options):
+    campaign = Campaign(sink, "Lease Expiration Reminder", TEMPLATE, backoff=0.001, **options)
+    recipients = make_recipients(count)
+    start = time.perf_counter()
+    campaign.run(recipients)
+    elapsed = time.perf_counter() - start
+    counts = summarize(recipients)
+    print(f"{label:<34} {count / elapsed:9.0f} msg/s  sent {counts['sent']:>6}  failed {counts['failed']:>4}  "
+          f"attempts {sink.attempts:>6}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    run("no latency, 1 worker", count, MemorySink(), workers=1)
+    run("no latency, 8 workers", count, MemorySink(), workers=8)
+    run("5 ms latency, 1 worker", count // 10, MemorySink(latency=0.005), workers=1)
+    run("5 ms latency, 32 workers", count, MemorySink(latency=0.005), workers=32)
+    run("5 ms latency, 32 workers, 5% flaky", count, MemorySink(latency=0.005, failure_rate=0.05, seed=1),
+        workers=32)
+    run("rate limited to 500/s", count // 5, MemorySink(), workers=8, rate=500)
+
+
+if __name__ == "__main__":
+    main()
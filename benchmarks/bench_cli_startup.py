@@ -0,0 +1,66 @@
+# Cold start of the headless CLI against importing the GUI toolkit, and a
+# check that no GUI or mail-provider modules are loaded along the way.
+#
+#   python benchmarks/bench_cli_startup.py [runs]
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lease_navigator import Database
+
+FORBIDDEN = ("PyQt5", "sendgrid", "matplotlib", "xlsxwriter")
+
+CHECK_MODULES = f"""
+import sys
+from lease_navigator.cli import main
+main(sys.argv[1:])
+loaded = sorted(name for name in {FORBIDDEN!r} if name in sys.modules)
+if loaded:
+    sys.exit("loaded: " + ", ".join(loaded))
+"""
+
+
+def cold_start(args, runs):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, check=True, env=env, stdout=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        db = Database(path)
+        db.migrate()
+        building = db.add_building("Bench")
+        db.add_apartment(building, "1-A", "Tenant", "tenant@example.com", "2024-01-01", "2030-01-01")
+        db.conn.commit()
+        db.close()
+
+        for command in ("stats", "export"):
+            args = ["--db", path, "-q", command] + ([os.path.join(directory, "roll.csv")] if command == "export" else [])
+            subprocess.run([sys.executable, "-c", CHECK_MODULES] + args, check=True, stdout=subprocess.DEVNULL,
+                           env=dict(os.environ, PYTHONPATH=ROOT))
+
+        print(f"{'python -c pass':<36} {cold_start(['-c', 'pass'], runs):8.1f} ms")
+        print(f"{'python -m lease_navigator stats':<36} {cold_start(['-m', 'lease_navigator', '--db', path, 'stats'], runs):8.1f} ms")
+        try:
+            print(f"{'python -c import PyQt5.QtWidgets':<36} {cold_start(['-c', 'import PyQt5.QtWidgets'], runs):8.1f} ms")
+        except subprocess.CalledProcessError:
+            print("PyQt5 is not installed; skipped the GUI comparison")
+    print("CLI loaded none of: " + ", ".join(FORBIDDEN))
+
+
+if __name__ == "__main__":
+    main()
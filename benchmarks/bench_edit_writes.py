@@ -0,0 +1,113 @@
+# Checks and times how cell edits reach the database: one edit must cost
+# exactly one UPDATE and no model reset, and a burst of edits made while
+# the debounce timer is running must land in a single transaction. A
+# save that finds the database locked is retried; one that fails outright
+# is dropped.
+#
+#   QT_QPA_PLATFORM=offscreen python benchmarks/bench_edit_writes.py [apartments]
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from PyQt5.QtWidgets import QApplication
+
+from bench_load_data import load_app_module, populate
+
+BURST = 50
+
+
+def wait_for_flush(app, module):
+    deadline = time.perf_counter() + module.EDIT_FLUSH_DELAY_MS / 1000 * 3
+    while time.perf_counter() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+
+
+def main():
+    apartment_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    app = QApplication(sys.argv[:1])
+    module = load_app_module()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, "bench.db")
+        populate(db_name, apartment_count)
+        window = module.PropertyManagerApp(db_name=db_name)
+        # The session's data is read once the event loop runs
+        app.processEvents()
+        model = window.model
+        building = model.index(0, 0)
+        window.tree.expand(building)
+        app.processEvents()
+
+        statements = []
+        resets = []
+        window.db.conn.set_trace_callback(statements.append)
+        model.modelReset.connect(lambda: resets.append(1))
+
+        def writes():
+            # Statements run inside triggers are traced with a leading "--",
+            # and the outer statement is traced again each time a trigger
+            # program starts, so repeats of the same text are one statement
+            top_level = []
+            for sql in statements:
+                if not sql.startswith("--") and (not top_level or top_level[-1] != sql):
+                    top_level.append(sql)
+            verbs = [sql.split()[0].upper() for sql in top_level]
+            return [verb for verb in verbs if verb in ("INSERT", "UPDATE", "DELETE", "COMMIT")]
+
+        # A single edit
+        model.setData(model.index(0, 2, building), "Edited once")
+        assert writes() == [], "nothing is written before the debounce delay"
+        start = time.perf_counter()
+        wait_for_flush(app, module)
+        assert writes() == ["UPDATE", "COMMIT"], writes()
+        assert not resets, "an edit must not reload the model"
+        print(f"single edit: {writes()}, no reload")
+
+        # A burst of edits over several rows, some touched twice
+        statements.clear()
+        rows = min(BURST, model.rowCount(building))
+        start = time.perf_counter()
+        for i in range(BURST):
+            model.setData(model.index(i % rows, 3, building), f"burst{i}@example.com")
+        edit_time = time.perf_counter() - start
+        wait_for_flush(app, module)
+        assert writes() == ["UPDATE"] * rows + ["COMMIT"], writes()
+        assert not resets
+        print(f"{BURST} edits over {rows} rows: {rows} UPDATEs in 1 transaction, no reload "
+              f"({edit_time / BURST * 1e6:.0f} us per edit before the flush)")
+
+        # A save another writer keeps locked stays pending and is retried
+        # once the lock is gone; one that can never succeed is dropped
+        warnings = []
+        module.QMessageBox.warning = lambda *args: warnings.append(args[2])
+        window.db.conn.execute("PRAGMA busy_timeout=0")
+        other = sqlite3.connect(db_name, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")
+        model.setData(model.index(0, 2, building), "Stored later")
+        wait_for_flush(app, module)
+        assert model.edits and not warnings, "a locked save must be kept for a retry"
+        other.execute("ROLLBACK")
+        other.close()
+        wait_for_flush(app, module)
+        assert not model.edits and not warnings, "the retry must save the edit"
+
+        window.db.conn.execute("PRAGMA query_only=ON")
+        model.setData(model.index(0, 2, building), "Never stored")
+        wait_for_flush(app, module)
+        assert not model.edits and len(warnings) == 1, "a failing save must be dropped"
+        assert model.data(model.index(0, 2, building)) == "Stored later"
+        window.db.conn.execute("PRAGMA query_only=OFF")
+        print("locked save retried, failing save dropped")
+
+        window.db.conn.set_trace_callback(None)
+        window.shutdown()
+    app.quit()
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main()
@@ -0,0 +1,82 @@
+# Cold start of the GUI in fresh processes: time to import the app, to the
+# window's first paint, and until the tree and the expiring-leases queue are
+# filled in; also checks that no mail, export, chart or NumPy code is
+# loaded before the window exists (the dashboard loads NumPy afterwards, on
+# its worker thread).
+#
+#   python benchmarks/bench_gui_startup.py [apartments] [runs]
+
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from bench_load_data import ROOT, populate
+
+HEAVY = ("sendgrid", "smtplib", "email.mime.multipart", "xlsxwriter", "openpyxl", "matplotlib", "numpy")
+
+PROBE = """
+import importlib.util, json, os, sys, time
+start = time.perf_counter()
+os.environ["QT_QPA_PLATFORM"] = "offscreen"
+sys.path.insert(0, ROOT)
+from PyQt5.QtCore import QEvent, QObject
+from PyQt5.QtWidgets import QApplication
+spec = importlib.util.spec_from_file_location("lease_navigator_app", os.path.join(ROOT, "Lease Navigator.py"))
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+
+class PaintWatcher(QObject):
+    painted = None
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint and self.painted is None:
+            self.painted = time.perf_counter()
+        return False
+
+app = QApplication(sys.argv[:1])
+window = module.PropertyManagerApp(db_name=DB_NAME)
+heavy = sorted(name for name in HEAVY if name in sys.modules)
+watcher = PaintWatcher()
+window.installEventFilter(watcher)
+window.show()
+while watcher.painted is None:
+    app.processEvents()
+while window.scheduler is None or window.expiry_backlog or window.model.rowCount() == 0:
+    app.processEvents()
+ready = time.perf_counter()
+window.shutdown()
+print(json.dumps({"import": imported - start, "first_paint": watcher.painted - start, "ready": ready - start,
+                  "reminders": len(window.queued_reminders), "heavy": heavy}))
+"""
+
+
+def main():
+    apartment_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    sys.path.insert(0, ROOT)
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = os.path.join(directory, "bench.db")
+        populate(db_name, apartment_count)
+        # Leases spread over the coming year, so startup has reminders to queue
+        with sqlite3.connect(db_name) as conn:
+            conn.execute("UPDATE apartments SET lease_end = date('now', '+' || (id * 7919 % 365) || ' days')")
+        conn.close()
+        probe = f"ROOT = {ROOT!r}\nDB_NAME = {db_name!r}\nHEAVY = {HEAVY!r}\n" + PROBE
+
+        results = []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, "-c", probe], check=True, capture_output=True, text=True)
+            results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    for key in ("import", "first_paint", "ready"):
+        print(f"{key:<12} {statistics.median(result[key] for result in results) * 1000:8.1f} ms")
+    heavy = ", ".join(results[0]["heavy"]) or "none"
+    print(f"{results[0]['reminders']} reminders queued; heavy modules loaded with the window: {heavy}")
+
+
+if __name__ == "__main__":
+    main()
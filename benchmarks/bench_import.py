@@ -0,0 +1,50 @@
+# Bulk import throughput from a generated lease roll CSV, with a share of
+# bad rows so validation and the rejects file are exercised.
+#
+#   python benchmarks/bench_import.py [rows]
+
+import csv
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lease_navigator import Database
+from lease_navigator.importer import COLUMNS, import_lease_roll
+
+APARTMENTS_PER_BUILDING = 300
+BAD_EVERY = 500
+
+
+def write_roll(path, count):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for i in range(count):
+            email = f"tenant{i}@example.com" if i % BAD_EVERY else "not-an-email"
+            writer.writerow([f"Building {i // APARTMENTS_PER_BUILDING}", f"{i % APARTMENTS_PER_BUILDING}-A",
+                             f"Tenant {i}", email, "01/01/2024", f"{i % 12 + 1:02d}/28/2025"])
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30_000
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "roll.csv")
+        write_roll(source, count)
+
+        db = Database(os.path.join(directory, "bench.db"))
+        db.migrate()
+        for label in ("first import", "re-import (updates)"):
+            start = time.perf_counter()
+            result = import_lease_roll(db, source)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<20} {count:>9,} rows  {elapsed:7.2f} s  {count / elapsed:10,.0f} rows/s  "
+                  f"imported={result.imported} rejected={result.rejected} buildings={result.buildings}")
+        assert db.count_apartments() == result.imported
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# Renewal letter throughput with 1, 2, 4, ... worker processes up to the
+# core count, for PDF and HTML. Each run writes every letter to disk; the
+# speedup column is against the single-process run.
+#
+#   python benchmarks/bench_letters.py [letters]
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lease_navigator.campaign import Recipient
+from lease_navigator.letters import DEFAULT_LETTER_TEMPLATE, HTML, PDF, LetterWriter
+
+
+def make_recipients(count):
+    return [Recipient(i, f"Building {i // 200}", f"{i % 200}-A", f"Tenant {i}", f"tenant{i}@example.com",
+                      "2024-01-01", "2025-06-30") for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    cores = os.cpu_count() or 1
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= cores:
+        worker_counts.append(worker_counts[-1] * 2)
+    if worker_counts[-1] != cores:
+        worker_counts.append(cores)
+
+    recipients = make_recipients(count)
+    print(f"{count} letters, {cores} cores")
+    for letter_format in (PDF, HTML):
+        single = None
+        for workers in worker_counts:
+            with tempfile.TemporaryDirectory() as directory:
+                writer = LetterWriter(DEFAULT_LETTER_TEMPLATE, directory, letter_format, workers=workers)
+                start = time.perf_counter()
+                letters = writer.run(recipients)
+                elapsed = time.perf_counter() - start
+                assert len(letters) == count and len(os.listdir(directory)) == count
+            single = single or elapsed
+            print(f"{letter_format:<5} {workers:>3} workers  {count / elapsed:9.0f} letters/s  "
+                  f"{elapsed:7.2f} s  speedup {single / elapsed:4.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Measures start-up, reload, expand and edit cost at different portfolio sizes.
+#
+#   QT_QPA_PLATFORM=offscreen python benchmarks/bench_load_data.py [sizes...]
+
+import importlib.util
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from PyQt5.QtWidgets import QApplication
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = [100, 10_000, 100_000, 1_000_000]
+
+
+def load_app_module():
+    # The GUI script imports the lease_navigator package that sits next to it
+    sys.path.insert(0, ROOT)
+    spec = importlib.util.spec_from_file_location("lease_navigator_app", os.path.join(ROOT, "Lease Navigator.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def populate(db_name, apartment_count):
+    from lease_navigator.database import Database
+
+    db = Database(db_name)
+    db.migrate()
+    building_count = max(1, apartment_count // 100)
+    with db.conn:
+        db.conn.executemany("INSERT INTO buildings (id, name) VALUES (?, ?)",
+                            ((i, f"Building {i}") for i in range(1, building_count + 1)))
+        db.import_apartments(((i % building_count + 1, f"{i // building_count + 1}-A", f"Tenant {i}",
+                               f"tenant{i}@example.com", "2024-01-01", f"2025-{i % 12 + 1:02d}-28")
+                              for i in range(apartment_count)))
+    db.close()
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(app, module, apartment_count):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, "bench.db")
+        populate(db_name, apartment_count)
+        window = None
+
+        def first_paint():
+            nonlocal window
+            window = module.PropertyManagerApp(db_name=db_name)
+            window.show()
+            app.processEvents()
+
+        first_paint_time = timed(first_paint)
+        reload_time = timed(window.load_data)
+
+        model = window.model
+        expand_time = timed(lambda: (window.tree.expand(model.index(0, 0)), app.processEvents()))
+
+        apartment = model.index(0, 2, model.index(0, 0))
+        edit_time = timed(lambda: (model.setData(apartment, "Renamed"), window.save_data()))
+
+        window.db.close()
+        window.deleteLater()
+    print(f"{apartment_count:>8} apartments  first paint {first_paint_time * 1000:8.1f} ms  "
+          f"reload {reload_time * 1000:7.1f} ms  expand {expand_time * 1000:6.1f} ms  "
+          f"edit+save {edit_time * 1000:6.1f} ms  peak rss {peak_rss_mb():6.0f} MB")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    app = QApplication(sys.argv[:1])
+    module = load_app_module()
+    for size in sizes:
+        run(app, module, size)
+    app.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Expiry scheduler cost at portfolio scale: initial load, per-change update
+# and a year of daily polls, driven by a fake clock.
+#
+#   python benchmarks/bench_scheduler.py [apartments]
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lease_navigator import Database
+from lease_navigator.scheduler import ExpiryScheduler
+
+START = date(2026, 1, 1)
+LEASE_SPREAD_DAYS = 3 * 365
+UPDATES = 100_000
+
+
+def populate(path, count):
+    db = Database(path)
+    db.migrate()
+    buildings = max(1, count // 100)
+    with db.conn:
+        db.conn.executemany("INSERT INTO buildings (id, name) VALUES (?, ?)",
+                            ((i, f"Building {i}") for i in range(1, buildings + 1)))
+        db.conn.executemany("INSERT INTO apartments (building_id, name, lease_end) VALUES (?, ?, ?)",
+                            ((i % buildings + 1, f"{i // buildings + 1}-A",
+                              (START + timedelta(days=i * 7919 % LEASE_SPREAD_DAYS)).isoformat())
+                             for i in range(count)))
+    return db
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        db = populate(os.path.join(directory, "bench.db"), count)
+        today = [START]
+
+        start = time.perf_counter()
+        scheduler = ExpiryScheduler(db, clock=lambda: today[0])
+        print(f"load {count:,} leases       {time.perf_counter() - start:8.3f} s  ({len(scheduler):,} in window)")
+
+        rng = random.Random(1)
+        changes = [(rng.randint(1, count), (START + timedelta(days=rng.randint(0, 120))).isoformat())
+                   for _ in range(UPDATES)]
+        start = time.perf_counter()
+        for apartment_id, lease_end in changes:
+            scheduler.update(apartment_id, lease_end)
+        elapsed = time.perf_counter() - start
+        print(f"update x{UPDATES:,}           {elapsed:8.3f} s  ({elapsed / UPDATES * 1e6:.2f} us per change)")
+
+        events = 0
+        slowest = 0.0
+        start = time.perf_counter()
+        for day in range(365):
+            today[0] = START + timedelta(days=day)
+            poll_start = time.perf_counter()
+            events += len(scheduler.poll())
+            slowest = max(slowest, time.perf_counter() - poll_start)
+        print(f"365 daily polls            {time.perf_counter() - start:8.3f} s  "
+              f"({events:,} events, slowest poll {slowest * 1000:.1f} ms)")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
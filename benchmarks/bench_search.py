@@ -0,0 +1,54 @@
+# Search box latency against the full-text index: time from query text to
+# the (apartment, building) ids the view is filtered with.
+#
+#   python benchmarks/bench_search.py [apartments]
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lease_navigator import Database
+
+SEARCH_LIMIT = 1000
+RUNS = 20
+QUERIES = ["ten", "tenan", "tenant12345", "tenant1234@", "example.com", "12-A", "building 77", "smith", "zzz"]
+SURNAMES = ["Smith", "Johnson", "Garcia", "Nguyen", "Okafor", "Kowalski", "Rossi", "Tanaka"]
+
+
+def populate(path, count):
+    db = Database(path)
+    db.migrate()
+    buildings = max(1, count // 100)
+    with db.conn:
+        db.conn.executemany("INSERT INTO buildings (id, name) VALUES (?, ?)",
+                            ((i, f"Building {i}") for i in range(1, buildings + 1)))
+        db.import_apartments(((i % buildings + 1, f"{i // buildings + 1}-A", f"Tenant {SURNAMES[i % 8]} {i}",
+                               f"tenant{i}@example.com", "2024-01-01", f"2025-{i % 12 + 1:02d}-28")
+                              for i in range(count)))
+    return db
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        db = populate(os.path.join(directory, "bench.db"), count)
+        print(f"populate {count:,} apartments (index kept by triggers): {time.perf_counter() - start:.1f} s")
+
+        for query in QUERIES:
+            timings = []
+            for _ in range(RUNS):
+                start = time.perf_counter()
+                rows = db.search(query, SEARCH_LIMIT)
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{query!r:<16} {len(rows):>5} rows   median {statistics.median(timings):6.2f} ms   "
+                  f"max {max(timings):6.2f} ms")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# Reminder template render throughput: compiled template vs. chained str.replace.
+#
+#   python benchmarks/bench_templates.py [records]
+
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lease_navigator.campaign import Recipient
+from lease_navigator.templates import compile_template
+
+SIMPLE = ("Dear {Name},\n\nYour lease is set to expire on {Lease End}. "
+          "Please contact us if you wish to renew your lease.\n\nSincerely,\nProperty Management")
+RICH = ("Dear {Name},\n\nThe lease for {Building} unit {Apartment} ({Lease Start:%b %d, %Y} to "
+        "{Lease End:%B %d, %Y}) ends in {Days Remaining} days. Reply to {Email} to renew.\n\n"
+        "Sincerely,\nProperty Management")
+
+
+def replace_chain(template, recipient):
+    message = template.replace("{Name}", recipient.tenant)
+    message = message.replace("{Lease Start}", recipient.lease_start)
+    return message.replace("{Lease End}", recipient.lease_end)
+
+
+def measure(label, count, render):
+    start = time.perf_counter()
+    render()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {count / elapsed:12,.0f} renders/s")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    recipients = [Recipient(i, f"Building {i % 50}", f"{i % 300}-A", f"Tenant {i}", f"tenant{i}@example.com",
+                            "2024-01-01", f"2025-{i % 12 + 1:02d}-28") for i in range(count)]
+    today = date(2024, 12, 1)
+
+    measure("str.replace chain, simple", count, lambda: [replace_chain(SIMPLE, r) for r in recipients])
+    simple = compile_template(SIMPLE)
+    measure("compiled, simple", count, lambda: [simple.render(r, today) for r in recipients])
+    rich = compile_template(RICH)
+    measure("compiled, all fields + dates", count, lambda: [rich.render(r, today) for r in recipients])
+    measure("compile once", 1, lambda: compile_template(RICH))
+
+
+if __name__ == "__main__":
+    main()
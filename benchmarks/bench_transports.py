@@ -0,0 +1,128 @@
+# Time to deliver 1,000 reminders through each mail transport, then with a
+# renewal letter of its own attached to each. SMTP and SendGrid talk to
+# throwaway local servers, so nothing leaves the machine.
+#
+#   python benchmarks/bench_transports.py [reminders]
+
+import json
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lease_navigator.campaign import Campaign, Recipient, summarize
+from lease_navigator.mail import FileTransport, MemorySink, SendGridTransport, SMTPTransport
+
+SENDER = "office@example.com"
+TEMPLATE = ("Dear {Name},\n\nYour lease is set to expire on {Lease End}. "
+            "Please contact us if you wish to renew your lease.\n\nSincerely,\nProperty Management")
+LETTER_SIZE = 2048
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP to accept mail from smtplib and throw it away
+
+    def handle(self):
+        self.wfile.write(b"220 localhost ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.wfile.write(b"250 localhost\r\n")
+            elif command == b"DATA":
+                self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.delivered += 1
+                self.wfile.write(b"250 OK\r\n")
+            elif command == b"QUIT":
+                self.wfile.write(b"221 Bye\r\n")
+                return
+            else:
+                self.wfile.write(b"250 OK\r\n")
+
+
+class SendGridSinkHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.delivered += len(body["personalizations"])
+        self.send_response(202)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(server):
+    server.delivered = 0
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_letters(directory, count):
+    # A stand-in letter per recipient, about the size of a rendered PDF one
+    letters = {}
+    for i in range(count):
+        letters[i] = os.path.join(directory, f"letter-{i}.pdf")
+        with open(letters[i], "wb") as f:
+            f.write(os.urandom(LETTER_SIZE))
+    return letters
+
+
+def run(label, transport, count, workers=4, letters=None):
+    recipients = [Recipient(i, "Building", f"{i}-A", f"Tenant {i}", f"tenant{i}@example.com",
+                            "2024-01-01", "2025-06-30") for i in range(count)]
+    campaign = Campaign(transport, "Lease Expiration Reminder", TEMPLATE, workers=workers, retries=0)
+    start = time.perf_counter()
+    campaign.run(recipients, letters=letters)
+    elapsed = time.perf_counter() - start
+    transport.close()
+    sent = summarize(recipients)["sent"]
+    print(f"{label:<36} {elapsed * 1000 / count * 1000:9.1f} ms per 1,000  ({sent} sent)")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    smtp_server = serve(socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPSinkHandler))
+    smtp_port = smtp_server.server_address[1]
+    http_server = serve(ThreadingHTTPServer(("127.0.0.1", 0), SendGridSinkHandler))
+    http_host = f"http://127.0.0.1:{http_server.server_address[1]}"
+
+    run("memory sink", MemorySink(), count)
+    with tempfile.TemporaryDirectory() as outbox:
+        run("file outbox", FileTransport(outbox, SENDER), count)
+    run("smtp, 1 pooled connection", SMTPTransport("127.0.0.1", smtp_port, SENDER, use_tls=False, pool_size=1),
+        count, workers=1)
+    run("smtp, 4 pooled connections", SMTPTransport("127.0.0.1", smtp_port, SENDER, use_tls=False, pool_size=4),
+        count)
+
+    unbatched = SendGridTransport("SG.benchmark", SENDER, host=http_host)
+    unbatched.batch_size = 1
+    run("sendgrid, one call per message", unbatched, count)
+    run("sendgrid, batched personalizations", SendGridTransport("SG.benchmark", SENDER, host=http_host), count)
+
+    # A letter of its own in every message: SendGrid can no longer batch
+    with tempfile.TemporaryDirectory() as directory:
+        letters = write_letters(directory, count)
+        print("with a renewal letter each")
+        run("smtp, 4 pooled connections", SMTPTransport("127.0.0.1", smtp_port, SENDER, use_tls=False, pool_size=4),
+            count, letters=letters)
+        run("sendgrid, one call per message", SendGridTransport("SG.benchmark", SENDER, host=http_host), count,
+            letters=letters)
+
+    smtp_server.shutdown()
+    http_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# Load test for the JSON API: many concurrent keep-alive clients request a
+# mix of building pages, apartment pages, single apartments, expiring
+# leases and searches. Each client remembers the ETag of every URL it has
+# fetched and revalidates with If-None-Match, as a well-behaved tool does,
+# while a writer commits a change every so often to invalidate them.
+#
+# Without --url a database is generated and `lease_navigator serve` run
+# against it in a process of its own.
+#
+#   python benchmarks/load_api.py [--clients N] [--seconds S] [--writes-per-second W] [--url URL]
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lease_navigator import Database
+
+APARTMENTS = 100_000
+BUILDINGS = APARTMENTS // 100
+SEARCHES = ["Tenant 1", "Tenant 42", "example.com", "Building 7", "10-A"]
+
+
+def populate(db_name):
+    db = Database(db_name)
+    db.migrate()
+    with db.conn:
+        db.conn.executemany("INSERT INTO buildings (id, name, sort_key) VALUES (?, ?, ?)",
+                            ((i, f"Building {i}", f"building {i:06d}") for i in range(1, BUILDINGS + 1)))
+        db.import_apartments(((i % BUILDINGS + 1, f"{i // BUILDINGS + 1}-A", f"Tenant {i}", f"tenant{i}@example.com",
+                               "2024-01-01", f"2025-{i % 12 + 1:02d}-28") for i in range(APARTMENTS)))
+    db.close()
+
+
+def request_mix(rng):
+    kind = rng.random()
+    if kind < 0.3:
+        return f"/buildings?limit={rng.choice([50, 100, 200])}"
+    if kind < 0.55:
+        return f"/buildings/{rng.randint(1, BUILDINGS)}/apartments?limit=100"
+    if kind < 0.8:
+        return f"/apartments/{rng.randint(1, APARTMENTS)}"
+    if kind < 0.9:
+        return f"/leases/expiring?from=2025-{rng.randint(1, 12):02d}-01&within=30&limit=100"
+    return f"/search?q={rng.choice(SEARCHES).replace(' ', '%20')}&limit=50"
+
+
+async def fetch(reader, writer, host, path, etag):
+    lines = [f"GET {path} HTTP/1.1", f"Host: {host}"]
+    if etag:
+        lines.append(f"If-None-Match: {etag}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers.get("etag")
+
+
+async def client(host, port, deadline, seed, results):
+    rng = random.Random(seed)
+    etags = {}
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            path = request_mix(rng)
+            start = time.perf_counter()
+            try:
+                status, etag = await fetch(reader, writer, host, path, etags.get(path))
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                results["errors"] += 1
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+                continue
+            results["latencies"].append((time.perf_counter() - start) * 1000)
+            results["statuses"][status] += 1
+            if etag:
+                etags[path] = etag
+    finally:
+        writer.close()
+
+
+def write_changes(db_name, per_second, stop):
+    # Commits through a connection of its own, as the GUI or another copy
+    # of the app would
+    db = Database(db_name)
+    count = 0
+    while not stop.wait(1 / per_second):
+        db.add_building(f"Load test {count}")
+        count += 1
+    db.close()
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0.0
+
+
+async def run(host, port, clients, seconds):
+    results = {"latencies": [], "statuses": Counter(), "errors": 0}
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(*(client(host, port, deadline, seed, results) for seed in range(clients)))
+    return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(host, port, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            socket.create_connection((host, port), 0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server at {host}:{port} did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--writes-per-second", type=float, default=1)
+    parser.add_argument("--url", help="an already running server; nothing is written to it")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        db_name = None
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port
+        else:
+            db_name = os.path.join(tmp, "load.db")
+            populate(db_name)
+            host, port = "127.0.0.1", free_port()
+            server = subprocess.Popen([sys.executable, "-m", "lease_navigator", "--db", db_name, "-q", "serve",
+                                       "--port", str(port)], cwd=ROOT)
+            wait_for_server(host, port)
+
+        stop = threading.Event()
+        writer = None
+        if db_name and args.writes_per_second:
+            writer = threading.Thread(target=write_changes, args=(db_name, args.writes_per_second, stop))
+            writer.start()
+        try:
+            started = time.perf_counter()
+            results = asyncio.run(run(host, port, args.clients, args.seconds))
+            elapsed = time.perf_counter() - started
+        finally:
+            stop.set()
+            if writer is not None:
+                writer.join()
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    latencies = sorted(results["latencies"])
+    statuses = results["statuses"]
+    total = sum(statuses.values())
+    print(f"{args.clients} clients, {elapsed:.1f} s, {args.writes_per_second:g} writes/s")
+    print(f"{total / elapsed:8.0f} requests/s  "
+          f"{', '.join(f'{status}: {count}' for status, count in sorted(statuses.items()))}  "
+          f"errors: {results['errors']}")
+    print(f"  304 share {statuses[304] / total:.0%}" if total else "  no responses")
+    print(f"  latency p50 {percentile(latencies, 0.5):.1f} ms  p95 {percentile(latencies, 0.95):.1f} ms  "
+          f"p99 {percentile(latencies, 0.99):.1f} ms  max {latencies[-1] if latencies else 0:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
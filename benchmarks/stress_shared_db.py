@@ -0,0 +1,145 @@
+# Several processes editing one database file at once, as copies of the
+# app on a shared volume do. Each worker repeatedly reads an apartment,
+# increments a counter kept in its tenant column and saves it with the
+# version it read, retrying on conflict. A watcher process mirrors the
+# table through change_log deltas only. Afterwards every counter must equal
+# the number of increments that were acknowledged (no lost updates), and
+# the watcher's mirror must match the table.
+#
+#   python benchmarks/stress_shared_db.py [workers] [seconds] [apartments]
+
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lease_navigator import Database
+
+
+def populate(db_name, apartment_count):
+    db = Database(db_name)
+    db.migrate()
+    with db.conn:
+        building_id = db.add_buildings(["Stress"], db.conn)["Stress"]
+        db.import_apartments([(building_id, f"{i}-A", "0", f"tenant{i}@example.com", "2024-01-01", "2025-06-30")
+                              for i in range(apartment_count)])
+    ids = [row[0] for row in db.conn.execute("SELECT id FROM apartments")]
+    db.close()
+    return ids
+
+
+def worker(db_name, ids, seconds, seed, results):
+    db = Database(db_name)
+    rng = random.Random(seed)
+    acknowledged = Counter()
+    conflicts = busy = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        apartment_id = rng.choice(ids)
+        while True:
+            (_, building_id, name, tenant, email, start, end, version, _), = db.apartments_by_ids([apartment_id])
+            try:
+                lost = db.save_apartments([(apartment_id, version, building_id, name, str(int(tenant) + 1), email,
+                                            start, end)], {})
+            except sqlite3.OperationalError:
+                # Locked for longer than the busy timeout; try again
+                busy += 1
+                continue
+            if not lost:
+                acknowledged[apartment_id] += 1
+                break
+            conflicts += 1
+    db.close()
+    results.put((acknowledged, conflicts, busy))
+
+
+def watcher(db_name, stop, results):
+    # Keeps {id: (version, tenant)} current from deltas alone
+    db = Database(db_name)
+    mirror = {row[0]: (row[7], row[3]) for row in db.apartments_by_ids(
+        [row[0] for row in db.conn.execute("SELECT id FROM apartments")])}
+    seq = db.last_change()
+    commit_version = db.commit_version()
+    polls = applied = 0
+
+    def poll():
+        nonlocal seq, commit_version, polls, applied
+        version = db.commit_version()
+        if version == commit_version:
+            return
+        commit_version = version
+        polls += 1
+        changes = db.changes_since(seq, 100000)
+        if not changes:
+            return
+        seq = changes[-1][0]
+        ids = {row_id for _, kind, row_id in changes if kind == "apartment"}
+        for row in db.apartments_by_ids(ids):
+            mirror[row[0]] = (row[7], row[3])
+        applied += len(ids)
+
+    while not stop.is_set():
+        poll()
+        time.sleep(0.005)
+    poll()
+    db.close()
+    results.put((mirror, polls, applied))
+
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    apartment_count = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_name = os.path.join(directory, "shared.db")
+        ids = populate(db_name, apartment_count)
+
+        results = multiprocessing.Queue()
+        watch_results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        watch = multiprocessing.Process(target=watcher, args=(db_name, stop, watch_results))
+        watch.start()
+        processes = [multiprocessing.Process(target=worker, args=(db_name, ids, seconds, seed, results))
+                     for seed in range(workers)]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        outcomes = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - start
+        for process in processes:
+            process.join()
+        stop.set()
+        mirror, polls, applied = watch_results.get()
+        watch.join()
+
+        acknowledged = Counter()
+        for counts, _, _ in outcomes:
+            acknowledged.update(counts)
+        conflicts = sum(outcome[1] for outcome in outcomes)
+        busy = sum(outcome[2] for outcome in outcomes)
+
+        db = Database(db_name)
+        stored = {row[0]: (row[7], row[3]) for row in db.apartments_by_ids(ids)}
+        db.close()
+
+        lost = sum(acknowledged[apartment_id] - int(tenant) for apartment_id, (_, tenant) in stored.items())
+        bad_versions = sum(version != 1 + acknowledged[apartment_id]
+                           for apartment_id, (version, _) in stored.items())
+        stale = sum(mirror.get(apartment_id) != row for apartment_id, row in stored.items())
+        total = sum(acknowledged.values())
+        print(f"{workers} workers x {seconds:g} s on {apartment_count} apartments: {total} saves "
+              f"({total / elapsed:,.0f}/s), {conflicts} conflicts retried, {busy} busy retries")
+        print(f"lost updates: {lost}  wrong versions: {bad_versions}  "
+              f"watcher: {polls} polls, {applied} rows re-read, {stale} stale")
+        assert lost == 0 and bad_versions == 0 and stale == 0
+
+
+if __name__ == "__main__":
+    main()
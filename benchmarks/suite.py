@@ -0,0 +1,253 @@
+# Benchmark suite over synthetic portfolios of increasing size. For each
+# size it imports a generated lease roll, then measures the window's first
+# paint, reload, expand, search and edit+save, the chart, the analytics
+# dashboard from scratch and after an edit, CSV and XLSX export, and a bulk
+# reminder send into the in-memory mail sink. Qt runs on
+# the offscreen platform, so no display is needed.
+#
+# Results are written as JSON. Interactive paths are held to the fixed
+# budgets below; with --baseline, every metric is also compared against an
+# earlier results file and anything more than --tolerance slower is
+# reported, ignoring differences below NOISE_FLOOR_SECONDS. Either kind of
+# regression makes the exit status 1.
+#
+#   python benchmarks/suite.py [--sizes 1000 10000] [--output results.json]
+#                              [--baseline old.json] [--tolerance 0.25] [--profile DIR]
+
+import argparse
+import cProfile
+import csv
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QT_VERSION_STR
+from PyQt5.QtWidgets import QApplication
+
+from bench_load_data import load_app_module
+
+DEFAULT_SIZES = [1000, 10_000, 100_000, 1_000_000]
+APARTMENTS_PER_BUILDING = 200
+SURNAMES = ["Smith", "Johnson", "Garcia", "Nguyen", "Okafor", "Kowalski", "Rossi", "Tanaka"]
+SEARCHES = ["tenant12", "nguyen", "example.com", "12-A"]
+REPEAT = 5
+# Leases are spread over this many days from today
+LEASE_SPREAD_DAYS = 365
+REMIND_WITHIN_DAYS = 60
+# XLSX export is slow enough that it is only run up to this size
+MAX_XLSX_SIZE = 100_000
+
+# Seconds an interactive action may take at any portfolio size
+BUDGETS = {
+    "gui.first_paint": 1.5,
+    "gui.reload": 0.1,
+    "gui.expand": 0.1,
+    "gui.search": 0.1,
+    "gui.edit_save": 0.05,
+}
+
+# Slowdowns smaller than this are timer and scheduler noise, whatever the ratio
+NOISE_FLOOR_SECONDS = 0.01
+
+
+def write_roll(path, count):
+    today = date.today()
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Building", "Apartment", "Tenant", "Email", "Lease Start", "Lease End"])
+        for i in range(count):
+            end = today + timedelta(days=i * 7919 % LEASE_SPREAD_DAYS)
+            writer.writerow([f"Building {i // APARTMENTS_PER_BUILDING}", f"{i % APARTMENTS_PER_BUILDING}-A",
+                             f"Tenant {SURNAMES[i % 8]} {i}", f"tenant{i}@example.com",
+                             (end - timedelta(days=365)).isoformat(), end.isoformat()])
+
+
+class Suite:
+    def __init__(self, profile_dir=None):
+        self.results = []
+        self.profile_dir = profile_dir
+
+    def measure(self, name, size, func, repeat=1, items=None):
+        # Median wall time of `repeat` calls; items is what one call
+        # processes, for a throughput figure next to the time
+        timings = []
+        for _ in range(repeat):
+            profiler = cProfile.Profile() if self.profile_dir else None
+            start = time.perf_counter()
+            if profiler:
+                profiler.runcall(func)
+            else:
+                func()
+            timings.append(time.perf_counter() - start)
+            if profiler:
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{name}-{size}.prof"))
+        seconds = statistics.median(timings)
+        result = {"name": name, "size": size, "seconds": seconds}
+        if items is not None:
+            result["items"] = items
+            result["per_second"] = items / seconds if seconds else None
+        self.results.append(result)
+
+        rate = f"{result['per_second']:12,.0f}/s" if items else ""
+        print(f"{name:<18} {size:>9,}  {seconds * 1000:10.1f} ms {rate}", flush=True)
+        return result
+
+    def run(self, app, module, size):
+        from lease_navigator.analytics import Analytics
+        from lease_navigator.campaign import Campaign, select_recipients
+        from lease_navigator.charts import render_portfolio_chart
+        from lease_navigator.export import export_lease_roll
+        from lease_navigator.importer import import_lease_roll
+        from lease_navigator.mail import MemorySink
+        from lease_navigator.templates import DEFAULT_SUBJECT, DEFAULT_TEMPLATE
+
+        from lease_navigator import Database
+
+        with tempfile.TemporaryDirectory() as directory:
+            roll = os.path.join(directory, "roll.csv")
+            write_roll(roll, size)
+            db_name = os.path.join(directory, "bench.db")
+            db = Database(db_name)
+            db.migrate()
+            self.measure("import", size, lambda: import_lease_roll(db, roll), items=size)
+            db.close()
+
+            window = None
+
+            def first_paint():
+                nonlocal window
+                window = module.PropertyManagerApp(db_name=db_name)
+                window.show()
+                app.processEvents()
+
+            self.measure("gui.first_paint", size, first_paint)
+            model = window.model
+            self.measure("gui.reload", size, lambda: (window.load_data(), app.processEvents()), REPEAT)
+
+            buildings = iter(range(model.rowCount()))
+            self.measure("gui.expand", size, lambda: (window.tree.expand(model.index(next(buildings), 0)),
+                                                      app.processEvents()), min(REPEAT, model.rowCount()))
+
+            searches = iter(SEARCHES * REPEAT)
+
+            def search():
+                window.search_input.setText(next(searches))
+                window.apply_search()
+                app.processEvents()
+
+            self.measure("gui.search", size, search, REPEAT)
+            window.search_input.clear()
+            window.apply_search()
+
+            window.tree.expand(model.index(0, 0))
+            app.processEvents()
+            edits = iter(range(REPEAT))
+
+            def edit_save():
+                row = next(edits)
+                model.setData(model.index(row, 2, model.index(0, 0)), f"Renamed {row}")
+                window.save_data()
+
+            self.measure("gui.edit_save", size, edit_save, REPEAT)
+
+            # The median leaves out matplotlib's import on the first call
+            self.measure("chart", size, lambda: render_portfolio_chart(window.db), 3)
+            analytics = Analytics()
+            self.measure("analytics", size, lambda: Analytics().dashboard(window.db), 3)
+            analytics.dashboard(window.db)
+            renames = iter(range(REPEAT))
+
+            def analytics_update():
+                model.setData(model.index(0, 2, model.index(0, 0)), f"Analysed {next(renames)}")
+                window.save_data()
+                analytics.dashboard(window.db)
+
+            self.measure("analytics.update", size, analytics_update, REPEAT)
+            self.measure("export.csv", size, lambda: export_lease_roll(window.db, os.path.join(directory, "out.csv")),
+                         items=size)
+            if size <= MAX_XLSX_SIZE:
+                self.measure("export.xlsx", size,
+                             lambda: export_lease_roll(window.db, os.path.join(directory, "out.xlsx")), items=size)
+
+            recipients = select_recipients(window.db, REMIND_WITHIN_DAYS)
+            campaign = Campaign(MemorySink(), DEFAULT_SUBJECT, DEFAULT_TEMPLATE)
+            self.measure("send", size, lambda: campaign.run(recipients), items=len(recipients))
+
+            window.shutdown()
+            window.deleteLater()
+            app.processEvents()
+
+
+def environment():
+    return {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "sqlite": sqlite3.sqlite_version,
+        "qt": QT_VERSION_STR,
+    }
+
+
+def check_budgets(results):
+    return [f"{result['name']} at {result['size']:,}: {result['seconds'] * 1000:.1f} ms "
+            f"(budget {BUDGETS[result['name']] * 1000:.0f} ms)"
+            for result in results
+            if result["name"] in BUDGETS and result["seconds"] > BUDGETS[result["name"]]]
+
+
+def compare(results, baseline, tolerance):
+    previous = {(result["name"], result["size"]): result["seconds"] for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get((result["name"], result["size"]))
+        if not before:
+            continue
+        if result["seconds"] > before * (1 + tolerance) and result["seconds"] - before > NOISE_FLOOR_SECONDS:
+            regressions.append(f"{result['name']} at {result['size']:,}: {before * 1000:.1f} ms -> "
+                               f"{result['seconds'] * 1000:.1f} ms (+{result['seconds'] / before - 1:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="results file from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="slowdown against the baseline that counts as a regression (default: %(default)s)")
+    parser.add_argument("--profile", metavar="DIR", help="write a cProfile .prof file per measurement")
+    args = parser.parse_args()
+
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+    app = QApplication(sys.argv[:1])
+    module = load_app_module()
+    suite = Suite(args.profile)
+    for size in args.sizes:
+        suite.run(app, module, size)
+    app.quit()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"environment": environment(), "budgets": BUDGETS, "results": suite.results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    problems = check_budgets(suite.results)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems += compare(suite.results, json.load(f), args.tolerance)
+    for problem in problems:
+        print("REGRESSION", problem)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
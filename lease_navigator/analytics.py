@@ -0,0 +1,249 @@
+import threading
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+
+from .telemetry import timed
+
+# Occupancy is shown from this many months back to this many ahead
+HISTORY_MONTHS = 12
+FORECAST_MONTHS = 12
+WATERFALL_MONTHS = 24
+WATERFALL_QUARTERS = 8
+# Leases ending within this many days count as ending soon
+ENDING_SOON_DAYS = 90
+# Rows fetched per round trip when every lease is read
+FETCH_SIZE = 50_000
+# More changed rows than this since the last refresh and every lease is
+# read again instead of patching the loaded columns
+DELTA_LIMIT = 20_000
+DAYS_PER_MONTH = 365.25 / 12
+# Day numbers in the arrays count from 1970-01-01
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# buildings are (name, units, occupancy a year ago, now and in a year,
+# average lease term in months), lowest occupancy first; months are
+# (yyyy-MM, occupied units, occupancy, leases ending, expected vacancies)
+Dashboard = namedtuple("Dashboard", "units occupied average_term_months ending_soon ending_soon_days buildings "
+                                    "months expiries_by_month expiries_by_quarter")
+
+
+def month_number(days):
+    # Months since January 1970 for day numbers counted from 1970-01-01
+    return np.asarray(days).astype(np.int64).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def first_days(first_month, count):
+    # Day numbers of the 1st of `count` consecutive months
+    months = np.arange(first_month, first_month + count).astype("datetime64[M]")
+    return months.astype("datetime64[D]").astype(np.int64)
+
+
+def month_label(month):
+    year, month = divmod(int(month), 12)
+    return f"{1970 + year:04d}-{month + 1:02d}"
+
+
+def quarter_label(quarter):
+    year, quarter = divmod(int(quarter), 4)
+    return f"{1970 + year:04d} Q{quarter + 1}"
+
+
+def lease_columns(rows):
+    # (id, building_id, start, end) rows to arrays; a date that isn't one
+    # comes back from SQLite as NULL and becomes NaN
+    rows = np.array(rows, dtype=np.float64).reshape(-1, 4)
+    return rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64), np.floor(rows[:, 2]), np.floor(rows[:, 3])
+
+
+class Portfolio:
+    # Every lease as parallel NumPy arrays of apartment id, building id and
+    # start and end day, read from SQLite in one pass and then kept current
+    # by re-reading only the apartments that change_log says were written.
+    # All metrics are whole-array operations; nothing loops over leases.
+
+    def __init__(self, db, conn):
+        # The log position is taken before the rows are read, so a write
+        # landing in between is read again by the next update rather than lost
+        self.seq = db.last_change(conn)
+        cursor = db.lease_days(conn)
+        chunks = []
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            chunks.append(lease_columns(rows))
+        if chunks:
+            self.ids, self.building_ids, self.starts, self.ends = (np.concatenate(column) for column in zip(*chunks))
+        else:
+            self.ids, self.building_ids, self.starts, self.ends = lease_columns([])
+        self.read_buildings(db, conn)
+
+    def read_buildings(self, db, conn):
+        rows = db.building_names(conn)
+        self.buildings = np.array([building_id for building_id, _ in rows], dtype=np.int64)
+        self.building_names = [name for _, name in rows]
+
+    def update(self, db, conn):
+        # False when too much changed, or the log was pruned past this
+        # position, and the portfolio has to be read again instead
+        changes = db.changes_since(self.seq, DELTA_LIMIT + 1, conn)
+        if changes is None or len(changes) > DELTA_LIMIT:
+            return False
+        if not changes:
+            return True
+
+        apartment_ids = {row_id for _, kind, row_id in changes if kind == "apartment"}
+        if apartment_ids:
+            # Deleted apartments just drop out; the rest come back re-read
+            keep = ~np.isin(self.ids, np.fromiter(apartment_ids, np.int64, len(apartment_ids)))
+            ids, building_ids, starts, ends = lease_columns(db.lease_days_by_ids(apartment_ids, conn))
+            self.ids = np.concatenate([self.ids[keep], ids])
+            self.building_ids = np.concatenate([self.building_ids[keep], building_ids])
+            self.starts = np.concatenate([self.starts[keep], starts])
+            self.ends = np.concatenate([self.ends[keep], ends])
+        if any(kind == "building" for _, kind, _ in changes):
+            self.read_buildings(db, conn)
+        self.seq = changes[-1][0]
+        return True
+
+    def valid(self):
+        # Leases with both dates set and the end not before the start
+        return ~np.isnan(self.starts) & ~np.isnan(self.ends) & (self.ends >= self.starts)
+
+    def positions(self, mask=None):
+        # Each lease's building as an index into self.buildings
+        building_ids = self.building_ids if mask is None else self.building_ids[mask]
+        return np.searchsorted(self.buildings, building_ids)
+
+    def units(self):
+        return np.bincount(self.positions(), minlength=len(self.buildings))
+
+    @timed("analytics.occupancy")
+    def occupancy(self, first_month, months):
+        # Units under lease on the 1st of each month, per building: a
+        # (buildings, months) array. Each lease adds one from the first
+        # month it covers and takes it away after the last, and a running
+        # sum along the months gives the count.
+        valid = self.valid()
+        firsts = first_days(first_month, months)
+        covered_from = np.searchsorted(firsts, self.starts[valid], "left")
+        covered_to = np.searchsorted(firsts, self.ends[valid], "right")
+        leased = covered_from < covered_to
+        offsets = self.positions(valid)[leased] * (months + 1)
+        size = len(self.buildings) * (months + 1)
+        steps = (np.bincount(offsets + covered_from[leased], minlength=size)
+                 - np.bincount(offsets + covered_to[leased], minlength=size))
+        return np.cumsum(steps.reshape(len(self.buildings), months + 1), axis=1)[:, :months]
+
+    @timed("analytics.expiries")
+    def expiries(self, first_month, months, quarters):
+        # Leases ending in each of `months` months, and each of `quarters`
+        # calendar quarters, from first_month on
+        ends = self.ends[~np.isnan(self.ends)]
+        ending_months = month_number(ends) - first_month
+        by_month = np.bincount(ending_months[(ending_months >= 0) & (ending_months < months)], minlength=months)
+        ending_quarters = (ending_months + first_month) // 3 - first_month // 3
+        by_quarter = np.bincount(ending_quarters[(ending_quarters >= 0) & (ending_quarters < quarters)],
+                                 minlength=quarters)
+        return by_month, by_quarter
+
+    @timed("analytics.tenure")
+    def tenure(self):
+        # Average lease term in days, overall and per building (NaN for a
+        # building without a dated lease)
+        valid = self.valid()
+        terms = self.ends[valid] - self.starts[valid]
+        positions = self.positions(valid)
+        counts = np.bincount(positions, minlength=len(self.buildings))
+        totals = np.bincount(positions, weights=terms, minlength=len(self.buildings))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            per_building = totals / counts
+        return (terms.mean() if len(terms) else 0.0), per_building
+
+    @timed("analytics.vacancy_forecast")
+    def vacancy_forecast(self, today, first_month, occupied, renewal_rate):
+        # For each month from first_month on, given the units under lease on
+        # its 1st: leases ending in it among those running today, and units
+        # expected to be vacant on its 1st when that share of ending leases
+        # is renewed
+        day = today.toordinal() - EPOCH_ORDINAL
+        running = self.valid() & (self.starts <= day) & (self.ends >= day)
+        running_ends = np.sort(self.ends[running])
+        ended_by = np.searchsorted(running_ends, first_days(first_month, len(occupied) + 1), "left")
+        vacant = len(self.ids) - occupied - renewal_rate * ended_by[:-1]
+        return np.diff(ended_by), np.maximum(vacant, 0)
+
+
+class Analytics:
+    # The portfolio stays loaded between refreshes and the last dashboard
+    # is kept with the change_log position and inputs it was computed from,
+    # so an unchanged database is answered from memory and a changed one
+    # costs a delta read plus the array arithmetic. Refreshes are meant to
+    # run off the GUI thread, one at a time.
+
+    def __init__(self):
+        self.portfolio = None
+        self._key = None
+        self._dashboard = None
+        self._lock = threading.Lock()
+
+    @timed("analytics.refresh")
+    def refresh(self, db, conn):
+        if self.portfolio is None or not self.portfolio.update(db, conn):
+            self.portfolio = Portfolio(db, conn)
+        return self.portfolio
+
+    def dashboard(self, db, today=None, renewal_rate=0.0):
+        today = today or date.today()
+        with self._lock, db.reader() as conn:
+            if self.portfolio is not None and self._key == (db.last_change(conn), today, renewal_rate):
+                return self._dashboard
+            portfolio = self.refresh(db, conn)
+            self._dashboard = build_dashboard(portfolio, today, renewal_rate)
+            self._key = (portfolio.seq, today, renewal_rate)
+            return self._dashboard
+
+
+@timed("analytics.dashboard")
+def build_dashboard(portfolio, today, renewal_rate):
+    this_month = month_number(today.toordinal() - EPOCH_ORDINAL)
+    first_month = this_month - HISTORY_MONTHS
+    months = HISTORY_MONTHS + 1 + FORECAST_MONTHS
+
+    units = portfolio.units()
+    occupancy = portfolio.occupancy(first_month, months)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rates = occupancy / units[:, None]
+    average_term, building_terms = portfolio.tenure()
+    now = HISTORY_MONTHS
+    order = np.lexsort((portfolio.buildings, np.nan_to_num(rates[:, now], nan=np.inf)))
+    buildings = [(portfolio.building_names[i], int(units[i]), float(rates[i, 0]), float(rates[i, now]),
+                  float(rates[i, -1]), float(building_terms[i] / DAYS_PER_MONTH)) for i in order]
+
+    total = occupancy.sum(axis=0)
+    ending, vacant = portfolio.vacancy_forecast(today, this_month, total[now:], renewal_rate)
+    unit_count = int(units.sum())
+    month_rows = []
+    for i in range(months):
+        forecast = i - HISTORY_MONTHS
+        month_rows.append((month_label(first_month + i), int(total[i]),
+                           float(total[i] / unit_count) if unit_count else 0.0,
+                           int(ending[forecast]) if forecast >= 0 else None,
+                           float(vacant[forecast]) if forecast >= 0 else None))
+
+    by_month, by_quarter = portfolio.expiries(this_month, WATERFALL_MONTHS, WATERFALL_QUARTERS)
+    day = today.toordinal() - EPOCH_ORDINAL
+    ending_soon = int(np.count_nonzero((portfolio.ends >= day) & (portfolio.ends <= day + ENDING_SOON_DAYS)))
+    return Dashboard(
+        units=unit_count,
+        occupied=int(total[now]),
+        average_term_months=float(average_term / DAYS_PER_MONTH),
+        ending_soon=ending_soon,
+        ending_soon_days=ENDING_SOON_DAYS,
+        buildings=buildings,
+        months=month_rows,
+        expiries_by_month=[(month_label(this_month + i), int(count)) for i, count in enumerate(by_month)],
+        expiries_by_quarter=[(quarter_label(this_month // 3 + i), int(count)) for i, count in enumerate(by_quarter)],
+    )
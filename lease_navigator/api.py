@@ -0,0 +1,404 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import parse_qsl, urlsplit
+
+from .database import FIRST_KEY
+from .telemetry import timed
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DEFAULT_EXPIRING_DAYS = 60
+# Search matches past this many are not returned
+SEARCH_LIMIT = 1000
+# Rendered responses kept, most recently used first
+RESPONSE_CACHE_SIZE = 1024
+# Connections waiting to be accepted; enough for hundreds of clients
+# connecting at once
+BACKLOG = 1024
+# An idle keep-alive connection is closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 15
+MAX_HEADERS = 100
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ApiError(400, "Invalid cursor") from None
+
+
+def position(params):
+    # A keyset cursor is the (sort value, id) of the last row of the previous page
+    if "after" not in params:
+        return FIRST_KEY
+    after = decode_cursor(params["after"])
+    if not (isinstance(after, list) and len(after) == 2 and isinstance(after[1], int)):
+        raise ApiError(400, "Invalid cursor")
+    return after
+
+
+def page_size(params):
+    try:
+        limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, "limit must be a number") from None
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ApiError(400, f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def parse_id(text):
+    try:
+        return int(text)
+    except ValueError:
+        raise ApiError(404, "Not found") from None
+
+
+def parse_date(params, name, default):
+    if name not in params:
+        return default
+    try:
+        return date.fromisoformat(params[name])
+    except ValueError:
+        raise ApiError(400, f"{name} must be a date such as 2025-06-30") from None
+
+
+def building_json(row):
+    building_id, name, apartments = row[:3]
+    return {"id": building_id, "name": name, "apartments": apartments}
+
+
+def apartment_json(building_id, row):
+    # An apartments_page row: id, name, tenant, email, start, end, version
+    apartment_id, name, tenant, email, lease_start, lease_end, version = row[:7]
+    return {"id": apartment_id, "building_id": building_id, "name": name, "tenant": tenant, "email": email,
+            "lease_start": lease_start, "lease_end": lease_end, "version": version}
+
+
+def lease_json(row):
+    apartment_id, building, apartment, tenant, email, lease_start, lease_end = row
+    return {"apartment_id": apartment_id, "building": building, "apartment": apartment, "tenant": tenant,
+            "email": email, "lease_start": lease_start, "lease_end": lease_end}
+
+
+def page(items, rows, limit, key):
+    # The handlers read limit + 1 rows; a row past the page means there is
+    # a next one, starting after the key of the page's last row
+    return {"items": items[:limit], "next": encode_cursor(key(rows[limit - 1])) if len(rows) > limit else None}
+
+
+# Each handler runs on a worker thread with a pooled read-only connection
+# and returns the JSON document for the response
+
+def list_buildings(db, conn, params):
+    limit = page_size(params)
+    after = position(params)
+    rows = db.buildings_page(after, limit + 1, conn)
+    return page([building_json(row) for row in rows], rows, limit, lambda row: [row[3], row[0]])
+
+
+def get_building(db, conn, params, building_id):
+    rows = db.buildings_by_ids([parse_id(building_id)], conn)
+    if not rows:
+        raise ApiError(404, "No such building")
+    building_id, name, _, apartments = rows[0]
+    return building_json((building_id, name, apartments))
+
+
+def list_apartments(db, conn, params, building_id):
+    building_id = parse_id(building_id)
+    if not db.buildings_by_ids([building_id], conn):
+        raise ApiError(404, "No such building")
+    limit = page_size(params)
+    after = position(params)
+    rows = db.apartments_page(building_id, after, limit + 1, conn)
+    return page([apartment_json(building_id, row) for row in rows], rows, limit, lambda row: [row[7], row[0]])
+
+
+def get_apartment(db, conn, params, apartment_id):
+    rows = db.apartments_by_ids([parse_id(apartment_id)], conn)
+    if not rows:
+        raise ApiError(404, "No such apartment")
+    apartment_id, building_id, *values = rows[0]
+    return apartment_json(building_id, (apartment_id, *values))
+
+
+def list_expiring(db, conn, params):
+    # Leases ending from `from` (default today) through `to`, or within
+    # `within` days of `from`; soonest first
+    limit = page_size(params)
+    start = parse_date(params, "from", date.today())
+    try:
+        within = int(params.get("within", DEFAULT_EXPIRING_DAYS))
+    except ValueError:
+        raise ApiError(400, "within must be a number of days") from None
+    end = parse_date(params, "to", start + timedelta(days=within))
+    after = position(params)
+    rows = db.leases_expiring(start.isoformat(), end.isoformat(), conn, after, limit + 1)
+    return page([lease_json(row) for row in rows], rows, limit, lambda row: [row[6], row[0]])
+
+
+def search(db, conn, params):
+    # Apartments matching `q` as the GUI's search box does, in index order
+    limit = page_size(params)
+    ids = db.search(params.get("q", ""), SEARCH_LIMIT, conn)
+    if ids is None:
+        raise ApiError(400, "q must be at least 3 characters")
+    offset = decode_cursor(params["after"]) if "after" in params else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise ApiError(400, "Invalid cursor")
+    order = {apartment_id: i for i, apartment_id in enumerate(ids[offset:offset + limit])}
+    rows = sorted(db.apartments_by_ids(order, conn), key=lambda row: order[row[0]])
+    items = [apartment_json(building_id, (apartment_id, *values)) for apartment_id, building_id, *values in rows]
+    more = offset + limit < len(ids)
+    return {"items": items, "next": encode_cursor(offset + limit) if more else None}
+
+
+# (path segments, handler); a segment in braces is passed to the handler
+ROUTES = [
+    (("buildings",), list_buildings),
+    (("buildings", "{id}"), get_building),
+    (("buildings", "{id}", "apartments"), list_apartments),
+    (("apartments", "{id}"), get_apartment),
+    (("leases", "expiring"), list_expiring),
+    (("search",), search),
+]
+
+
+def route(path):
+    segments = tuple(segment for segment in path.split("/") if segment)
+    for pattern, handler in ROUTES:
+        if len(pattern) == len(segments) and all(p == s or p.startswith("{") for p, s in zip(pattern, segments)):
+            return handler, [s for p, s in zip(pattern, segments) if p.startswith("{")]
+    raise ApiError(404, "Not found")
+
+
+def etag_matches(header, etag):
+    if header is None:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or "W/" + etag in tags
+
+
+class ApiServer:
+    # Read-only JSON over HTTP/1.1 for other tools on this machine, built
+    # on the same Database queries as the GUI. Connections are served by
+    # one asyncio loop; queries run on a thread pool the size of the
+    # database's reader pool.
+    #
+    # Responses carry an ETag made of PRAGMA data_version and the request,
+    # so a client revalidating with If-None-Match gets a 304 without a
+    # query being run while nothing has committed, and a repeat of a recent
+    # request is answered from the response cache. Identical requests
+    # arriving together share a single query.
+
+    def __init__(self, db, host=DEFAULT_HOST, port=DEFAULT_PORT, cache_size=RESPONSE_CACHE_SIZE):
+        self.db = db
+        self.host = host
+        self.port = port
+        self.cache_size = cache_size
+        # Tags from an earlier run of the server never match
+        self.instance = os.urandom(4).hex()
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._connections = set()
+        self._server = None
+        self._executor = None
+        self._version_conn = None
+        self._loop = None
+        self._thread = None
+
+    def data_version(self):
+        # Moves whenever any other connection commits, the GUI's included;
+        # checking it costs no I/O
+        return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    async def start(self):
+        self._version_conn = self.db.connect(read_only=True)
+        self._executor = ThreadPoolExecutor(self.db.read_pool_size, thread_name_prefix="api")
+        self._server = await asyncio.start_server(self.handle_connection, self.host, self.port, backlog=BACKLOG)
+        # The port actually bound, when 0 was asked for
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self._server.close()
+        for writer in list(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+        self._executor.shutdown()
+        self._version_conn.close()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    def start_in_thread(self):
+        # Serves from a thread of its own until stop(), for use inside the GUI
+        started = threading.Event()
+        failure = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self.start())
+            except Exception as e:
+                failure.append(e)
+                self._loop.close()
+                return
+            finally:
+                started.set()
+            try:
+                self._loop.run_forever()
+                self._loop.run_until_complete(self.close())
+            finally:
+                self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="api", daemon=True)
+        self._thread.start()
+        started.wait()
+        if failure:
+            raise failure[0]
+
+    def stop(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    async def handle_connection(self, reader, writer):
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                keep_alive = await self.handle_request(request_line, reader, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def handle_request(self, request_line, reader, writer):
+        # Returns whether the connection stays open for another request
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) == MAX_HEADERS:
+                self.write(writer, 400, {}, b"", "HTTP/1.1")
+                return False
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "content-length" in headers:
+            await reader.readexactly(int(headers["content-length"]))
+
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            self.write(writer, 400, {}, b"", "HTTP/1.1")
+            return False
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+        if method not in ("GET", "HEAD"):
+            status, response_headers, body = 405, {"Allow": "GET, HEAD"}, error_body("Only GET and HEAD are served")
+        else:
+            status, response_headers, body = await self.respond(target, headers.get("if-none-match"))
+        response_headers["Connection"] = "keep-alive" if keep_alive else "close"
+        self.write(writer, status, response_headers, b"" if method == "HEAD" else body, version,
+                   content_length=len(body))
+        return keep_alive
+
+    def write(self, writer, status, headers, body, version, content_length=None):
+        lines = [f"{version if version in ('HTTP/1.0', 'HTTP/1.1') else 'HTTP/1.1'} {status} {REASONS[status]}"]
+        if status != 304:
+            lines.append("Content-Type: application/json; charset=utf-8")
+            lines.append(f"Content-Length: {len(body) if content_length is None else content_length}")
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def respond(self, target, if_none_match):
+        # (status, headers, body) for a GET of `target`
+        url = urlsplit(target)
+        try:
+            handler, arguments = route(url.path)
+            params = dict(parse_qsl(url.query))
+        except ApiError as e:
+            return e.status, {}, error_body(str(e))
+
+        # Read before the query runs: a commit landing in between makes the
+        # response newer than its tag, which only costs the client a re-fetch.
+        # Today's date is part of the key, as it is what an omitted `from`
+        # means, so a tag from yesterday never matches.
+        key = (url.path, tuple(sorted(params.items())), date.today().isoformat())
+        digest = hashlib.blake2s(repr(key).encode(), digest_size=6).hexdigest()
+        etag = f'"{self.instance}-{self.data_version()}-{digest}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, etag):
+            return 304, headers, b""
+
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == etag:
+            self._cache.move_to_end(key)
+            return 200, headers, cached[1]
+
+        pending = self._pending.get(etag)
+        if pending is None:
+            pending = self._pending[etag] = asyncio.get_running_loop().run_in_executor(
+                self._executor, self.query, handler, params, arguments)
+            pending.add_done_callback(lambda future: self._pending.pop(etag, None))
+        try:
+            body = await asyncio.shield(pending)
+        except ApiError as e:
+            return e.status, {}, error_body(str(e))
+        except Exception as e:
+            return 500, {}, error_body(str(e))
+
+        self._cache[key] = (etag, body)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return 200, headers, body
+
+    @timed("api.query")
+    def query(self, handler, params, arguments):
+        with self.db.reader() as conn:
+            document = handler(self.db, conn, params, *arguments)
+        return json.dumps(document, separators=(",", ":")).encode("utf-8")
+
+
+def error_body(message):
+    return json.dumps({"error": message}).encode("utf-8")
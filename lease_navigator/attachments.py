@@ -0,0 +1,118 @@
+import base64
+import mmap
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+MIME = "mime"
+BASE64 = "base64"
+
+
+def encode_file(path, line_length):
+    # Maps the file instead of reading it into a bytes object; base64 works
+    # directly on the mapped buffer
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return base64.encodebytes(data) if line_length else base64.b64encode(data)
+
+
+class AttachmentStore:
+    # Encodes each attachment once and hands the same encoded form to every
+    # message that needs it. Entries are keyed by path, mtime and size so an
+    # edited file is picked up, and the least recently used ones are evicted
+    # once the cache holds more than max_bytes of encoded data.
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_read = 0
+
+    def mime_part(self, path):
+        # A ready-made MIME part; it is shared between messages, so treat it as read-only
+        return self._get(path, MIME)
+
+    def base64(self, path):
+        # Base64 text without line breaks, as the SendGrid API expects
+        return self._get(path, BASE64)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes_read": self.bytes_read,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def _get(self, path, kind):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, kind)
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                loading = self._loading.get(key)
+                if loading is None:
+                    # This thread encodes the file; others asking for it wait
+                    loading = self._loading[key] = threading.Event()
+                    self.misses += 1
+                    break
+            loading.wait()
+
+        try:
+            value, size = self._load(path, kind)
+            with self._lock:
+                self.bytes_read += stat.st_size
+                self._store(key, value, size)
+            return value
+        finally:
+            with self._lock:
+                del self._loading[key]
+            loading.set()
+
+    def _load(self, path, kind):
+        if kind == BASE64:
+            encoded = encode_file(path, line_length=False).decode("ascii")
+            return encoded, len(encoded)
+
+        from email.mime.base import MIMEBase
+
+        encoded = encode_file(path, line_length=True)
+        part = MIMEBase("application", "octet-stream")
+        part.set_payload(encoded.decode("ascii"))
+        part["Content-Transfer-Encoding"] = "base64"
+        part.add_header("Content-Disposition", "attachment", filename=os.path.basename(path))
+        return part, len(encoded)
+
+    def _store(self, key, value, size):
+        # Anything larger than the whole budget is handed out but not kept
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
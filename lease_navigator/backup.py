@@ -0,0 +1,282 @@
+import gzip
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from .campaign import RateLimiter
+from .database import Database
+from .telemetry import timed
+
+FULL = "full"
+INCREMENTAL = "incremental"
+
+# Pages copied per step of the online backup; the source is only locked
+# for the length of one step
+PAGES_PER_STEP = 256
+# Disk reads and writes of a snapshot are paced to this many bytes a second
+MAX_BYTES_PER_SECOND = 32 * 1024 * 1024
+# Compressed files are written this much at a time
+COPY_CHUNK_SIZE = 1024 * 1024
+# Level 1 compresses about five times faster than the default, for files
+# under a tenth larger
+COMPRESS_LEVEL = 1
+# A full snapshot is taken once the last one is this old; in between only
+# the rows changed since the previous snapshot are saved
+FULL_SNAPSHOT_AGE = timedelta(days=1)
+# More changed rows than this and a full snapshot is taken instead
+INCREMENTAL_LIMIT = 50_000
+# Retention: the newest KEEP_RECENT full snapshots, plus the newest one of
+# each of the last KEEP_DAILY days; increments go with their full snapshot
+KEEP_RECENT = 7
+KEEP_DAILY = 30
+
+STAMP_FORMAT = "%Y%m%d-%H%M%S-%f"
+# full-<stamp>-<seq>.db.gz and incremental-<stamp>-<from seq>-<to seq>.json.gz
+SNAPSHOT_NAME = re.compile(r"^(full|incremental)-(\d{8}-\d{6}-\d{6})-(\d+)(?:-(\d+))?\.(db|json)\.gz$")
+
+# taken is a datetime; a full snapshot covers the change_log up to seq, an
+# incremental one the changes after base_seq up to seq
+Snapshot = namedtuple("Snapshot", "path kind taken base_seq seq size")
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackupCancelled(BackupError):
+    pass
+
+
+def parse_snapshot(directory, name):
+    match = SNAPSHOT_NAME.match(name)
+    if match is None:
+        return None
+    kind, stamp, first, second, _ = match.groups()
+    path = os.path.join(directory, name)
+    if kind == FULL:
+        base_seq, seq = None, int(first)
+    else:
+        base_seq, seq = int(first), int(second)
+    return Snapshot(path, kind, datetime.strptime(stamp, STAMP_FORMAT), base_seq, seq, os.path.getsize(path))
+
+
+class BackupManager:
+    # Point-in-time snapshots of a live database into `directory`, each
+    # gzip-compressed and written under a temporary name, then renamed, so a
+    # crash never leaves a partial snapshot behind.
+    #
+    # A full snapshot copies the file with SQLite's online backup API a few
+    # pages per step, through a connection of its own held in one read
+    # transaction: the copy is the database as of its start, and writes
+    # made meanwhile neither wait for it nor restart it. The app's own
+    # connection is never used here, so snapshots can run on any thread.
+    # Between full snapshots an incremental one saves just the rows that
+    # change_log lists as written since the previous snapshot. All file I/O
+    # is paced to max_bytes_per_second, and a snapshot can be cancelled from
+    # another thread.
+
+    def __init__(self, db, directory, max_bytes_per_second=MAX_BYTES_PER_SECOND, pages_per_step=PAGES_PER_STEP,
+                 keep_recent=KEEP_RECENT, keep_daily=KEEP_DAILY, clock=datetime.now):
+        self.db = db
+        self.directory = directory
+        self.max_bytes_per_second = max_bytes_per_second
+        self.pages_per_step = pages_per_step
+        self.keep_recent = keep_recent
+        self.keep_daily = keep_daily
+        self.clock = clock
+        self._cancelled = threading.Event()
+        # One snapshot or restore at a time
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def snapshots(self):
+        # Oldest first
+        if not os.path.isdir(self.directory):
+            return []
+        snapshots = (parse_snapshot(self.directory, name) for name in os.listdir(self.directory))
+        return sorted((snapshot for snapshot in snapshots if snapshot is not None), key=lambda s: s.taken)
+
+    def back_up(self, progress=None, full=False):
+        # Takes whichever snapshot is due: full when asked for, when there
+        # is none recent enough or when the log can't say what changed;
+        # otherwise incremental. None when nothing changed since the last one.
+        with self._lock:
+            self._cancelled.clear()
+            os.makedirs(self.directory, exist_ok=True)
+            snapshots = self.snapshots()
+            fulls = [snapshot for snapshot in snapshots if snapshot.kind == FULL]
+            if full or not fulls or self.clock() - fulls[-1].taken >= FULL_SNAPSHOT_AGE:
+                snapshot = self._full(progress)
+            else:
+                with self.db.reader() as conn:
+                    # One read transaction, so the rows match the log position
+                    conn.execute("BEGIN")
+                    try:
+                        last = snapshots[-1]
+                        changes = self.db.changes_since(last.seq, INCREMENTAL_LIMIT + 1, conn)
+                        if changes is not None and len(changes) <= INCREMENTAL_LIMIT:
+                            if not changes:
+                                return None
+                            return self._incremental(last.seq, changes, conn)
+                    finally:
+                        conn.execute("COMMIT")
+                snapshot = self._full(progress)
+            self.rotate()
+            return snapshot
+
+    def _pace(self):
+        return RateLimiter(self.max_bytes_per_second, COPY_CHUNK_SIZE) if self.max_bytes_per_second else None
+
+    def _check_cancelled(self):
+        if self._cancelled.is_set():
+            raise BackupCancelled("Backup cancelled")
+
+    @timed("backup.full")
+    def _full(self, progress):
+        limiter = self._pace()
+        stamp = self.clock().strftime(STAMP_FORMAT)
+        fd, copy_path = tempfile.mkstemp(".db", "snapshot-", self.directory)
+        os.close(fd)
+        compressed_path = None
+        try:
+            def step(status, remaining, total):
+                self._check_cancelled()
+                if limiter is not None:
+                    limiter.acquire(self.pages_per_step * page_size)
+                if progress is not None:
+                    progress(total - remaining, total)
+
+            conn = self.db.connect(read_only=True)
+            copy = sqlite3.connect(copy_path)
+            try:
+                # One read transaction across all the steps, so writes made
+                # in between are left out rather than starting the copy over
+                conn.execute("BEGIN")
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                conn.execute("SELECT 1 FROM sqlite_master").fetchall()
+                conn.backup(copy, pages=self.pages_per_step, progress=step)
+                conn.execute("COMMIT")
+                seq = self.db.last_change(copy)
+            finally:
+                copy.close()
+                conn.close()
+
+            compressed_path = copy_path + ".gz"
+            with open(copy_path, "rb") as source, gzip.open(compressed_path, "wb", COMPRESS_LEVEL) as target:
+                while True:
+                    self._check_cancelled()
+                    chunk = source.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if limiter is not None:
+                        limiter.acquire(len(chunk))
+                    target.write(chunk)
+            path = os.path.join(self.directory, f"{FULL}-{stamp}-{seq}.db.gz")
+            os.replace(compressed_path, path)
+            compressed_path = None
+        finally:
+            os.remove(copy_path)
+            if compressed_path is not None and os.path.exists(compressed_path):
+                os.remove(compressed_path)
+        return parse_snapshot(self.directory, os.path.basename(path))
+
+    @timed("backup.incremental")
+    def _incremental(self, base_seq, changes, conn):
+        building_ids = {row_id for _, kind, row_id in changes if kind == "building"}
+        apartment_ids = {row_id for _, kind, row_id in changes if kind == "apartment"}
+        buildings = self.db.building_rows(building_ids, conn)
+        apartments = self.db.apartment_rows(apartment_ids, conn)
+        # Ids that were written but are no longer there were deleted
+        content = {
+            "buildings": buildings,
+            "apartments": apartments,
+            "deleted_buildings": sorted(building_ids - {row[0] for row in buildings}),
+            "deleted_apartments": sorted(apartment_ids - {row[0] for row in apartments}),
+        }
+        seq = changes[-1][0]
+        name = f"{INCREMENTAL}-{self.clock().strftime(STAMP_FORMAT)}-{base_seq}-{seq}.json.gz"
+        partial = os.path.join(self.directory, name + ".part")
+        with gzip.open(partial, "wt", COMPRESS_LEVEL, encoding="utf-8") as f:
+            json.dump(content, f)
+        os.replace(partial, os.path.join(self.directory, name))
+        return parse_snapshot(self.directory, name)
+
+    def chain(self, snapshot):
+        # The full snapshot at or before `snapshot` and the increments after
+        # it up to `snapshot`, each continuing where the previous one ended
+        snapshots = [s for s in self.snapshots() if s.taken <= snapshot.taken]
+        fulls = [i for i, s in enumerate(snapshots) if s.kind == FULL]
+        if not fulls:
+            raise BackupError("No full snapshot precedes this point")
+        chain = snapshots[fulls[-1]:]
+        for previous, current in zip(chain, chain[1:]):
+            if current.base_seq != previous.seq:
+                raise BackupError(f"Snapshots between {previous.taken} and {current.taken} are missing")
+        return chain
+
+    def rotate(self):
+        # Drops full snapshots outside retention, each with the increments
+        # taken after it and before the next full one
+        snapshots = self.snapshots()
+        fulls = [snapshot for snapshot in snapshots if snapshot.kind == FULL]
+        keep = set(fulls[-self.keep_recent:]) if self.keep_recent else set()
+        newest_per_day = {}
+        for snapshot in fulls:
+            newest_per_day[snapshot.taken.date()] = snapshot
+        for day in sorted(newest_per_day, reverse=True)[:self.keep_daily]:
+            keep.add(newest_per_day[day])
+
+        removing = False
+        for snapshot in snapshots:
+            if snapshot.kind == FULL:
+                removing = snapshot not in keep
+            if removing:
+                os.remove(snapshot.path)
+
+    @timed("backup.restore")
+    def restore(self, snapshot, progress=None):
+        # Rebuilds the database as of `snapshot` in a scratch file, then
+        # copies it over the live one with the backup API, a few pages per
+        # step. That goes through a connection of its own, whose write lock
+        # keeps every other connection, the app's included, from writing
+        # until it is done; the caller stops its own reads and writes
+        # meanwhile. Other copies of the app see the change and reload.
+        with self._lock:
+            self._cancelled.clear()
+            chain = self.chain(snapshot)
+            conn = self.db.connect()
+            scratch_directory = tempfile.mkdtemp(prefix="restore-", dir=self.directory)
+            try:
+                after = self.db.last_change(conn)
+                scratch_path = os.path.join(scratch_directory, "restore.db")
+                with gzip.open(chain[0].path, "rb") as source, open(scratch_path, "wb") as target:
+                    shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+                scratch = Database(scratch_path)
+                try:
+                    scratch.migrate()
+                    for increment in chain[1:]:
+                        self._check_cancelled()
+                        with gzip.open(increment.path, "rt", encoding="utf-8") as f:
+                            content = json.load(f)
+                        scratch.apply_rows(content["buildings"], content["apartments"],
+                                           content["deleted_buildings"], content["deleted_apartments"])
+
+                    def step(status, remaining, total):
+                        if progress is not None:
+                            progress(total - remaining, total)
+
+                    scratch.conn.backup(conn, pages=self.pages_per_step, progress=step)
+                finally:
+                    scratch.close()
+                self.db.mark_reset(after, conn)
+            finally:
+                conn.close()
+                shutil.rmtree(scratch_directory, ignore_errors=True)
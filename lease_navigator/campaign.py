@@ -0,0 +1,176 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from .mail import Message
+from .telemetry import span, timed
+from .templates import compile_template
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+CANCELLED = "cancelled"
+SKIPPED = "skipped"
+NO_EMAIL = "no email"
+
+
+class Recipient:
+    __slots__ = ("apartment_id", "building", "apartment", "tenant", "email", "lease_start", "lease_end",
+                 "status", "attempts", "error")
+
+    def __init__(self, apartment_id, building, apartment, tenant, email, lease_start, lease_end):
+        # Empty strings rather than None, so templates render them as blanks
+        self.apartment_id = apartment_id
+        self.building = building or ""
+        self.apartment = apartment or ""
+        self.tenant = tenant or ""
+        self.email = email or ""
+        self.lease_start = lease_start or ""
+        self.lease_end = lease_end or ""
+        self.status = PENDING
+        self.attempts = 0
+        self.error = None
+
+
+def select_recipients(db, within_days, today=None):
+    # Tenants whose lease ends in the next `within_days` days, read through
+    # a pooled connection so this can run off the GUI thread. Tenants with
+    # no email are included; Campaign.run marks them NO_EMAIL
+    today = today or date.today()
+    end = today + timedelta(days=within_days)
+    with db.reader() as conn:
+        rows = db.leases_expiring(today.isoformat(), end.isoformat(), conn=conn)
+    return [Recipient(*row) for row in rows]
+
+
+class RateLimiter:
+    # Token bucket shared by all workers; rate is messages per second
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, count=1):
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Taking the tokens up front reserves this caller's slot, so
+            # concurrent callers queue up behind each other
+            wait = max(0.0, (count - self._tokens) / self.rate)
+            self._tokens -= count
+        if wait:
+            self.sleep(wait)
+
+
+class Campaign:
+    # Sends one rendered reminder per recipient through `transport` using a
+    # pool of worker threads. Transports that batch get up to batch_size
+    # messages per call. Failed sends are retried with exponential backoff;
+    # each Recipient records its own status, attempts and error. Recipients
+    # with no email, or missing a value the template needs, are skipped
+    # before sending starts.
+    # run() can be given a personal letter per recipient, attached after
+    # the shared attachments.
+
+    def __init__(self, transport, subject, template, attachments=(), workers=8, rate=None, burst=1,
+                 retries=3, backoff=1.0, sleep=time.sleep):
+        self.transport = transport
+        self.subject = subject
+        self.template = compile_template(template)
+        self.template.check()
+        self.today = date.today()
+        self.attachments = list(attachments)
+        self.workers = workers
+        self.limiter = RateLimiter(rate, burst, sleep=sleep) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def message_for(self, recipient, letters=None):
+        attachments = self.attachments
+        letter = letters.get(recipient.apartment_id) if letters else None
+        if letter is not None:
+            attachments = attachments + [letter]
+        return Message(recipient.email, self.subject, self.template.render(recipient, self.today), attachments)
+
+    def send_group(self, recipients, letters=None):
+        messages = [self.message_for(recipient, letters) for recipient in recipients]
+
+        for attempt in range(self.retries + 1):
+            if self._cancelled.is_set():
+                return set_status(recipients, CANCELLED)
+            if self.limiter is not None:
+                self.limiter.acquire(len(messages))
+
+            for recipient in recipients:
+                recipient.attempts += 1
+            try:
+                with span("mail.send_batch"):
+                    self.transport.send_batch(messages)
+            except Exception as e:
+                set_status(recipients, PENDING, str(e))
+                if attempt < self.retries:
+                    self.sleep(self.backoff * 2 ** attempt)
+            else:
+                return set_status(recipients, SENT)
+
+        return set_status(recipients, FAILED, recipients[0].error)
+
+    @timed("mail.campaign")
+    def run(self, recipients, progress=None, letters=None):
+        # Blocks until every recipient has been handled; progress(done, total)
+        # is called from the calling thread as sends complete. letters maps
+        # apartment ids to a file attached for that recipient only.
+        total = len(recipients)
+        sendable = []
+        for recipient in recipients:
+            missing = self.template.missing(recipient)
+            if not recipient.email:
+                recipient.status = NO_EMAIL
+                recipient.error = "No email"
+            elif missing:
+                recipient.status = SKIPPED
+                recipient.error = "Missing " + ", ".join(missing)
+            else:
+                sendable.append(recipient)
+
+        size = max(1, self.transport.batch_size)
+        if letters and not self.transport.mixed_attachments:
+            # Each message would be a call of its own inside its batch, one
+            # after another on one worker; sent singly, they spread over all
+            size = 1
+        groups = [sendable[start:start + size] for start in range(0, len(sendable), size)]
+
+        done = total - len(sendable)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self.send_group, group, letters) for group in groups]
+            for future in as_completed(futures):
+                done += len(future.result())
+                if progress is not None:
+                    progress(done, total)
+        return recipients
+
+
+def set_status(recipients, status, error=None):
+    for recipient in recipients:
+        recipient.status = status
+        recipient.error = error
+    return recipients
+
+
+def summarize(recipients):
+    counts = {PENDING: 0, SENT: 0, FAILED: 0, CANCELLED: 0, SKIPPED: 0, NO_EMAIL: 0}
+    for recipient in recipients:
+        counts[recipient.status] += 1
+    return counts
@@ -0,0 +1,92 @@
+import io
+import threading
+from datetime import date
+
+# Buildings beyond this many are folded into a single "Other" bar
+MAX_BUILDING_BARS = 30
+EXPIRY_MONTHS = 24
+
+
+def month_range(start, months):
+    # The first day of `start`'s month and of the month `months` later
+    first = start.replace(day=1)
+    year, month = divmod(first.month - 1 + months, 12)
+    return first, date(first.year + year, month + 1, 1)
+
+
+def chart_data(db, today=None):
+    # Everything the chart shows comes from two GROUP BY queries
+    start, end = month_range(today or date.today(), EXPIRY_MONTHS)
+    with db.reader() as conn:
+        counts = db.apartment_counts(conn)
+        expiries = db.expiries_by_month(start.isoformat(), end.isoformat(), conn)
+
+    if len(counts) > MAX_BUILDING_BARS:
+        counts = sorted(counts, key=lambda row: row[1], reverse=True)
+        other = sum(count for _, count in counts[MAX_BUILDING_BARS - 1:])
+        counts = counts[:MAX_BUILDING_BARS - 1] + [("Other", other)]
+
+    # Every month in the window gets a bar, including months with no expiries
+    by_month = dict(expiries)
+    months = []
+    year, month = start.year, start.month
+    for _ in range(EXPIRY_MONTHS):
+        key = f"{year:04d}-{month:02d}"
+        months.append((key, by_month.get(key, 0)))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    return counts, months
+
+
+def render_portfolio_chart(db, today=None):
+    # Uses the Figure/Agg API directly rather than pyplot, so it is safe to
+    # call off the GUI thread, and matplotlib is only imported on first use
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import MaxNLocator
+
+    counts, months = chart_data(db, today)
+
+    figure = Figure(figsize=(12, 9))
+    FigureCanvasAgg(figure)
+    buildings_axes, expiry_axes = figure.subplots(2, 1)
+
+    buildings_axes.bar([name or "" for name, _ in counts], [count for _, count in counts], color="#1f707f")
+    buildings_axes.set_xlabel("Building")
+    buildings_axes.set_ylabel("Number of Apartments")
+    buildings_axes.set_title("Apartment Distribution by Building")
+    buildings_axes.tick_params(axis="x", labelrotation=45)
+
+    expiry_axes.bar([month for month, _ in months], [count for _, count in months], color="#c62828")
+    expiry_axes.set_xlabel("Month")
+    expiry_axes.set_ylabel("Leases Ending")
+    expiry_axes.set_title("Lease Expiries by Month")
+    expiry_axes.tick_params(axis="x", labelrotation=45)
+
+    for axes in (buildings_axes, expiry_axes):
+        axes.yaxis.set_major_locator(MaxNLocator(integer=True))
+
+    figure.tight_layout()
+    output = io.BytesIO()
+    figure.savefig(output, format="png")
+    return output.getvalue()
+
+
+class ChartCache:
+    # Holds the last rendered chart together with the version it was
+    # rendered from, the data version and the month it starts at; a lookup
+    # with the same version returns it unchanged
+
+    def __init__(self):
+        self._version = None
+        self._png = None
+        self._lock = threading.Lock()
+
+    def get(self, version):
+        with self._lock:
+            return self._png if version == self._version else None
+
+    def put(self, version, png):
+        with self._lock:
+            self._version = version
+            self._png = png
@@ -0,0 +1,210 @@
+import argparse
+import os
+import re
+import sys
+from datetime import date
+
+from .database import Database
+
+# Every command imports what it needs itself, so `stats` never loads the
+# mail, template or export code and nothing here pulls in PyQt5,
+# sendgrid or matplotlib
+
+DURATION = re.compile(r"^\s*(\d+)\s*([dw]?)\s*$")
+STATS_HORIZONS = (30, 60, 90)
+
+
+def parse_days(text):
+    # "60", "60d" or "8w"
+    match = DURATION.match(text)
+    if not match:
+        raise argparse.ArgumentTypeError(f"expected a number of days such as 60d or 8w, got {text!r}")
+    count, unit = match.groups()
+    return int(count) * (7 if unit == "w" else 1)
+
+
+def print_progress(done, total):
+    sys.stderr.write(f"\r{done}/{total}" if total else f"\r{done}")
+    sys.stderr.flush()
+
+
+def cmd_import(db, args):
+    from .importer import LeaseRollError, import_lease_roll
+
+    try:
+        result = import_lease_roll(db, args.file, args.rejects, None if args.quiet else print_progress)
+    except LeaseRollError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if not args.quiet:
+        sys.stderr.write("\n")
+    print(f"Imported {result.imported} apartments ({result.buildings} new buildings) from {args.file}")
+    if result.rejected:
+        print(f"Rejected {result.rejected} rows; see {result.rejects_path}")
+    return 1 if result.rejected else 0
+
+
+def cmd_export(db, args):
+    from .export import export_lease_roll
+
+    count = export_lease_roll(db, args.path, None if args.quiet else print_progress)
+    if not args.quiet:
+        sys.stderr.write("\n")
+    print(f"Exported {count} leases to {args.path}")
+    return 0
+
+
+def cmd_remind(db, args):
+    from .campaign import FAILED, NO_EMAIL, SENT, SKIPPED, Campaign, select_recipients, summarize
+    from .mail import MemorySink, make_transport
+    from .templates import DEFAULT_TEMPLATE, TemplateError
+
+    template = DEFAULT_TEMPLATE
+    if args.template:
+        with open(args.template, encoding="utf-8") as f:
+            template = f.read()
+
+    recipients = select_recipients(db, args.expiring_within)
+    letters = None
+    if args.letter:
+        from .letters import DEFAULT_LETTER_TEMPLATE, LetterWriter
+
+        letter_template = DEFAULT_LETTER_TEMPLATE
+        if args.letter_template:
+            with open(args.letter_template, encoding="utf-8") as f:
+                letter_template = f.read()
+        try:
+            writer = LetterWriter(letter_template, args.letters_dir, args.letter)
+        except TemplateError as e:
+            print(e, file=sys.stderr)
+            return 2
+        # No letter is written for a tenant it couldn't be emailed to
+        letters = writer.run([r for r in recipients if r.email], None if args.quiet else print_progress)
+        if recipients and not args.quiet:
+            sys.stderr.write("\n")
+
+    if args.dry_run:
+        transport = MemorySink()
+    else:
+        api_key = args.api_key or os.environ.get("SENDGRID_API_KEY")
+        if args.transport != "file" and not api_key:
+            print("An API key is required; pass --api-key or set SENDGRID_API_KEY", file=sys.stderr)
+            return 2
+        transport = make_transport(args.transport, args.sender, api_key, args.outbox)
+
+    try:
+        campaign = Campaign(transport, args.subject, template, args.attach, rate=args.rate)
+    except TemplateError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    try:
+        campaign.run(recipients, None if args.quiet else print_progress, letters)
+    finally:
+        transport.close()
+    if recipients and not args.quiet:
+        sys.stderr.write("\n")
+
+    counts = summarize(recipients)
+    for recipient in recipients:
+        if recipient.status in (FAILED, SKIPPED, NO_EMAIL):
+            print(f"{recipient.status}\t{recipient.email or '-'}\t{recipient.building}\t{recipient.apartment}\t"
+                  f"{recipient.error}", file=sys.stderr)
+    verb = "Would send" if args.dry_run else "Sent"
+    print(f"{verb} {counts[SENT]} reminders, {counts[FAILED]} failed, {counts[SKIPPED]} skipped, "
+          f"{counts[NO_EMAIL]} skipped (no email) ({len(recipients)} leases ending within {args.expiring_within} days)")
+    return 1 if counts[FAILED] else 0
+
+
+def cmd_stats(db, args):
+    today = date.today().isoformat()
+    buildings, apartments, expired, *expiring = db.lease_stats(today, STATS_HORIZONS)
+    print(f"Buildings:\t{buildings}")
+    print(f"Apartments:\t{apartments}")
+    print(f"Expired leases:\t{expired}")
+    for days, count in zip(STATS_HORIZONS, expiring):
+        print(f"Ending in {days} days:\t{count}")
+    return 0
+
+
+def cmd_serve(db, args):
+    import asyncio
+
+    from .api import ApiServer
+
+    server = ApiServer(db, args.host, args.port)
+    if not args.quiet:
+        print(f"Serving {args.db} on http://{args.host}:{args.port}/ (Ctrl+C to stop)", file=sys.stderr)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="lease_navigator", description="Lease Navigator without the GUI")
+    parser.add_argument("--db", default="property_manager.db", help="database file (default: %(default)s)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no progress output")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    command = commands.add_parser("import", help="add apartments from a lease roll .csv or .xlsx")
+    command.add_argument("file")
+    command.add_argument("--rejects", help="where to write rows that fail validation "
+                                           "(default: next to the file, as NAME.rejects.csv)")
+    command.set_defaults(run=cmd_import)
+
+    command = commands.add_parser("export", help="write the lease roll to .xlsx or .csv")
+    command.add_argument("path")
+    command.set_defaults(run=cmd_export)
+
+    command = commands.add_parser("remind", help="email tenants whose lease is ending")
+    command.add_argument("--expiring-within", type=parse_days, default=60, metavar="DAYS",
+                         help="e.g. 60d or 8w (default: 60 days)")
+    command.add_argument("--template", help="file with the message template")
+    command.add_argument("--subject", default=None)
+    command.add_argument("--transport", choices=["sendgrid", "smtp", "file"], default="sendgrid")
+    command.add_argument("--sender", help="From address")
+    command.add_argument("--api-key", help="SendGrid API key (default: $SENDGRID_API_KEY)")
+    command.add_argument("--outbox", default="outbox", help="folder for --transport file (default: %(default)s)")
+    command.add_argument("--attach", action="append", default=[], metavar="FILE")
+    command.add_argument("--rate", type=float, default=20, help="messages per second (default: %(default)s)")
+    command.add_argument("--letter", choices=["pdf", "html"], help="attach a personalized renewal letter")
+    command.add_argument("--letter-template", metavar="FILE", help="file with the letter template")
+    command.add_argument("--letters-dir", default="letters",
+                         help="folder the letters are written to (default: %(default)s)")
+    command.add_argument("--dry-run", action="store_true", help="render every reminder without sending")
+    command.set_defaults(run=cmd_remind)
+
+    command = commands.add_parser("stats", help="portfolio and lease expiry counts")
+    command.set_defaults(run=cmd_stats)
+
+    command = commands.add_parser("serve", help="read-only JSON API over HTTP for other local tools")
+    command.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    command.add_argument("--port", type=int, default=8765, help="default: %(default)s")
+    command.add_argument("--readers", type=int, default=8,
+                         help="queries run at once on pooled connections (default: %(default)s)")
+    command.set_defaults(run=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "remind":
+        if args.subject is None:
+            from .templates import DEFAULT_SUBJECT
+            args.subject = DEFAULT_SUBJECT
+        if not args.dry_run and not args.sender:
+            build_parser().error("remind needs --sender unless --dry-run is given")
+
+    if args.command != "import" and not os.path.exists(args.db):
+        print(f"No database at {args.db}", file=sys.stderr)
+        return 2
+
+    db = Database(args.db, args.readers) if args.command == "serve" else Database(args.db)
+    try:
+        db.migrate()
+        return args.run(db, args)
+    finally:
+        db.close()
@@ -0,0 +1,485 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from .migrations import migrate
+from .sorting import natural_key
+from .telemetry import timed
+
+# Connection tuning applied to every connection the app opens
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",      # 64 MB page cache
+    "PRAGMA mmap_size=268435456",    # 256 MB memory map
+)
+
+# Statements are compiled once per connection and reused from this cache
+STATEMENT_CACHE_SIZE = 256
+
+# Keyset paging position before the first row: (sort_key, id)
+FIRST_KEY = ("", 0)
+
+# Ids bound per "IN (...)" query, well under SQLite's variable limit
+SQL_VARIABLE_CHUNK = 500
+
+# The trigram index can't look up anything shorter than this
+SEARCH_MIN_LENGTH = 3
+
+# change_log entries kept when it is pruned; a peer that falls further
+# behind than this reloads instead of applying deltas
+CHANGE_LOG_KEEP = 100000
+
+# Every stored column, id first, as copied by incremental backups
+BUILDING_COLUMNS = ("id", "name", "sort_key", "version")
+APARTMENT_COLUMNS = ("id", "building_id", "name", "tenant", "email", "lease_start", "lease_end", "sort_key",
+                     "version")
+
+# Lease dates as day numbers counted from 1970-01-01 (Julian day 2440587.5).
+# Apartments whose building is gone, left by databases upgraded with
+# foreign keys off, belong to no building and are left out.
+LEASE_DAYS = '''
+    SELECT id, building_id, julianday(lease_start) - 2440587.5, julianday(lease_end) - 2440587.5
+    FROM apartments
+    WHERE building_id IN (SELECT id FROM buildings)
+'''
+
+
+def search_expression(text):
+    # The whole query, with runs of spaces collapsed, is one case-insensitive
+    # substring to find in any column; None when it is too short to look up
+    text = " ".join(text.split())
+    if len(text) < SEARCH_MIN_LENGTH:
+        return None
+    return '"' + text.replace('"', '""') + '"'
+
+
+def chunked(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), SQL_VARIABLE_CHUNK):
+        chunk = ids[start:start + SQL_VARIABLE_CHUNK]
+        yield chunk, ", ".join("?" * len(chunk))
+
+
+def is_busy(error):
+    # True when another connection held the lock, so the same write can
+    # succeed later; anything else fails again however often it is retried
+    return error.sqlite_errorcode & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+class Database:
+    def __init__(self, path, read_pool_size=4):
+        self.path = path
+        self.read_pool_size = read_pool_size
+        self._readers = queue.LifoQueue()
+        # Every reader connection made, lent out or not; _pool_lock guards
+        # it, so no more than read_pool_size are ever opened
+        self._pool = []
+        self._pool_lock = threading.Lock()
+        self._trace = None
+        # Bumped on every write made through this object
+        self.writes = 0
+        self.conn = self.connect()
+
+    def connect(self, read_only=False):
+        conn = sqlite3.connect(self.path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        # Used by the write methods to fill in sort_key
+        conn.create_function("natural_key", 1, natural_key, deterministic=True)
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        if self._trace is not None:
+            conn.set_trace_callback(self._trace)
+        return conn
+
+    def trace(self, callback):
+        # Installs an SQLite trace callback on every connection, present and
+        # future; None removes it
+        self._trace = callback
+        for conn in [self.conn] + self._pool:
+            conn.set_trace_callback(callback)
+
+    @contextmanager
+    def reader(self):
+        # Borrow a pooled read-only connection for use off the GUI thread.
+        # WAL lets these run while the main connection is writing.
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                conn = None
+                if len(self._pool) < self.read_pool_size:
+                    conn = self.connect(read_only=True)
+                    self._pool.append(conn)
+            if conn is None:
+                conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def close(self):
+        # Readers still lent out are closed too
+        with self._pool_lock:
+            for conn in self._pool:
+                conn.close()
+            self._pool = []
+        self._readers = queue.LifoQueue()
+        self.conn.close()
+
+    def migrate(self):
+        return migrate(self.conn)
+
+    def data_version(self):
+        # Changes whenever the data may have changed: our own writes bump
+        # self.writes, and PRAGMA data_version moves when another connection
+        # or process commits
+        return self.writes, self.commit_version()
+
+    def commit_version(self):
+        # Moves only when another connection commits; checking it costs no I/O
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def last_change(self, conn=None):
+        # Sequence number of the newest change_log entry, even once pruned
+        row = (conn or self.conn).execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+        return row[0] if row else 0
+
+    @timed("db.changes_since")
+    def changes_since(self, seq, limit, conn=None):
+        # Up to `limit` (seq, kind, row_id) entries after `seq`, oldest
+        # first, or None when entries after `seq` have been pruned and the
+        # caller has to reload instead
+        conn = conn or self.conn
+        first = conn.execute("SELECT MIN(seq) FROM change_log").fetchone()[0]
+        if first is not None and first > seq + 1:
+            return None
+        return conn.execute("SELECT seq, kind, row_id FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?",
+                            (seq, limit)).fetchall()
+
+    def prune_change_log(self, keep=CHANGE_LOG_KEEP, conn=None):
+        conn = conn or self.conn
+        with conn:
+            conn.execute("DELETE FROM change_log WHERE seq <= (SELECT MAX(seq) FROM change_log) - ?", (keep,))
+
+    @timed("db.buildings_page")
+    def buildings_page(self, after, limit, conn=None):
+        # Keyset paging in natural name order: the next `limit` buildings
+        # after the (sort_key, id) position `after`, with unit counts.
+        # The last column is the row's own position.
+        return (conn or self.conn).execute('''
+            SELECT b.id, b.name, (SELECT COUNT(*) FROM apartments a WHERE a.building_id = b.id), b.sort_key
+            FROM buildings b
+            WHERE (b.sort_key, b.id) > (?, ?)
+            ORDER BY b.sort_key, b.id
+            LIMIT ?
+        ''', (*after, limit)).fetchall()
+
+    @timed("db.apartments_page")
+    def apartments_page(self, building_id, after, limit, conn=None):
+        return (conn or self.conn).execute('''
+            SELECT id, name, tenant, email, lease_start, lease_end, version, sort_key
+            FROM apartments
+            WHERE building_id = ? AND (sort_key, id) > (?, ?)
+            ORDER BY sort_key, id
+            LIMIT ?
+        ''', (building_id, *after, limit)).fetchall()
+
+    @timed("db.leases_expiring")
+    def leases_expiring(self, start, end, conn=None, after=FIRST_KEY, limit=-1):
+        # Range scan over idx_apartments_lease_end; start and end are ISO dates.
+        # Background threads pass a connection borrowed from reader(). Pages
+        # follow on from the (lease_end, id) position `after`.
+        return (conn or self.conn).execute('''
+            SELECT a.id, b.name, a.name, a.tenant, a.email, a.lease_start, a.lease_end
+            FROM apartments a
+            JOIN buildings b ON b.id = a.building_id
+            WHERE a.lease_end BETWEEN ? AND ? AND (a.lease_end, a.id) > (?, ?)
+            ORDER BY a.lease_end, a.id
+            LIMIT ?
+        ''', (start, end, *after, limit)).fetchall()
+
+    @timed("db.lease_ends")
+    def lease_ends(self, start, end, conn=None):
+        # (id, lease_end) for leases ending between start and end inclusive,
+        # read off idx_apartments_lease_end without touching the table
+        return (conn or self.conn).execute(
+            "SELECT id, lease_end FROM apartments WHERE lease_end BETWEEN ? AND ?", (start, end)).fetchall()
+
+    @timed("db.recipients")
+    def recipients(self, apartment_ids, conn=None):
+        # Same columns as leases_expiring, for specific apartments
+        conn = conn or self.conn
+        rows = []
+        for chunk, placeholders in chunked(apartment_ids):
+            rows += conn.execute(f'''
+                SELECT a.id, b.name, a.name, a.tenant, a.email, a.lease_start, a.lease_end
+                FROM apartments a
+                JOIN buildings b ON b.id = a.building_id
+                WHERE a.id IN ({placeholders})
+            ''', chunk).fetchall()
+        return rows
+
+    @timed("db.search")
+    def search(self, text, limit, conn=None):
+        # Ids of up to `limit` apartments matching the search box text,
+        # straight from the apartment_search index; None when the text is
+        # too short to search for
+        expression = search_expression(text)
+        if expression is None:
+            return None
+        return [apartment_id for apartment_id, in (conn or self.conn).execute(
+            "SELECT rowid FROM apartment_search WHERE apartment_search MATCH ? LIMIT ?", (expression, limit))]
+
+    @timed("db.buildings_by_ids")
+    def buildings_by_ids(self, building_ids, conn=None):
+        # (id, name, sort_key, apartment count) in natural order
+        conn = conn or self.conn
+        rows = []
+        for chunk, placeholders in chunked(building_ids):
+            rows += conn.execute(f'''
+                SELECT b.id, b.name, b.sort_key, (SELECT COUNT(*) FROM apartments a WHERE a.building_id = b.id)
+                FROM buildings b
+                WHERE b.id IN ({placeholders})
+            ''', chunk).fetchall()
+        rows.sort(key=lambda row: (row[2], row[0]))
+        return rows
+
+    @timed("db.apartments_by_ids")
+    def apartments_by_ids(self, apartment_ids, conn=None):
+        # apartments_page columns with building_id second, in natural order
+        conn = conn or self.conn
+        rows = []
+        for chunk, placeholders in chunked(apartment_ids):
+            rows += conn.execute(f'''
+                SELECT id, building_id, name, tenant, email, lease_start, lease_end, version, sort_key
+                FROM apartments
+                WHERE id IN ({placeholders})
+            ''', chunk).fetchall()
+        rows.sort(key=lambda row: (row[-1], row[0]))
+        return rows
+
+    def lease_days(self, conn=None):
+        # (id, building_id, lease start, lease end) for every apartment with
+        # a building, in table order, with the dates as days since 1970-01-01
+        # and NULL where a date doesn't parse; the cursor is returned for
+        # fetching in chunks
+        return (conn or self.conn).execute(LEASE_DAYS)
+
+    @timed("db.lease_days_by_ids")
+    def lease_days_by_ids(self, apartment_ids, conn=None):
+        conn = conn or self.conn
+        rows = []
+        for chunk, placeholders in chunked(apartment_ids):
+            rows += conn.execute(f"{LEASE_DAYS} AND id IN ({placeholders})", chunk).fetchall()
+        return rows
+
+    def building_names(self, conn=None):
+        # (id, name) for every building, by id
+        return (conn or self.conn).execute("SELECT id, name FROM buildings ORDER BY id").fetchall()
+
+    def count_apartments(self, conn=None):
+        return (conn or self.conn).execute("SELECT COUNT(*) FROM apartments").fetchone()[0]
+
+    def iter_lease_roll(self, conn=None):
+        # Returns the cursor itself so callers stream rows instead of
+        # materializing the whole portfolio; rows are grouped by building
+        return (conn or self.conn).execute('''
+            SELECT b.id, b.name, a.name, a.tenant, a.email, a.lease_start, a.lease_end
+            FROM apartments a
+            JOIN buildings b ON b.id = a.building_id
+            ORDER BY b.sort_key, b.id, a.sort_key, a.id
+        ''')
+
+    @timed("db.apartment_counts")
+    def apartment_counts(self, conn=None):
+        return (conn or self.conn).execute('''
+            SELECT b.name, COUNT(a.id)
+            FROM buildings b
+            LEFT JOIN apartments a ON a.building_id = b.id
+            GROUP BY b.id
+            ORDER BY b.id
+        ''').fetchall()
+
+    @timed("db.expiries_by_month")
+    def expiries_by_month(self, start, end, conn=None):
+        # (yyyy-MM, count) for leases ending in [start, end), off the lease_end index
+        return (conn or self.conn).execute('''
+            SELECT substr(lease_end, 1, 7) AS month, COUNT(*)
+            FROM apartments
+            WHERE lease_end >= ? AND lease_end < ?
+            GROUP BY month
+            ORDER BY month
+        ''', (start, end)).fetchall()
+
+    @timed("db.lease_stats")
+    def lease_stats(self, today, horizons, conn=None):
+        # Portfolio totals plus, for each horizon in days, how many leases
+        # end between today and today + horizon; all in a single pass
+        columns = "".join(f", SUM(lease_end >= :today AND lease_end <= date(:today, '+{int(days)} days'))"
+                          for days in horizons)
+        row = (conn or self.conn).execute(f'''
+            SELECT (SELECT COUNT(*) FROM buildings), COUNT(*), SUM(lease_end < :today){columns}
+            FROM apartments
+        ''', {"today": today}).fetchone()
+        return [value or 0 for value in row]
+
+    def building_ids(self, conn=None):
+        # Name -> id; buildings sharing a name resolve to the oldest one
+        return dict((conn or self.conn).execute("SELECT name, MIN(id) FROM buildings GROUP BY name"))
+
+    @timed("db.add_buildings")
+    def add_buildings(self, names, conn=None):
+        # Returns {name: id} for the newly inserted buildings; the caller owns
+        # the transaction
+        conn = conn or self.conn
+        self.writes += 1
+        return {name: conn.execute("INSERT INTO buildings (name, sort_key) VALUES (?1, natural_key(?1))",
+                                   (name,)).lastrowid
+                for name in names}
+
+    @timed("db.import_apartments")
+    def import_apartments(self, rows, conn=None):
+        # rows are (building_id, name, tenant, email, lease_start, lease_end).
+        # An apartment that already exists in its building gets the new
+        # tenant and lease; the caller owns the transaction. Rows are staged
+        # in a temp table and moved with one INSERT ... SELECT, so the search
+        # index triggers run inside a single statement rather than one per
+        # row, which FTS5 handles several times faster.
+        conn = conn or self.conn
+        self.writes += 1
+        conn.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS import_staging
+            (building_id INTEGER, name TEXT, tenant TEXT, email TEXT, lease_start TEXT, lease_end TEXT)
+        ''')
+        conn.executemany("INSERT INTO temp.import_staging VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.execute('''
+            INSERT INTO apartments (building_id, name, tenant, email, lease_start, lease_end, sort_key)
+            SELECT building_id, name, tenant, email, lease_start, lease_end, natural_key(name)
+            FROM temp.import_staging WHERE true
+            ON CONFLICT(building_id, name) DO UPDATE SET
+                tenant=excluded.tenant, email=excluded.email,
+                lease_start=excluded.lease_start, lease_end=excluded.lease_end, version=version + 1
+        ''')
+        conn.execute("DELETE FROM temp.import_staging")
+
+    @timed("db.add_building")
+    def add_building(self, name):
+        self.writes += 1
+        with self.conn:
+            return self.conn.execute("INSERT INTO buildings (name, sort_key) VALUES (?1, natural_key(?1))",
+                                     (name,)).lastrowid
+
+    @timed("db.add_apartment")
+    def add_apartment(self, building_id, name, tenant, email, lease_start, lease_end):
+        self.writes += 1
+        with self.conn:
+            return self.conn.execute(
+                "INSERT INTO apartments (building_id, name, tenant, email, lease_start, lease_end, sort_key) "
+                "VALUES (?1, ?2, ?3, ?4, ?5, ?6, natural_key(?2))",
+                (building_id, name, tenant, email, lease_start, lease_end)).lastrowid
+
+    @timed("db.save_apartments")
+    def save_apartments(self, rows, deleted, rejected=None):
+        # rows are (id, version, building_id, name, tenant, email,
+        # lease_start, lease_end) for existing apartments and `deleted` maps
+        # apartment id -> version, where version is the one the user
+        # started from. A row only changes if nobody has written it since;
+        # each write is one statement by primary key and everything goes in
+        # a single transaction. Returns {apartment id: version now stored}
+        # for the rows that were changed by someone else, with None for ones
+        # that were deleted; those are left as they are.
+        #
+        # A row that breaks a constraint, such as a unit number already used
+        # in its building, is left unsaved and recorded in `rejected` as
+        # {apartment id: error} while the rest are saved; without `rejected`
+        # the error is raised and nothing is saved.
+        self.writes += 1
+        conflicts = {}
+        with self.conn:
+            for apartment_id, version in deleted.items():
+                if not self.conn.execute("DELETE FROM apartments WHERE id=? AND version=?",
+                                         (apartment_id, version)).rowcount:
+                    current = self.version_of(apartment_id)
+                    # Already deleted by someone else is what we wanted anyway
+                    if current is not None:
+                        conflicts[apartment_id] = current
+            for row in rows:
+                try:
+                    updated = self.conn.execute('''
+                        UPDATE apartments
+                        SET building_id=?3, name=?4, tenant=?5, email=?6, lease_start=?7, lease_end=?8,
+                            sort_key=natural_key(?4), version=version + 1
+                        WHERE id=?1 AND version=?2
+                    ''', row).rowcount
+                except sqlite3.IntegrityError as e:
+                    if rejected is None:
+                        raise
+                    # SQLite undoes just the failed statement; the
+                    # transaction and the other rows carry on
+                    rejected[row[0]] = str(e)
+                    continue
+                if not updated:
+                    conflicts[row[0]] = self.version_of(row[0])
+        return conflicts
+
+    def version_of(self, apartment_id):
+        row = self.conn.execute("SELECT version FROM apartments WHERE id=?", (apartment_id,)).fetchone()
+        return row[0] if row else None
+
+    def building_rows(self, building_ids, conn=None):
+        # Every stored column, as BUILDING_COLUMNS, for these buildings
+        return self._rows("buildings", BUILDING_COLUMNS, building_ids, conn)
+
+    def apartment_rows(self, apartment_ids, conn=None):
+        # Every stored column, as APARTMENT_COLUMNS, for these apartments
+        return self._rows("apartments", APARTMENT_COLUMNS, apartment_ids, conn)
+
+    def _rows(self, table, columns, ids, conn):
+        conn = conn or self.conn
+        rows = []
+        for chunk, placeholders in chunked(ids):
+            rows += conn.execute(f"SELECT {', '.join(columns)} FROM {table} WHERE id IN ({placeholders})",
+                                 chunk).fetchall()
+        return rows
+
+    @timed("db.apply_rows")
+    def apply_rows(self, buildings, apartments, deleted_buildings, deleted_apartments):
+        # Brings rows to exactly the state read by building_rows and
+        # apartment_rows elsewhere. Deletes go first, then every row is
+        # upserted, so the search index and change_log triggers see ordinary
+        # inserts and updates.
+        self.writes += 1
+        with self.conn:
+            for chunk, placeholders in chunked(deleted_apartments):
+                self.conn.execute(f"DELETE FROM apartments WHERE id IN ({placeholders})", chunk)
+            for chunk, placeholders in chunked(deleted_buildings):
+                self.conn.execute(f"DELETE FROM buildings WHERE id IN ({placeholders})", chunk)
+            # Apartments changing building or number first move to a name no
+            # row can hold, so swapped or reused numbers don't trip
+            # UNIQUE (building_id, name) before the other row has moved on
+            self.conn.executemany(
+                "UPDATE apartments SET name = char(0) || id WHERE id = ? AND (building_id IS NOT ? OR name IS NOT ?)",
+                (row[:3] for row in apartments))
+            for table, columns, rows in (("buildings", BUILDING_COLUMNS, buildings),
+                                         ("apartments", APARTMENT_COLUMNS, apartments)):
+                updates = ", ".join(f"{column}=excluded.{column}" for column in columns[1:])
+                self.conn.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT (id) DO UPDATE SET {updates}", rows)
+
+    def mark_reset(self, after, conn=None):
+        # Replaces change_log with a single entry numbered past `after`.
+        # Anyone following the log from before then finds the gap and
+        # reloads, as after a prune; used once the whole database has been
+        # replaced underneath them.
+        conn = conn or self.conn
+        self.writes += 1
+        with conn:
+            seq = max(after, self.last_change(conn)) + 2
+            conn.execute("DELETE FROM change_log")
+            conn.execute("INSERT INTO change_log (seq, kind, row_id) VALUES (?, 'reset', 0)", (seq,))
@@ -0,0 +1,15 @@
+from datetime import datetime
+
+
+def iso_date(text):
+    # Dates are stored as yyyy-MM-dd; also accept the MM/dd/yyyy form users
+    # type, with or without leading zeros. None for anything else, which the
+    # lease_end range queries would silently mis-sort.
+    if text is None:
+        return None
+    for form in ("%Y-%m-%d", "%m/%d/%Y"):
+        try:
+            return datetime.strptime(text.strip(), form).date().isoformat()
+        except ValueError:
+            pass
+    return None
@@ -0,0 +1,163 @@
+import csv
+import re
+from datetime import date
+
+COLUMNS = ["Building", "Apartment", "Tenant", "Email", "Lease Start", "Lease End"]
+PROGRESS_EVERY = 1000
+
+# Excel's hard limit; longer rolls continue on another sheet
+MAX_SHEET_ROWS = 1048576
+
+# Every per-building sheet keeps a temp file open until the workbook is
+# closed, so very large portfolios only get the combined sheet
+MAX_BUILDING_SHEETS = 200
+
+EXPIRING_WITHIN_DAYS = 60
+
+
+def export_lease_roll(db, path, progress=None):
+    # The file type follows the extension; anything but .csv is written as xlsx
+    if path.lower().endswith(".csv"):
+        return export_csv(db, path, progress)
+    return export_xlsx(db, path, progress)
+
+
+def export_csv(db, path, progress=None):
+    with db.reader() as conn, open(path, "w", newline="", encoding="utf-8") as f:
+        total = db.count_apartments(conn)
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        done = 0
+        for done, (_, *row) in enumerate(db.iter_lease_roll(conn), 1):
+            writer.writerow(row)
+            if progress is not None and done % PROGRESS_EVERY == 0:
+                progress(done, total)
+    if progress is not None:
+        progress(done, total)
+    return done
+
+
+class RollSheet:
+    # One worksheet in constant_memory mode: rows must be written strictly
+    # top to bottom, and the sheet rolls over to a new one at Excel's limit
+
+    def __init__(self, workbook, formats, title):
+        self.workbook = workbook
+        self.formats = formats
+        self.title = title
+        self.worksheet = None
+        self.row = 0
+        self.part = 0
+        self._start()
+
+    def _start(self):
+        if self.worksheet is not None:
+            self.finish()
+        self.part += 1
+        name = self.title if self.part == 1 else f"{self.title[:26]} ({self.part})"
+        self.worksheet = self.workbook.add_worksheet(unique_sheet_name(self.workbook, name))
+        self.worksheet.write_row(0, 0, COLUMNS, self.formats["header"])
+        self.worksheet.freeze_panes(1, 0)
+        for column, width in enumerate((28, 12, 24, 32, 12, 12)):
+            self.worksheet.set_column(column, column, width)
+        self.row = 1
+
+    def write(self, building, apartment, tenant, email, lease_start, lease_end):
+        if self.row >= MAX_SHEET_ROWS:
+            self._start()
+        worksheet = self.worksheet
+        worksheet.write_string(self.row, 0, building or "")
+        worksheet.write_string(self.row, 1, apartment or "")
+        worksheet.write_string(self.row, 2, tenant or "")
+        worksheet.write_string(self.row, 3, email or "")
+        self._write_date(4, lease_start)
+        self._write_date(5, lease_end)
+        self.row += 1
+
+    def _write_date(self, column, value):
+        try:
+            self.worksheet.write_datetime(self.row, column, date.fromisoformat(value), self.formats["date"])
+        except (TypeError, ValueError):
+            self.worksheet.write_string(self.row, column, value or "")
+
+    def finish(self):
+        if self.row <= 1:
+            return
+        # Conditional formats are kept apart from row data, so they can be
+        # added after the rows have been flushed
+        last = self.row - 1
+        self.worksheet.autofilter(0, 0, last, len(COLUMNS) - 1)
+        self.worksheet.conditional_format(1, 5, last, 5, {
+            "type": "formula",
+            "criteria": '=AND(ISNUMBER($F2), $F2<TODAY())',
+            "format": self.formats["expired"],
+        })
+        self.worksheet.conditional_format(1, 5, last, 5, {
+            "type": "formula",
+            "criteria": f'=AND(ISNUMBER($F2), $F2>=TODAY(), $F2<=TODAY()+{EXPIRING_WITHIN_DAYS})',
+            "format": self.formats["expiring"],
+        })
+
+
+def unique_sheet_name(workbook, name):
+    # Excel sheet names: at most 31 characters, none of []:*?/\, unique ignoring case
+    name = re.sub(r"[\[\]:*?/\\]", "_", name).strip("'")[:31] or "Sheet"
+    taken = {sheet.get_name().lower() for sheet in workbook.worksheets()}
+    candidate = name
+    suffix = 2
+    while candidate.lower() in taken:
+        candidate = f"{name[:31 - len(str(suffix)) - 3]} ({suffix})"
+        suffix += 1
+    return candidate
+
+
+def export_xlsx(db, path, progress=None):
+    # Imported here so the rest of the app starts without xlsxwriter
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    formats = {
+        "header": workbook.add_format({"bold": True, "bg_color": "#f5f5f5"}),
+        "date": workbook.add_format({"num_format": "mm/dd/yyyy"}),
+        "expired": workbook.add_format({"bg_color": "#ffcdd2", "font_color": "#b71c1c"}),
+        "expiring": workbook.add_format({"bg_color": "#fff3cd", "font_color": "#8a6d3b"}),
+    }
+
+    done = 0
+    try:
+        with db.reader() as conn:
+            total = db.count_apartments(conn)
+            roll = RollSheet(workbook, formats, "Lease Roll")
+            building_sheets = 0
+            building_sheet = None
+            current_building = None
+
+            for building_id, *row in db.iter_lease_roll(conn):
+                roll.write(*row)
+
+                # Rows arrive grouped by building, so each building sheet is
+                # written in one pass and then left alone
+                if building_id != current_building:
+                    current_building = building_id
+                    if building_sheet is not None:
+                        building_sheet.finish()
+                        building_sheet = None
+                    if building_sheets < MAX_BUILDING_SHEETS:
+                        building_sheets += 1
+                        building_sheet = RollSheet(workbook, formats, row[0] or "Building")
+                if building_sheet is not None:
+                    building_sheet.write(*row)
+
+                done += 1
+                if progress is not None and done % PROGRESS_EVERY == 0:
+                    progress(done, total)
+
+            roll.finish()
+            if building_sheet is not None:
+                building_sheet.finish()
+    finally:
+        workbook.close()
+
+    if progress is not None:
+        progress(done, total)
+    return done
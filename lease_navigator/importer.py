@@ -0,0 +1,221 @@
+import csv
+import os
+import re
+from collections import namedtuple
+from datetime import date, datetime
+from operator import itemgetter
+
+# Same columns, in the same order, as the lease roll export
+COLUMNS = ["Building", "Apartment", "Tenant", "Email", "Lease Start", "Lease End"]
+REQUIRED = ("Building", "Apartment")
+
+# Other header spellings seen in property management exports
+ALIASES = {
+    "building name": "Building",
+    "property": "Building",
+    "unit": "Apartment",
+    "apartment number": "Apartment",
+    "name": "Tenant",
+    "tenant name": "Tenant",
+    "e-mail": "Email",
+    "start": "Lease Start",
+    "end": "Lease End",
+}
+
+# Rows validated and written per executemany call
+CHUNK_SIZE = 5000
+
+EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y")
+
+ImportResult = namedtuple("ImportResult", "imported rejected buildings rejects_path")
+
+
+class LeaseRollError(ValueError):
+    pass
+
+
+def import_lease_roll(db, path, rejects_path=None, progress=None, chunk_size=CHUNK_SIZE):
+    # Streams a CSV or XLSX lease roll into the database chunk by chunk.
+    # Buildings are matched by name and created when missing; an apartment
+    # already in its building is updated. Rows that fail validation are
+    # written to rejects_path (next to the source file by default) with the
+    # reason. Everything goes in one transaction on a separate connection,
+    # so a failed import leaves nothing behind and readers are not blocked.
+    rows = read_xlsx(path) if path.lower().endswith((".xlsx", ".xlsm")) else read_csv(path)
+    header = next(rows, None)
+    if header is None:
+        raise LeaseRollError(f"{path} is empty")
+    positions = column_positions(header)
+
+    rejects_path = rejects_path or os.path.splitext(path)[0] + ".rejects.csv"
+    rejects = Rejects(rejects_path, header)
+    validator = Validator(positions)
+
+    conn = db.connect()
+    try:
+        with conn:
+            buildings = db.building_ids(conn)
+            created = imported = 0
+            chunk = []
+            for number, row in enumerate(rows, 2):
+                chunk.append((number, row))
+                if len(chunk) == chunk_size:
+                    created, imported = write_chunk(db, conn, validator, chunk, buildings, rejects, created, imported)
+                    chunk = []
+                    if progress is not None:
+                        progress(imported + rejects.count, 0)
+            created, imported = write_chunk(db, conn, validator, chunk, buildings, rejects, created, imported)
+        # A big import floods change_log; peers left behind the pruned
+        # entries reload rather than apply every row as a delta
+        db.prune_change_log(conn=conn)
+    finally:
+        conn.close()
+        rejects.close()
+
+    if progress is not None:
+        progress(imported + rejects.count, imported + rejects.count)
+    return ImportResult(imported, rejects.count, created, rejects_path if rejects.count else None)
+
+
+def write_chunk(db, conn, validator, chunk, buildings, rejects, created, imported):
+    valid = []
+    for number, row in chunk:
+        record, error = validator.check(number, row)
+        if error:
+            rejects.write(number, row, error)
+        else:
+            valid.append(record)
+
+    new = [name for name in dict.fromkeys(record[0] for record in valid) if name not in buildings]
+    if new:
+        buildings.update(db.add_buildings(new, conn))
+        created += len(new)
+
+    db.import_apartments([(buildings[building], *values) for building, *values in valid], conn)
+    return created, imported + len(valid)
+
+
+def column_positions(header):
+    positions = {}
+    for position, title in enumerate(header):
+        key = title.strip().lower()
+        column = ALIASES.get(key) or next((column for column in COLUMNS if column.lower() == key), None)
+        if column and column not in positions:
+            positions[column] = position
+
+    missing = [column for column in REQUIRED if column not in positions]
+    if missing:
+        raise LeaseRollError("Missing column: " + ", ".join(missing))
+    return positions
+
+
+class Validator:
+    # Checks one row at a time against compiled patterns; date parsing is
+    # memoized since the same lease dates repeat across thousands of rows.
+    # Rows are lists of text, as read_csv and read_xlsx produce them.
+
+    def __init__(self, positions):
+        # Absent columns read from an always-blank cell past the end of the row
+        self.width = max(positions.values()) + 1
+        self.fetch = itemgetter(*[positions.get(column, self.width) for column in COLUMNS])
+        self.dates = {}
+        self.seen = {}
+
+    def check(self, number, row):
+        if len(row) <= self.width:
+            row = row + [""] * (self.width + 1 - len(row))
+        building, apartment, tenant, email, start, end = [value.strip() for value in self.fetch(row)]
+
+        if not building:
+            return None, "Missing building"
+        if not apartment:
+            return None, "Missing apartment"
+        if email and not EMAIL.match(email):
+            return None, f"Invalid email {email!r}"
+
+        lease_start = self.parse_date(start)
+        if lease_start is None:
+            return None, f"Invalid lease start {start!r}"
+        lease_end = self.parse_date(end)
+        if lease_end is None:
+            return None, f"Invalid lease end {end!r}"
+        if lease_start and lease_end and lease_start > lease_end:
+            return None, "Lease ends before it starts"
+
+        key = (building, apartment)
+        if key in self.seen:
+            return None, f"Duplicate of row {self.seen[key]}"
+        self.seen[key] = number
+
+        return (building, apartment, tenant, email, lease_start, lease_end), None
+
+    def parse_date(self, text):
+        # ISO text, "" for a blank cell, or None when it can't be read
+        try:
+            return self.dates[text]
+        except KeyError:
+            pass
+        value = "" if not text else None
+        for date_format in DATE_FORMATS if text else ():
+            try:
+                value = datetime.strptime(text, date_format).date().isoformat()
+                break
+            except ValueError:
+                pass
+        self.dates[text] = value
+        return value
+
+
+def cell_text(value):
+    # XLSX cells arrive typed; CSV cells are always text
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.reader(f)
+
+
+def read_xlsx(path):
+    # Imported here so the rest of the app starts without openpyxl.
+    # Read-only mode streams rows instead of loading the whole workbook.
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield [cell_text(value) for value in row]
+    finally:
+        workbook.close()
+
+
+class Rejects:
+    # CSV of the rows that were not imported, created on the first reject
+
+    def __init__(self, path, header):
+        self.path = path
+        self.header = header
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, number, row, error):
+        if self._writer is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(["Row", "Error"] + self.header)
+        self._writer.writerow([number, error] + row)
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
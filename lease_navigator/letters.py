@@ -0,0 +1,201 @@
+import html
+import os
+import re
+import textwrap
+import threading
+from datetime import date
+
+from .campaign import Recipient
+from .telemetry import timed
+from .templates import compile_template
+
+PDF = "pdf"
+HTML = "html"
+LETTER_FORMATS = {PDF: "PDF", HTML: "HTML"}
+
+# Tenants per task sent to a worker process; large enough that pickling
+# and scheduling are a small share of each task
+LETTER_CHUNK_SIZE = 250
+
+LETTER_TITLE = "Lease Renewal"
+DEFAULT_LETTER_TEMPLATE = (
+    "{Building}\nApartment {Apartment}\n\n"
+    "Dear {Name},\n\n"
+    "Your lease of apartment {Apartment} at {Building} began on {Lease Start:%B %d, %Y} and ends on "
+    "{Lease End:%B %d, %Y}, {Days Remaining} days from now.\n\n"
+    "We would be glad to renew it. To do so, please reply to this email or contact the management office "
+    "before your lease ends, and we will send you a renewal agreement to sign.\n\n"
+    "Sincerely,\nProperty Management")
+
+# US Letter in points, one-inch margins, 11 pt Helvetica
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 72
+FONT_SIZE = 11
+LINE_HEIGHT = 15
+# Characters of average Helvetica text that fit between the margins
+LINE_WIDTH = 85
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT
+
+UNSAFE_FILENAME = re.compile(r"[^\w.-]+")
+
+
+def pdf_text(line):
+    # A PDF string literal in the standard fonts' WinAnsi encoding
+    text = line.encode("cp1252", "replace")
+    return b"(" + text.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def render_pdf(title, body):
+    # A minimal PDF: Helvetica from the standard 14 fonts, so nothing is
+    # embedded, and the body wrapped into lines and pages
+    lines = []
+    for paragraph in body.split("\n"):
+        # Most lines of a letter fit as they are; textwrap is slow enough to
+        # be most of the cost of a page
+        if len(paragraph) <= LINE_WIDTH:
+            lines.append(paragraph.rstrip())
+        else:
+            lines.extend(textwrap.wrap(paragraph, LINE_WIDTH))
+    pages = [lines[start:start + LINES_PER_PAGE] for start in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+
+    # Objects 1-4 are the catalog, page tree, font and info; each page is
+    # then a page object followed by its content stream
+    kids = " ".join(f"{5 + 2 * i} 0 R" for i in range(len(pages)))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Title " + pdf_text(title) + b" >>",
+    ]
+    for i, page in enumerate(pages):
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {6 + 2 * i} 0 R >>".encode())
+        start = f"BT /F1 {FONT_SIZE} Tf {LINE_HEIGHT} TL {MARGIN} {PAGE_HEIGHT - MARGIN} Td\n".encode()
+        content = start + b"".join(pdf_text(line) + b" Tj T*\n" for line in page) + b"ET"
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R /Info 4 0 R >>\n" % (len(objects) + 1)
+    output += b"startxref\n%d\n%%%%EOF\n" % xref
+    return bytes(output)
+
+
+def render_html(title, body):
+    paragraphs = "\n".join("<p>" + html.escape(paragraph).replace("\n", "<br>\n") + "</p>"
+                           for paragraph in body.split("\n\n"))
+    return (f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>{html.escape(title)}</title>\n"
+            "<style>body { font-family: Georgia, serif; max-width: 40em; margin: 3em auto; line-height: 1.5; }"
+            f"</style>\n</head>\n<body>\n{paragraphs}\n</body>\n</html>\n").encode("utf-8")
+
+
+RENDERERS = {PDF: render_pdf, HTML: render_html}
+
+
+def letter_filename(recipient, letter_format):
+    # What the tenant sees as the attachment name; the apartment id keeps
+    # names unique when two units share a building and number
+    name = UNSAFE_FILENAME.sub("-", f"{LETTER_TITLE} {recipient.building} {recipient.apartment}").strip("-")
+    return f"{name}-{recipient.apartment_id}.{letter_format}"
+
+
+# Templates compiled in this process, by text; a worker process compiles
+# each template once however many chunks it is given
+_templates = {}
+
+
+def write_letters(template_text, letter_format, directory, today, rows):
+    # Runs in a worker process: renders one letter per row of Recipient
+    # fields and writes it straight to `directory`. Tenants missing a value
+    # the template needs are left out, as the reminder send skips them too.
+    template = _templates.get(template_text)
+    if template is None:
+        template = _templates[template_text] = compile_template(template_text)
+    render = RENDERERS[letter_format]
+
+    written = []
+    for row in rows:
+        recipient = Recipient(*row)
+        if template.missing(recipient):
+            continue
+        path = os.path.join(directory, letter_filename(recipient, letter_format))
+        with open(path, "wb") as f:
+            f.write(render(LETTER_TITLE, template.render(recipient, today)))
+        written.append((recipient.apartment_id, path))
+    return written
+
+
+class LetterWriter:
+    # Renders a personalized renewal letter per tenant into `directory`,
+    # spread over a pool of worker processes in chunks of chunk_size
+    # tenants. Rendering is pure Python and holds the GIL, so processes
+    # rather than threads are what let it use every core. Batches no
+    # larger than one chunk are rendered in this process, as starting the
+    # pool would cost more than the work.
+
+    def __init__(self, template, directory, letter_format=PDF, workers=None, chunk_size=LETTER_CHUNK_SIZE,
+                 today=None):
+        if letter_format not in RENDERERS:
+            raise ValueError(f"Unknown letter format: {letter_format}")
+        self.template = compile_template(template)
+        self.template.check()
+        self.directory = directory
+        self.letter_format = letter_format
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.today = today or date.today()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @timed("letters.write")
+    def run(self, recipients, progress=None):
+        # {apartment id: letter path} for every tenant a letter was written
+        # for; progress(done, total) is called from the calling thread
+        os.makedirs(self.directory, exist_ok=True)
+        rows = [(r.apartment_id, r.building, r.apartment, r.tenant, r.email, r.lease_start, r.lease_end)
+                for r in recipients]
+        chunks = [rows[start:start + self.chunk_size] for start in range(0, len(rows), self.chunk_size)]
+        total = len(rows)
+        done = 0
+        letters = {}
+        if len(chunks) <= 1 or self.workers == 1:
+            for chunk in chunks:
+                if self._cancelled.is_set():
+                    break
+                letters.update(write_letters(self.template.text, self.letter_format, self.directory, self.today,
+                                             chunk))
+                done += len(chunk)
+                if progress is not None:
+                    progress(done, total)
+            return letters
+
+        # Imported on first use, so startup doesn't pay for them
+        import multiprocessing
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+        # Spawned rather than forked: the GUI process has threads running,
+        # and a forked child would inherit their locks mid-use
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(chunks)), mp_context=context) as pool:
+            pending = {pool.submit(write_letters, self.template.text, self.letter_format, self.directory,
+                                   self.today, chunk): len(chunk) for chunk in chunks}
+            while pending:
+                finished, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                if self._cancelled.is_set():
+                    pool.shutdown(cancel_futures=True)
+                    break
+                for future in finished:
+                    done += pending.pop(future)
+                    letters.update(future.result())
+                    if progress is not None:
+                        progress(done, total)
+        return letters
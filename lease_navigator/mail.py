@@ -0,0 +1,259 @@
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from .attachments import AttachmentStore
+
+Message = namedtuple("Message", "recipient subject body attachments")
+
+SENDGRID_SMTP_HOST = "smtp.sendgrid.net"
+SENDGRID_SMTP_PORT = 587
+
+# SendGrid accepts at most this many personalizations per API call
+SENDGRID_BATCH_SIZE = 1000
+
+# Placeholder in the shared message body, substituted per recipient
+SENDGRID_BODY_TOKEN = "-lease-navigator-body-"
+
+
+def build_mime(sender, message, attachment_store):
+    # The email package is imported on first use; most sessions never send
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    mime = MIMEMultipart()
+    mime["From"] = sender
+    mime["To"] = message.recipient
+    mime["Subject"] = message.subject
+    mime.attach(MIMEText(message.body, "plain"))
+
+    # Attachment parts are encoded once and shared by every message
+    for path in message.attachments:
+        mime.attach(attachment_store.mime_part(path))
+
+    return mime
+
+
+class Transport:
+    # Backends implement send(); those that can deliver several messages in
+    # one round trip raise batch_size and override send_batch(). One whose
+    # batches must all carry the same attachments clears mixed_attachments.
+    batch_size = 1
+    mixed_attachments = True
+
+    def send(self, message):
+        raise NotImplementedError
+
+    def send_batch(self, messages):
+        for message in messages:
+            self.send(message)
+
+    def close(self):
+        pass
+
+
+class SMTPTransport(Transport):
+    # Keeps up to pool_size authenticated connections open and reuses them
+    # for every message, so a campaign logs in once per connection rather
+    # than once per email.
+
+    def __init__(self, host, port, sender, username=None, password=None, use_tls=True, pool_size=4, timeout=30,
+                 attachment_store=None):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.attachment_store = attachment_store or AttachmentStore()
+        self._idle = queue.LifoQueue()
+        self._open = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import smtplib
+
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            grow = self._open < self.pool_size
+            if grow:
+                self._open += 1
+        if not grow:
+            return self._idle.get()
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._open -= 1
+            raise
+
+    def _discard(self, smtp):
+        with self._lock:
+            self._open -= 1
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+    def send(self, message):
+        self.send_batch([message])
+
+    def send_batch(self, messages):
+        import smtplib
+
+        smtp = self._checkout()
+        try:
+            for message in messages:
+                mime = build_mime(self.sender, message, self.attachment_store)
+                try:
+                    smtp.send_message(mime)
+                except smtplib.SMTPServerDisconnected:
+                    # The server dropped an idle connection; reconnect once
+                    smtp.close()
+                    smtp = self._connect()
+                    smtp.send_message(mime)
+        except Exception:
+            self._discard(smtp)
+            raise
+        self._idle.put(smtp)
+
+    def close(self):
+        while True:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                smtp.quit()
+            except Exception:
+                smtp.close()
+            with self._lock:
+                self._open -= 1
+
+
+class SendGridTransport(Transport):
+    # Messages that share a subject and attachments go out in one API call
+    # with one personalization per recipient, each substituting its own
+    # rendered body into the shared content. Attachments belong to the whole
+    # call, not to a personalization, so a message with a file of its own,
+    # such as a renewal letter, costs a call to itself.
+    batch_size = SENDGRID_BATCH_SIZE
+    mixed_attachments = False
+
+    def __init__(self, api_key, sender, host=None, attachment_store=None):
+        # Imported here so sessions that never send mail don't pay for it
+        from sendgrid import SendGridAPIClient
+
+        self.client = SendGridAPIClient(api_key, host) if host else SendGridAPIClient(api_key)
+        self.sender = sender
+        self.attachment_store = attachment_store or AttachmentStore()
+
+    def send(self, message):
+        self.send_batch([message])
+
+    def send_batch(self, messages):
+        groups = {}
+        for message in messages:
+            groups.setdefault((message.subject, tuple(message.attachments)), []).append(message)
+
+        for (subject, attachments), group in groups.items():
+            for start in range(0, len(group), self.batch_size):
+                self.client.send(self._build(subject, attachments, group[start:start + self.batch_size]))
+
+    def _build(self, subject, attachments, messages):
+        from sendgrid.helpers.mail import (
+            Attachment, Content, Disposition, FileContent, FileName, FileType, Mail, Personalization,
+            Substitution, To
+        )
+
+        mail = Mail(from_email=self.sender, subject=subject)
+        mail.add_content(Content("text/plain", SENDGRID_BODY_TOKEN))
+        for message in messages:
+            personalization = Personalization()
+            personalization.add_to(To(message.recipient))
+            personalization.add_substitution(Substitution(SENDGRID_BODY_TOKEN, message.body))
+            mail.add_personalization(personalization)
+
+        for path in attachments:
+            content = self.attachment_store.base64(path)
+            mail.add_attachment(Attachment(FileContent(content), FileName(os.path.basename(path)),
+                                           FileType("application/octet-stream"), Disposition("attachment")))
+        return mail
+
+
+class FileTransport(Transport):
+    # Offline backend: writes every message as an .eml file into a folder
+
+    def __init__(self, directory, sender, attachment_store=None):
+        self.directory = directory
+        self.sender = sender
+        self.attachment_store = attachment_store or AttachmentStore()
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, message):
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex}.eml")
+        with open(path, "wb") as f:
+            f.write(build_mime(self.sender, message, self.attachment_store).as_bytes())
+
+
+class MemorySink(Transport):
+    # Local stand-in for a mail server, used for testing and benchmarks.
+    # Messages are kept in memory; latency and failure_rate simulate a
+    # slow or flaky remote end.
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=None, batch_size=1):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.batch_size = batch_size
+        self.messages = []
+        self.attempts = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        self.send_batch([message])
+
+    def send_batch(self, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.attempts += 1
+            if self._random.random() < self.failure_rate:
+                raise ConnectionError("simulated delivery failure")
+            self.messages.extend(messages)
+
+
+TRANSPORTS = {
+    "sendgrid": "SendGrid API",
+    "smtp": "SMTP (SendGrid relay)",
+    "file": "Save to outbox folder",
+}
+
+
+def make_transport(kind, sender, api_key=None, outbox=None, attachment_store=None):
+    if kind == "sendgrid":
+        return SendGridTransport(api_key, sender, attachment_store=attachment_store)
+    if kind == "smtp":
+        # SendGrid's SMTP relay authenticates with the literal user "apikey"
+        return SMTPTransport(SENDGRID_SMTP_HOST, SENDGRID_SMTP_PORT, sender, "apikey", api_key,
+                             attachment_store=attachment_store)
+    if kind == "file":
+        return FileTransport(outbox, sender, attachment_store=attachment_store)
+    raise ValueError(f"Unknown mail transport: {kind}")
@@ -0,0 +1,180 @@
+# Versioned schema migrations, tracked with PRAGMA user_version.
+#
+# Each migration runs in its own transaction and upgrades the schema by
+# exactly one version. Append new migrations to MIGRATIONS; never edit one
+# that has already shipped.
+
+from .dates import iso_date
+from .sorting import natural_key
+
+
+def create_tables(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS buildings
+        (id INTEGER PRIMARY KEY, name TEXT)
+    ''')
+
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS apartments
+        (id INTEGER PRIMARY KEY, building_id INTEGER, name TEXT, tenant TEXT, email TEXT, lease_start TEXT, lease_end TEXT)
+    ''')
+
+    # Older databases were created without the tenant name column
+    c.execute("PRAGMA table_info(apartments)")
+    if "tenant" not in [column[1] for column in c.fetchall()]:
+        c.execute("ALTER TABLE apartments ADD COLUMN tenant TEXT")
+
+
+def add_dates_keys_and_indexes(c):
+    c.execute('''
+        CREATE TABLE apartments_new (
+            id INTEGER PRIMARY KEY,
+            building_id INTEGER REFERENCES buildings(id) ON DELETE CASCADE,
+            name TEXT,
+            tenant TEXT,
+            email TEXT,
+            lease_start DATE,
+            lease_end DATE,
+            UNIQUE (building_id, name)
+        )
+    ''')
+
+    # Legacy dates, typed as MM/dd/yyyy with or without leading zeros, are
+    # rewritten as yyyy-MM-dd. Values that are no date at all become NULL,
+    # which the lease_end range queries skip, rather than text they would
+    # sort in among real dates.
+    c.connection.create_function("iso_date", 1, iso_date, deterministic=True)
+
+    # Duplicate apartment numbers within a building keep their row but get
+    # the row id appended, so the unique constraint can be introduced safely
+    c.execute('''
+        INSERT INTO apartments_new (id, building_id, name, tenant, email, lease_start, lease_end)
+        SELECT a.id, a.building_id,
+               CASE WHEN EXISTS (SELECT 1 FROM apartments d
+                                 WHERE d.building_id = a.building_id AND d.name = a.name AND d.id < a.id)
+                    THEN a.name || ' (' || a.id || ')' ELSE a.name END,
+               a.tenant, a.email, iso_date(a.lease_start), iso_date(a.lease_end)
+        FROM apartments a
+    ''')
+    c.execute("DROP TABLE apartments")
+    c.execute("ALTER TABLE apartments_new RENAME TO apartments")
+
+    # The UNIQUE (building_id, name) index also serves lookups by building_id
+    c.execute("CREATE INDEX idx_apartments_lease_end ON apartments (lease_end)")
+    c.execute("CREATE INDEX idx_apartments_email ON apartments (email)")
+
+
+def add_search_index(c):
+    # Substring search over each apartment's building, number, tenant and
+    # email. A trigram index finds "nguy", "@gmail" or "12-b" anywhere in a
+    # value, which a word tokenizer can't. The rowid is the apartment id;
+    # triggers keep it in step with every write to apartments and buildings.
+    c.execute('''
+        CREATE VIRTUAL TABLE apartment_search USING fts5(
+            building, apartment, tenant, email,
+            tokenize = "trigram"
+        )
+    ''')
+    c.execute('''
+        INSERT INTO apartment_search (rowid, building, apartment, tenant, email)
+        SELECT a.id, b.name, a.name, a.tenant, a.email
+        FROM apartments a
+        LEFT JOIN buildings b ON b.id = a.building_id
+    ''')
+
+    c.execute('''
+        CREATE TRIGGER apartments_search_insert AFTER INSERT ON apartments BEGIN
+            INSERT INTO apartment_search (rowid, building, apartment, tenant, email)
+            VALUES (new.id, (SELECT name FROM buildings WHERE id = new.building_id),
+                    new.name, new.tenant, new.email);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER apartments_search_update AFTER UPDATE OF building_id, name, tenant, email ON apartments
+        BEGIN
+            DELETE FROM apartment_search WHERE rowid = old.id;
+            INSERT INTO apartment_search (rowid, building, apartment, tenant, email)
+            VALUES (new.id, (SELECT name FROM buildings WHERE id = new.building_id),
+                    new.name, new.tenant, new.email);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER apartments_search_delete AFTER DELETE ON apartments BEGIN
+            DELETE FROM apartment_search WHERE rowid = old.id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER buildings_search_rename AFTER UPDATE OF name ON buildings BEGIN
+            UPDATE apartment_search SET building = new.name
+            WHERE rowid IN (SELECT id FROM apartments WHERE building_id = new.id);
+        END
+    ''')
+
+
+def add_sort_keys(c):
+    # Natural-order keys for building and apartment names, kept up to date
+    # by the Database write methods. The indexes serve the loader's ORDER BY
+    # and its keyset paging on (sort_key, id).
+    c.connection.create_function("natural_key", 1, natural_key, deterministic=True)
+    c.execute("ALTER TABLE buildings ADD COLUMN sort_key TEXT NOT NULL DEFAULT ''")
+    c.execute("ALTER TABLE apartments ADD COLUMN sort_key TEXT NOT NULL DEFAULT ''")
+    c.execute("UPDATE buildings SET sort_key = natural_key(name)")
+    c.execute("UPDATE apartments SET sort_key = natural_key(name)")
+    c.execute("CREATE INDEX idx_buildings_sort_key ON buildings (sort_key, id)")
+    c.execute("CREATE INDEX idx_apartments_sort_key ON apartments (building_id, sort_key, id)")
+
+
+def add_row_versions_and_change_log(c):
+    # Several copies of the app can share one database file. Every write
+    # bumps the row's version, so a save only lands on the version the user
+    # started from, and every insert, update or delete is appended to
+    # change_log, so peers re-read just the rows that changed.
+    # AUTOINCREMENT keeps sequence numbers from being reused once old
+    # entries are pruned.
+    c.execute("ALTER TABLE buildings ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    c.execute("ALTER TABLE apartments ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    c.execute('''
+        CREATE TABLE change_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            row_id INTEGER NOT NULL
+        )
+    ''')
+
+    for table, kind in (("buildings", "building"), ("apartments", "apartment")):
+        for event, row in (("insert", "new"), ("update", "new"), ("delete", "old")):
+            c.execute(f'''
+                CREATE TRIGGER {table}_log_{event} AFTER {event.upper()} ON {table} BEGIN
+                    INSERT INTO change_log (kind, row_id) VALUES ('{kind}', {row}.id);
+                END
+            ''')
+
+
+MIGRATIONS = [
+    create_tables,
+    add_dates_keys_and_indexes,
+    add_search_index,
+    add_sort_keys,
+    add_row_versions_and_change_log,
+]
+
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    for target, migration in enumerate(MIGRATIONS[version:], version + 1):
+        # Foreign keys cannot be toggled inside a transaction, and table
+        # rebuilds must run with them off
+        conn.execute("PRAGMA foreign_keys=OFF")
+        conn.execute("BEGIN")
+        try:
+            migration(conn.cursor())
+            conn.execute(f"PRAGMA user_version={target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("PRAGMA foreign_keys=ON")
+
+    return len(MIGRATIONS)
@@ -0,0 +1,149 @@
+import heapq
+import itertools
+from collections import namedtuple
+from datetime import date
+
+# Days before the lease end at which an "expiring in N days" event fires
+DEFAULT_THRESHOLDS = (60, 30, 7)
+
+# How far past the largest threshold the in-memory index reaches. Leases
+# ending later stay in SQLite until the clock brings them into range.
+WINDOW_DAYS = 30
+
+# Stale heap entries are dropped once they outnumber the live ones by this much
+COMPACT_SLACK = 1024
+
+Expiry = namedtuple("Expiry", "apartment_id lease_end days")
+
+
+def to_ordinal(value):
+    try:
+        return date.fromisoformat(value).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+class ExpiryScheduler:
+    # Min-heap of (due day, stamp, apartment id, lease end day) covering every
+    # lease that ends within the window; due day is when the lease's next
+    # threshold is reached. A change pushes a fresh entry and leaves the old
+    # one behind, skipped when popped because its stamp is no longer the live
+    # one, so every add, edit or delete is O(log n). poll() pops what is due
+    # and schedules the lease's next threshold. As days pass the window is
+    # extended with a range query on the lease_end index; the table is
+    # never rescanned.
+
+    def __init__(self, db, thresholds=DEFAULT_THRESHOLDS, clock=date.today, window_days=WINDOW_DAYS):
+        self.db = db
+        self.thresholds = sorted(set(thresholds), reverse=True)
+        # Days remaining -> nearest threshold already reached
+        self._reached = [min(days for days in self.thresholds if days >= remaining)
+                         for remaining in range(self.thresholds[0] + 1)]
+        self.clock = clock
+        self.window_days = window_days
+        self.reload()
+
+    def reload(self):
+        # Rebuilds the index from the database, e.g. after a bulk import
+        self._heap = []
+        self._live = {}
+        # Lease end day of each live entry, so an unchanged one is left be
+        self._ends = {}
+        self._stamps = itertools.count()
+        # Last day covered; leases that ended before today are never loaded
+        self._horizon = self.clock().toordinal() - 1
+        self._extend(self.clock().toordinal())
+        return self
+
+    def __len__(self):
+        return len(self._live)
+
+    def update(self, apartment_id, lease_end):
+        # Call after an apartment is added or saved. A lease end that hasn't
+        # changed keeps its entry, so thresholds already reported don't fire
+        # again.
+        today = self.clock().toordinal()
+        end = to_ordinal(lease_end)
+        if end is not None and apartment_id in self._live and self._ends[apartment_id] == end:
+            return
+        if end is None or end < today or end > self._horizon:
+            # Out of range for now; the database is the index until then
+            self.remove(apartment_id)
+        else:
+            heapq.heappush(self._heap, self._entry(apartment_id, end, self._first_due(end, today)))
+
+    def remove(self, apartment_id):
+        self._live.pop(apartment_id, None)
+        self._ends.pop(apartment_id, None)
+
+    def next_due(self):
+        # Day the next event fires, or None; entries may be stale, so this is
+        # a lower bound
+        return date.fromordinal(self._heap[0][0]) if self._heap else None
+
+    def poll(self):
+        # Events whose threshold has been reached since the last poll. A lease
+        # that is already past several thresholds only reports the nearest one.
+        today = self.clock().toordinal()
+        self._extend(today)
+
+        events = []
+        heap = self._heap
+        while heap and heap[0][0] <= today:
+            due, stamp, apartment_id, end = heapq.heappop(heap)
+            if self._live.get(apartment_id) != stamp:
+                continue
+            if end < today:
+                # The lease is over; nothing left to remind about
+                self.remove(apartment_id)
+                continue
+            events.append(Expiry(apartment_id, date.fromordinal(end), self._reached[end - today]))
+            heapq.heappush(heap, self._entry(apartment_id, end, self._next_due(end, today + 1)))
+
+        if len(heap) > 2 * len(self._live) + COMPACT_SLACK:
+            self._heap = [entry for entry in heap if self._live.get(entry[2]) == entry[1]]
+            heapq.heapify(self._heap)
+        events.sort(key=lambda event: (event.lease_end, event.apartment_id))
+        return events
+
+    def _entry(self, apartment_id, end, due):
+        stamp = self._live[apartment_id] = next(self._stamps)
+        self._ends[apartment_id] = end
+        return due, stamp, apartment_id, end
+
+    def _first_due(self, end, today):
+        # A lease already inside the largest threshold fires straight away
+        return max(today, end - self.thresholds[0])
+
+    def _next_due(self, end, start):
+        # Next threshold falling on or after `start`. Past the last one the
+        # entry waits for the day after the lease ends and is then dropped.
+        for days in self.thresholds:
+            if end - days >= start:
+                return end - days
+        return max(start, end + 1)
+
+    def _extend(self, today):
+        horizon = today + self.thresholds[0] + self.window_days
+        if horizon <= self._horizon:
+            return
+        start = date.fromordinal(max(self._horizon + 1, today)).isoformat()
+        with self.db.reader() as conn:
+            rows = self.db.lease_ends(start, date.fromordinal(horizon).isoformat(), conn)
+        self._horizon = horizon
+
+        entries = []
+        for apartment_id, lease_end in rows:
+            end = to_ordinal(lease_end)
+            if end is not None:
+                entries.append(self._entry(apartment_id, end, self._first_due(end, today)))
+        if len(entries) > len(self._heap):
+            self._heap.extend(entries)
+            heapq.heapify(self._heap)
+        else:
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+
+
+def days_label(days):
+    return "today" if days == 0 else f"in {days} day" + ("" if days == 1 else "s")
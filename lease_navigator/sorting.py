@@ -0,0 +1,18 @@
+import re
+
+DIGITS = re.compile(r"\d+")
+
+
+def natural_key(text):
+    # Sort key under which "2-A" < "10-B" < "100" with plain string
+    # comparison: letters are casefolded and every run of digits is
+    # prefixed with its length. Stored next to building and apartment
+    # names so SQLite can ORDER BY it directly.
+    if text is None:
+        return ""
+    return DIGITS.sub(length_prefixed, text.strip().casefold())
+
+
+def length_prefixed(match):
+    digits = match.group().lstrip("0") or "0"
+    return f"{len(digits):02d}{digits}"
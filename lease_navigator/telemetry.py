@@ -0,0 +1,183 @@
+import functools
+import json
+import threading
+import time
+from collections import deque, namedtuple
+
+# Recent spans kept for the diagnostics view and export
+RING_SIZE = 5000
+# Durations kept per operation for the percentiles
+SAMPLES_PER_OPERATION = 1000
+# The GUI thread not getting back to its event loop for this long is a stall
+STALL_THRESHOLD_MS = 200
+STALL_RING_SIZE = 200
+
+Span = namedtuple("Span", "name started duration_ms queries thread error")
+Stall = namedtuple("Stall", "started duration_ms during")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Telemetry:
+    # Off by default. While off, timed() and span() cost one attribute check
+    # and no SQLite trace callback is installed. While on, every span records
+    # its wall time and the number of SQL statements its thread ran inside
+    # it, into a ring buffer of recent spans and per-operation samples.
+
+    def __init__(self, ring_size=RING_SIZE):
+        self.enabled = False
+        self.spans = deque(maxlen=ring_size)
+        self.stalls = deque(maxlen=STALL_RING_SIZE)
+        self.stall_threshold_ms = STALL_THRESHOLD_MS
+        self._samples = {}
+        self._totals = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._databases = []
+        self._last_beat = None
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+        self._last_beat = None
+        for db in self._databases:
+            db.trace(self.count_statement if enabled else None)
+
+    def attach(self, db):
+        # Statements run through this database are counted while enabled
+        self._databases.append(db)
+        if self.enabled:
+            db.trace(self.count_statement)
+
+    def detach(self, db):
+        if db in self._databases:
+            self._databases.remove(db)
+
+    def count_statement(self, statement):
+        # SQLite trace callback. Statements inside triggers start with "--",
+        # and a statement is traced again each time one of its triggers
+        # starts, so a repeat of the previous text is not counted; the price
+        # is that an identical statement run twice in a row counts once.
+        local = self._local
+        if statement.startswith("--") or statement == getattr(local, "statement", None):
+            return
+        local.statement = statement
+        local.queries = getattr(local, "queries", 0) + 1
+
+    def span(self, name):
+        return _SpanContext(self, name) if self.enabled else _NULL_SPAN
+
+    def timed(self, name):
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _SpanContext(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def record(self, span):
+        with self._lock:
+            self.spans.append(span)
+            samples = self._samples.get(span.name)
+            if samples is None:
+                samples = self._samples[span.name] = deque(maxlen=SAMPLES_PER_OPERATION)
+                self._totals[span.name] = [0, 0]
+            samples.append(span.duration_ms)
+            totals = self._totals[span.name]
+            totals[0] += 1
+            totals[1] += span.queries
+
+    def heartbeat(self, now=None):
+        # Called from a GUI-thread timer; a late call means the event loop
+        # was blocked, and the GUI-thread spans that started in the gap say
+        # by what
+        if not self.enabled:
+            return None
+        now = time.perf_counter() if now is None else now
+        last, self._last_beat = self._last_beat, now
+        if last is None or (now - last) * 1000 < self.stall_threshold_ms:
+            return None
+        gui_thread = threading.current_thread().name
+        with self._lock:
+            during = sorted({span.name for span in self.spans
+                             if span.thread == gui_thread and span.started >= last})
+        stall = Stall(last, (now - last) * 1000, during)
+        self.stalls.append(stall)
+        return stall
+
+    def summary(self):
+        # One row per operation, slowest p95 first
+        rows = []
+        with self._lock:
+            for name, samples in self._samples.items():
+                ordered = sorted(samples)
+                count, queries = self._totals[name]
+                rows.append({
+                    "operation": name,
+                    "count": count,
+                    "p50_ms": percentile(ordered, 0.50),
+                    "p95_ms": percentile(ordered, 0.95),
+                    "max_ms": ordered[-1],
+                    "queries_per_call": queries / count,
+                })
+        rows.sort(key=lambda row: row["p95_ms"], reverse=True)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.stalls.clear()
+            self._samples.clear()
+            self._totals.clear()
+
+    def export(self, path):
+        with self._lock:
+            spans = [span._asdict() for span in self.spans]
+            stalls = [stall._asdict() for stall in self.stalls]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "stalls": stalls, "spans": spans}, f, indent=2)
+
+
+class _SpanContext:
+    __slots__ = ("telemetry", "name", "started", "queries")
+
+    def __init__(self, telemetry, name):
+        self.telemetry = telemetry
+        self.name = name
+
+    def __enter__(self):
+        local = self.telemetry._local
+        self.queries = getattr(local, "queries", 0)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration_ms = (time.perf_counter() - self.started) * 1000
+        queries = getattr(self.telemetry._local, "queries", 0) - self.queries
+        self.telemetry.record(Span(self.name, self.started, duration_ms, queries,
+                                   threading.current_thread().name, exc_type is not None))
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+# Shared by the package and the GUI
+telemetry = Telemetry()
+timed = telemetry.timed
+span = telemetry.span
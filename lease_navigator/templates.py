@@ -0,0 +1,136 @@
+import re
+from datetime import date
+from operator import attrgetter
+
+# Placeholders look like {Lease End} or, for dates, {Lease End:%B %d, %Y}.
+# Literal braces are written {{ and }}.
+PLACEHOLDER = re.compile(r"\{\{|\}\}|\{([^{}:]+)(?::([^{}]*))?\}")
+
+DEFAULT_DATE_FORMAT = "%m/%d/%Y"
+
+DEFAULT_SUBJECT = "Lease Expiration Reminder"
+DEFAULT_TEMPLATE = ("Dear {Name},\n\nYour lease is set to expire on {Lease End}. "
+                    "Please contact us if you wish to renew your lease.\n\nSincerely,\nProperty Management")
+
+# Template field -> Recipient attribute
+FIELDS = {
+    "Name": "tenant",
+    "Email": "email",
+    "Apartment": "apartment",
+    "Building": "building",
+    "Lease Start": "lease_start",
+    "Lease End": "lease_end",
+}
+DATE_FIELDS = {"Lease Start", "Lease End"}
+DAYS_REMAINING = "Days Remaining"
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Cap on memoized date renderings per field; lease dates repeat a lot
+DATE_CACHE_SIZE = 4096
+
+
+def date_converter(field, spec):
+    # Turns the raw ISO value of a date field into display text, memoized
+    cache = {}
+    date_format = spec or DEFAULT_DATE_FORMAT
+
+    def convert(value, today):
+        key = (value, today)
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        parsed = parse_date(value)
+        if field == DAYS_REMAINING:
+            text = str((parsed - today).days) if parsed else ""
+        else:
+            text = parsed.strftime(date_format) if parsed else (value or "")
+        if len(cache) < DATE_CACHE_SIZE:
+            cache[key] = text
+        return text
+
+    return convert
+
+
+class Template:
+    # A reminder template parsed once into a str.format pattern. Rendering
+    # fetches every field in one attrgetter call, converts only the date
+    # fields, and formats the pattern; nothing is parsed per tenant.
+
+    def __init__(self, text):
+        self.text = text
+        self.fields = []
+        self.unknown = []
+        attributes = []
+        self._converters = []
+
+        pattern = []
+        position = 0
+        for match in PLACEHOLDER.finditer(text):
+            pattern.append(escape(text[position:match.start()]))
+            position = match.end()
+            token = match.group(0)
+            if token in ("{{", "}}"):
+                pattern.append(token)
+                continue
+
+            field, spec = match.group(1).strip(), match.group(2)
+            if field not in FIELDS and field != DAYS_REMAINING:
+                # Left in the output as written, and reported by check()
+                if field not in self.unknown:
+                    self.unknown.append(field)
+                pattern.append(escape(token))
+                continue
+            if field not in self.fields:
+                self.fields.append(field)
+            if field in DATE_FIELDS or field == DAYS_REMAINING:
+                self._converters.append((len(attributes), date_converter(field, spec)))
+            attributes.append(FIELDS.get(field, FIELDS["Lease End"]))
+            pattern.append("{}")
+        pattern.append(escape(text[position:]))
+        self._pattern = "".join(pattern)
+
+        # attrgetter returns a bare value for one attribute and a tuple for more
+        if len(attributes) == 1:
+            single = attrgetter(attributes[0])
+            self._fetch = lambda record: (single(record),)
+        else:
+            self._fetch = attrgetter(*attributes) if attributes else lambda record: ()
+
+    def check(self):
+        if self.unknown:
+            raise TemplateError("Unknown placeholders: " + ", ".join("{%s}" % field for field in self.unknown))
+
+    def missing(self, record):
+        # Fields this template uses that have no value for `record`;
+        # {Days Remaining} is computed from the lease end date
+        return [field for field in self.fields
+                if not getattr(record, FIELDS.get(field, FIELDS["Lease End"]))]
+
+    def render(self, record, today=None):
+        values = self._fetch(record)
+        if self._converters:
+            today = today or date.today()
+            values = list(values)
+            for position, convert in self._converters:
+                values[position] = convert(values[position], today)
+        return self._pattern.format(*values)
+
+
+def escape(literal):
+    return literal.replace("{", "{{").replace("}", "}}")
+
+
+def compile_template(text):
+    return text if isinstance(text, Template) else Template(text)
@@ -0,0 +1,59 @@
+# The app's main window against a small database of its own, for tests
+# that drive the GUI offscreen
+
+import importlib.util
+import os
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+
+@pytest.fixture(scope="module")
+def module():
+    spec = importlib.util.spec_from_file_location("lease_navigator_app", os.path.join(ROOT, "Lease Navigator.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def window(app, module, tmp_path, monkeypatch):
+    # Settings, backups and letters stay inside tmp_path
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    warnings = []
+    monkeypatch.setattr(QtWidgets.QMessageBox, "warning", lambda *args, **kwargs: warnings.append(args[2]))
+
+    window = module.PropertyManagerApp(db_name=str(tmp_path / "test.db"), transport="file")
+    for building, names in (("Alpha", ("1-A", "2-A", "3-A")), ("Beta", ("1-B", "2-B"))):
+        building_id = window.db.add_building(building)
+        for name in names:
+            window.db.add_apartment(building_id, name, f"Tenant {name}", "tenant@example.com", "2024-01-01",
+                                    "2026-12-01")
+    process_events(app, 0.1)
+    window.tree.expand(window.model.index(0, 0))
+    process_events(app, 0.1)
+    window.warnings = warnings
+    yield window
+    window.db.conn.set_trace_callback(None)
+    window.shutdown()
+
+
+def process_events(app, seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
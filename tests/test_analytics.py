@@ -0,0 +1,49 @@
+# Portfolio figures over a database with an apartment whose building is
+# gone, as an upgrade with foreign keys off can leave behind.
+
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("numpy")
+
+from lease_navigator import Database
+from lease_navigator.analytics import Analytics
+
+TODAY = date(2026, 3, 15)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "test.db"))
+    db.migrate()
+    building_id = db.add_building("Alpha")
+    db.add_apartment(building_id, "1-A", "Tenant", "a@example.com", "2025-01-01", "2026-12-31")
+    db.add_apartment(building_id, "2-A", "Tenant", "b@example.com", "2025-06-01", "2026-05-31")
+    db.conn.execute("PRAGMA foreign_keys=OFF")
+    with db.conn:
+        db.conn.execute("INSERT INTO apartments (building_id, name, lease_start, lease_end) "
+                        "VALUES (99, '1-Z', '2025-01-01', '2026-04-30')")
+    db.conn.execute("PRAGMA foreign_keys=ON")
+    yield db
+    db.close()
+
+
+def test_orphans_are_left_out(db):
+    dashboard = Analytics().dashboard(db, TODAY)
+    assert dashboard.units == 2
+    assert dashboard.occupied == 2
+    assert [row[:2] for row in dashboard.buildings] == [("Alpha", 2)]
+    assert dashboard.ending_soon == 1
+
+
+def test_orphan_written_after_loading(db):
+    analytics = Analytics()
+    analytics.dashboard(db, TODAY)
+    with db.conn:
+        db.conn.execute("UPDATE apartments SET lease_end = '2026-04-01' WHERE name = '1-Z'")
+    assert analytics.dashboard(db, TODAY).units == 2
@@ -0,0 +1,31 @@
+# Every lease ending in the window is accounted for in a campaign's
+# summary, including tenants it can't be sent to for want of an email.
+
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lease_navigator import Database
+from lease_navigator.campaign import NO_EMAIL, SENT, Campaign, select_recipients, summarize
+from lease_navigator.mail import MemorySink
+from lease_navigator.templates import DEFAULT_SUBJECT, DEFAULT_TEMPLATE
+
+
+def test_tenants_without_email_are_counted(tmp_path):
+    db = Database(str(tmp_path / "test.db"))
+    db.migrate()
+    building_id = db.add_building("Alpha")
+    db.add_apartment(building_id, "1-A", "Tenant 1-A", "tenant@example.com", "2025-06-01", "2026-04-30")
+    db.add_apartment(building_id, "2-A", "Tenant 2-A", "", "2025-06-01", "2026-05-15")
+
+    recipients = select_recipients(db, 90, today=date(2026, 3, 15))
+    assert len(recipients) == 2
+    sink = MemorySink()
+    Campaign(sink, DEFAULT_SUBJECT, DEFAULT_TEMPLATE).run(recipients)
+
+    counts = summarize(recipients)
+    assert (counts[SENT], counts[NO_EMAIL]) == (1, 1)
+    assert [message.recipient for message in sink.messages] == ["tenant@example.com"]
+    db.close()
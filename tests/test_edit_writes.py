@@ -0,0 +1,91 @@
+# How cell edits reach the database: one edit costs exactly one UPDATE and
+# one COMMIT once the debounce delay has passed, with no model reset, and
+# an edit that can't be saved is dropped rather than retried forever,
+# unless another writer only held the lock for a while.
+
+import sqlite3
+
+from conftest import process_events
+
+
+def wait_for_flush(app, module):
+    process_events(app, module.EDIT_FLUSH_DELAY_MS / 1000 * 3)
+
+
+def traced_writes(statements):
+    # Statements run inside triggers are traced with a leading "--", and the
+    # outer statement is traced again each time a trigger program starts, so
+    # repeats of the same text are one statement
+    top_level = []
+    for sql in statements:
+        if not sql.startswith("--") and (not top_level or top_level[-1] != sql):
+            top_level.append(sql)
+    verbs = [sql.split()[0].upper() for sql in top_level]
+    return [verb for verb in verbs if verb in ("INSERT", "UPDATE", "DELETE", "COMMIT")]
+
+
+def test_edit_is_one_update_without_reset(app, module, window):
+    model = window.model
+    building = model.index(0, 0)
+    statements = []
+    resets = []
+    window.db.conn.set_trace_callback(statements.append)
+    model.modelReset.connect(lambda: resets.append(1))
+
+    assert model.setData(model.index(0, 2, building), "Edited once")
+    assert traced_writes(statements) == []
+    wait_for_flush(app, module)
+
+    assert traced_writes(statements) == ["UPDATE", "COMMIT"]
+    assert not resets
+    assert window.db.conn.execute("SELECT tenant FROM apartments WHERE name = '1-A'").fetchone()[0] == "Edited once"
+
+
+def test_burst_of_edits_is_one_transaction(app, module, window):
+    model = window.model
+    building = model.index(0, 0)
+    statements = []
+    window.db.conn.set_trace_callback(statements.append)
+
+    for i in range(9):
+        model.setData(model.index(i % 3, 3, building), f"burst{i}@example.com")
+    wait_for_flush(app, module)
+
+    assert traced_writes(statements) == ["UPDATE"] * 3 + ["COMMIT"]
+
+
+def test_failed_save_is_dropped(app, module, window):
+    model = window.model
+    building = model.index(0, 0)
+    window.db.conn.execute("PRAGMA query_only=ON")
+
+    model.setData(model.index(0, 2, building), "Never stored")
+    wait_for_flush(app, module)
+
+    assert not model.edits
+    assert model.data(model.index(0, 2, building)) == "Tenant 1-A"
+    assert len(window.warnings) == 1
+    window.db.conn.execute("PRAGMA query_only=OFF")
+
+
+def test_locked_save_is_retried(app, module, window):
+    model = window.model
+    building = model.index(0, 0)
+    # Fail at once rather than after the busy timeout
+    window.db.conn.execute("PRAGMA busy_timeout=0")
+    other = sqlite3.connect(window.db.path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    model.setData(model.index(0, 2, building), "Stored later")
+    wait_for_flush(app, module)
+
+    assert model.edits
+    assert model.data(model.index(0, 2, building)) == "Stored later"
+    assert not window.warnings
+
+    other.execute("ROLLBACK")
+    other.close()
+    wait_for_flush(app, module)
+
+    assert not model.edits
+    assert window.db.conn.execute("SELECT tenant FROM apartments WHERE name = '1-A'").fetchone()[0] == "Stored later"
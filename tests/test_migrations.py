@@ -0,0 +1,52 @@
+# Upgrading a database as the first release of the app left it: the
+# schema it created, with dates typed however the user typed them.
+
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lease_navigator import Database
+from lease_navigator.migrations import MIGRATIONS
+
+
+def baseline_db(path, apartments):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS buildings (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.execute("CREATE TABLE IF NOT EXISTS apartments (id INTEGER PRIMARY KEY, building_id INTEGER, name TEXT, "
+                 "email TEXT, lease_start TEXT, lease_end TEXT)")
+    conn.execute("INSERT INTO buildings (id, name) VALUES (1, 'Alpha')")
+    conn.executemany("INSERT INTO apartments (building_id, name, email, lease_start, lease_end) "
+                     "VALUES (1, ?, 'tenant@example.com', ?, ?)", apartments)
+    conn.commit()
+    conn.close()
+
+
+def test_upgrade_rewrites_legacy_dates(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    baseline_db(path, [("1-A", "01/05/2025", "1/5/2026"),
+                       ("2-A", "2/3/2026", "2/3/2027"),
+                       ("3-A", "2025-06-01", "2026-05-31"),
+                       ("4-A", "", "next spring")])
+
+    db = Database(path)
+    assert db.migrate() == len(MIGRATIONS)
+    rows = db.conn.execute("SELECT name, lease_start, lease_end FROM apartments ORDER BY id").fetchall()
+    assert rows == [("1-A", "2025-01-05", "2026-01-05"),
+                    ("2-A", "2026-02-03", "2027-02-03"),
+                    ("3-A", "2025-06-01", "2026-05-31"),
+                    ("4-A", None, None)]
+    # Found by the range queries the scheduler and campaigns run
+    assert sorted(row[0] for row in db.lease_ends("2026-01-01", "2027-12-31")) == [1, 2, 3]
+    db.close()
+
+
+def test_upgrade_keeps_duplicate_numbers_apart(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    baseline_db(path, [("1-A", "2025-01-01", "2026-01-01"), ("1-A", "2025-02-01", "2026-02-01")])
+
+    db = Database(path)
+    db.migrate()
+    assert [row[0] for row in db.conn.execute("SELECT name FROM apartments ORDER BY id")] == ["1-A", "1-A (2)"]
+    db.close()
@@ -0,0 +1,84 @@
+# The expiry scheduler against a test clock: thresholds fire on the day
+# they are reached, once, and again only after the lease end really moves.
+
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lease_navigator import Database
+from lease_navigator.scheduler import ExpiryScheduler
+
+START = date(2026, 3, 1)
+
+
+class Clock:
+    def __init__(self, today):
+        self.today = today
+
+    def __call__(self):
+        return self.today
+
+    def advance(self, days):
+        self.today += timedelta(days=days)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / "test.db"))
+    db.migrate()
+    yield db
+    db.close()
+
+
+def add_lease(db, lease_end):
+    building_id = db.add_building("Alpha")
+    return db.add_apartment(building_id, "1-A", "Tenant", "tenant@example.com", "2025-01-01", lease_end)
+
+
+def test_thresholds_fire_when_crossed(db):
+    clock = Clock(START)
+    end = START + timedelta(days=61)
+    apartment_id = add_lease(db, end.isoformat())
+    scheduler = ExpiryScheduler(db, thresholds=(60, 30, 7), clock=clock)
+
+    assert scheduler.poll() == []
+    clock.advance(1)
+    assert [(event.apartment_id, event.days) for event in scheduler.poll()] == [(apartment_id, 60)]
+    assert scheduler.poll() == []
+    clock.advance(29)
+    assert scheduler.poll() == []
+    clock.advance(1)
+    assert [event.days for event in scheduler.poll()] == [30]
+    # A day skipped past the next threshold still reports it, once
+    clock.advance(25)
+    assert [event.days for event in scheduler.poll()] == [7]
+    assert scheduler.poll() == []
+
+
+def test_unchanged_update_does_not_fire_again(db):
+    clock = Clock(START)
+    end = (START + timedelta(days=20)).isoformat()
+    apartment_id = add_lease(db, end)
+    scheduler = ExpiryScheduler(db, thresholds=(60, 30, 7), clock=clock)
+    assert [event.days for event in scheduler.poll()] == [30]
+
+    # Saving another column passes the same lease end again
+    scheduler.update(apartment_id, end)
+    assert scheduler.poll() == []
+    clock.advance(13)
+    assert [event.days for event in scheduler.poll()] == [7]
+
+
+def test_changed_lease_end_fires_again(db):
+    clock = Clock(START)
+    apartment_id = add_lease(db, (START + timedelta(days=20)).isoformat())
+    scheduler = ExpiryScheduler(db, thresholds=(60, 30, 7), clock=clock)
+    assert [event.days for event in scheduler.poll()] == [30]
+
+    moved = START + timedelta(days=5)
+    scheduler.update(apartment_id, moved.isoformat())
+    assert [(event.lease_end, event.days) for event in scheduler.poll()] == [(moved, 7)]
@@ -0,0 +1,87 @@
+# Typing in the search box narrows the tree with row removals and
+# insertions; only clearing the search reloads it.
+
+from PyQt5.QtCore import QModelIndex, QPersistentModelIndex, qInstallMessageHandler
+from PyQt5.QtTest import QAbstractItemModelTester
+
+from conftest import process_events
+
+
+def search(app, module, window, text):
+    window.search_input.setText(text)
+    process_events(app, module.SEARCH_DEBOUNCE_MS / 1000 * 3)
+
+
+def shown(model):
+    rows = []
+    for row in range(model.rowCount()):
+        building = model.index(row, 0)
+        rows.append((model.data(building), [model.data(model.index(child, 1, building))
+                                            for child in range(model.rowCount(building))]))
+    return rows
+
+
+def test_search_filters_without_reset(app, module, window):
+    model = window.model
+    # Reports any signal or row count that doesn't add up
+    failures = []
+    previous = qInstallMessageHandler(lambda kind, context, message: failures.append(message))
+    tester = QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Warning)
+    resets = []
+    model.modelReset.connect(lambda: resets.append(1))
+
+    search(app, module, window, "Tenant")
+    assert shown(model) == [("Alpha", ["1-A", "2-A", "3-A"]), ("Beta", ["1-B", "2-B"])]
+
+    search(app, module, window, "Tenant 1")
+    assert shown(model) == [("Alpha", ["1-A"]), ("Beta", ["1-B"])]
+    search(app, module, window, "Tenant 1-B")
+    assert shown(model) == [("Beta", ["1-B"])]
+    search(app, module, window, "Tenant 2")
+    assert shown(model) == [("Alpha", ["2-A"]), ("Beta", ["2-B"])]
+    search(app, module, window, "Tenant 1")
+    assert shown(model) == [("Alpha", ["1-A"]), ("Beta", ["1-B"])]
+    assert not resets
+
+    search(app, module, window, "Tenant 1-A")
+    assert shown(model) == [("Alpha", ["1-A"])]
+    assert not resets
+    del tester
+    qInstallMessageHandler(previous)
+    assert [message for message in failures if "FAIL" in message] == []
+
+
+def test_selection_survives_narrowing(app, module, window):
+    model = window.model
+    search(app, module, window, "Tenant")
+    beta = model.index(1, 0)
+    selected = QPersistentModelIndex(model.index(1, 1, beta))
+    assert model.data(QModelIndex(selected)) == "2-B"
+
+    search(app, module, window, "2-B")
+    assert selected.isValid()
+    assert (selected.row(), model.data(QModelIndex(selected))) == (0, "2-B")
+
+
+def test_clearing_search_shows_everything(app, module, window):
+    model = window.model
+    search(app, module, window, "1-B")
+    assert shown(model) == [("Beta", ["1-B"])]
+
+    search(app, module, window, "")
+    assert [name for name, _ in shown(model)] == ["Alpha", "Beta"]
+    # Apartments are read again once a building is opened
+    assert shown(model)[1] == ("Beta", [])
+    model.fetchMore(model.index(1, 0))
+    assert shown(model)[1] == ("Beta", ["1-B", "2-B"])
+
+
+def test_search_picks_up_stored_changes(app, module, window):
+    model = window.model
+    search(app, module, window, "Tenant")
+    apartment_id = model.data(model.index(0, 0, model.index(0, 0)), module.Qt.UserRole)
+    window.db.conn.execute("UPDATE apartments SET tenant = 'Tenant renamed' WHERE id = ?", (apartment_id,))
+    window.db.conn.commit()
+
+    search(app, module, window, "Tenant ")
+    assert model.data(model.index(0, 2, model.index(0, 0))) == "Tenant renamed"